@@ -0,0 +1,394 @@
+"""Benchmarks du pipeline ski-data -> ski-processor sur des stations synthétiques.
+
+    python run_benchmarks.py --pistes 40 --lifts 15 --vertices 60 --stations 10 --output bench.json
+
+Overpass, Firebase Auth et l'URL de destination sont remplacés par un serveur
+local (stubs.py) ; --overpass-replay rejoue des réponses Overpass enregistrées
+(un fichier JSON ou un dossier, par exemple le cache disque de ski-data).
+Le résultat est un JSON comparable d'un commit à l'autre.
+"""
+import argparse
+import contextlib
+import copy
+import gc
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from stubs import OverpassReplay, StubServer, synthetic_overpass
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SKI_DATA_DIR = os.path.join(HERE, "..", "ski-data")
+SKI_PROCESSOR_DIR = os.path.join(HERE, "..", "ski-processor")
+SKI_COMMON_DIR = os.path.join(HERE, "..", "ski-common")
+STAGES = ("extract_coords", "get_station_info", "trouver_connections", "process", "fetch_stations", "fetch_fused",
+          "harvest_memory", "spatial")
+BENCH_STATION = "Station Benchmark"
+
+
+def load_service(directory, module_name):
+    """Importe le main.py d'un service sous un nom propre (les deux services ont un main.py).
+
+    Le paquet ski_common est importé depuis ski-common/, sans installation préalable.
+    """
+    for path in (os.path.abspath(SKI_COMMON_DIR), os.path.abspath(directory)):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    directory = os.path.abspath(directory)
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(directory, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def configure_environment(workdir, stub_url):
+    """Variables lues à l'import des services : état local dans `workdir`, services externes sur le stub."""
+    os.environ.update({
+        "JOBS_DB": os.path.join(workdir, "jobs.sqlite"),
+        "STATION_STATE_DB": os.path.join(workdir, "state.sqlite"),
+        "OVERPASS_CACHE_DIR": os.path.join(workdir, "overpass_cache"),
+        "OVERPASS_CACHE_MODE": "off",
+        # Pas de limitation de débit face au stub : on mesure le pipeline, pas la politesse envers Overpass
+        "OVERPASS_RATE": "1000",
+        "OVERPASS_BURST": "1000",
+        "RESULT_CACHE_DB": "",
+        "SPATIAL_DB": os.path.join(workdir, "spatial.sqlite"),
+        "FIREBASE_EMAIL": "bench@example.com",
+        "FIREBASE_PASSWORD": "bench",
+        "FIREBASE_API_KEY": "bench",
+        "FIREBASE_IDENTITY_URL": f"{stub_url}/identity",
+        "FIREBASE_SECURE_TOKEN_URL": f"{stub_url}/securetoken",
+        "FIREBASE_TOKEN_CACHE": os.path.join(workdir, "firebase-token.json"),
+    })
+
+
+def timed(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def summarize(timings, **details):
+    return dict({
+        "runs": len(timings),
+        "min_s": round(min(timings), 6),
+        "median_s": round(statistics.median(timings), 6),
+        "mean_s": round(statistics.mean(timings), 6),
+        "max_s": round(max(timings), 6),
+    }, **details)
+
+
+def bench_extract_coords(ski_data, overpass_response, repeat):
+    elements = overpass_response["elements"]
+    ways = [el for el in elements if el["type"] in ("way", "relation")]
+
+    def run():
+        node_index, element_index = ski_data.index_elements(elements)
+        return sum(len(ski_data.extract_coords(el, node_index, element_index)) for el in ways)
+
+    timings, vertices = timed(run, repeat)
+    return summarize(timings, elements=len(elements), ways=len(ways), vertices=vertices)
+
+
+def bench_get_station_info(ski_data, repeat):
+    timings, info = timed(lambda: ski_data.get_station_info(BENCH_STATION, cache_mode="off"), repeat)
+    return summarize(timings, pistes=len(info["pistes"]), remontees=len(info["remontees"]),
+                     vertices=sum(len(p["coords"]) for p in info["pistes"] + info["remontees"])), info
+
+
+def bench_trouver_connections(connections, info, engines, tolerance, repeat):
+    slopes, chair_lifts = connections.build_station_elements(info)
+    report = {}
+    for engine in engines:
+        def run():
+            return connections.trouver_connections(copy.deepcopy(slopes), copy.deepcopy(chair_lifts),
+                                                   tolerance, engine)
+        timings, (s, l) = timed(run, repeat)
+        report[engine] = summarize(timings, connections=sum(len(e["connection"]) for e in s + l))
+    return report
+
+
+def bench_process(processor, stub, stations, tolerance, repeat):
+    client = processor.app.test_client()
+    payload = {"destination_url": f"{stub.base_url}/destination", "tolerance": tolerance,
+               "cache": False, "data": stations}
+    body = json.dumps(payload, default=sys.modules["ski_common.geometry"].json_default).encode("utf-8")
+    statuses = []
+
+    def run():
+        response = client.post("/process", data=body, headers={"Content-Type": "application/json"})
+        statuses.append(response.status_code)
+        return response.get_json()
+
+    stub.reset()
+    timings, result = timed(run, repeat)
+    return summarize(timings, stations=len(stations), request_bytes=len(body),
+                     statuses=sorted(set(statuses)),
+                     successful_stations=result.get("successful_stations"),
+                     failed_stations=result.get("failed_stations"),
+                     destination_requests=stub.counters["destination_requests"],
+                     destination_bytes=stub.counters["destination_bytes"])
+
+
+def bench_fetch_stations(ski_data, stub, station_count, repeat):
+    ski_data.station_names[:] = [f"{BENCH_STATION} {i}" for i in range(station_count)]
+    client = ski_data.app.test_client()
+    body = {"destination_url": f"{stub.base_url}/destination", "cache_mode": "off",
+            "concurrency": min(station_count, ski_data.MAX_CONCURRENCY)}
+    statuses = []
+
+    def run():
+        response = client.post("/fetch-stations", json=body)
+        statuses.append(response.status_code)
+        return response.get_json()
+
+    stub.reset()
+    timings, result = timed(run, repeat)
+    return summarize(timings, stations=station_count, statuses=sorted(set(statuses)),
+                     stations_count=result.get("stations_count"),
+                     failed_stations=len(result.get("failed_stations") or []),
+                     payload_bytes=result.get("payload_bytes"),
+                     overpass_requests=stub.counters["overpass_requests"],
+                     destination_bytes=stub.counters["destination_bytes"])
+
+
+def bench_fetch_fused(ski_data, stub, station_count, tolerance, repeat):
+    """/fetch-for-process en mode fusionné : récolte et détection des connexions dans ski-data."""
+    ski_data.station_names[:] = [f"{BENCH_STATION} {i}" for i in range(station_count)]
+    client = ski_data.app.test_client()
+    body = {"mode": "fused", "forward_to_url": f"{stub.base_url}/destination", "tolerance": tolerance,
+            "cache_mode": "off", "concurrency": min(station_count, ski_data.MAX_CONCURRENCY)}
+    statuses = []
+
+    def run():
+        response = client.post("/fetch-for-process", json=body)
+        statuses.append(response.status_code)
+        return response.get_json()
+
+    stub.reset()
+    timings, result = timed(run, repeat)
+    return summarize(timings, stations=station_count, statuses=sorted(set(statuses)),
+                     stations_count=result.get("stations_count"),
+                     failed_stations=len(result.get("failed_stations") or []),
+                     bytes_sent=result.get("bytes_sent"),
+                     overpass_requests=stub.counters["overpass_requests"],
+                     destination_requests=stub.counters["destination_requests"],
+                     destination_bytes=stub.counters["destination_bytes"])
+
+
+def retained_bytes(build):
+    """(objet construit, octets alloués par `build` et encore retenus après l'appel)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return kept, size
+
+
+def as_lists(info):
+    """Station au format d'avant la géométrie compacte : listes de couples (lat, lon)."""
+    return dict(info, **{key: [dict(item, coords=list(item["coords"])) for item in info[key]]
+                         for key in ("pistes", "remontees")})
+
+
+def legacy_station_elements(station):
+    """build_station_elements d'avant geometry.py : inversion [lat, lon] -> [lon, lat] par copie."""
+    slopes = [{"name": p["name"], "difficulty": p["difficulty"], "connection": [],
+               "coordinates": [[pt[1], pt[0]] for pt in p["coords"]]} for p in station["pistes"]]
+    chair_lifts = [{"station": l["name"], "type": l["type"], "connection": [],
+                    "coordinates": [[pt[1], pt[0]] for pt in l["coords"]]} for l in station["remontees"]]
+    return slopes, chair_lifts
+
+
+def bench_harvest_memory(ski_data, connections, overpass_response, station_count):
+    """Mémoire retenue par une récolte complète : géométrie compacte (Polyline) contre listes de couples."""
+    responses = [(f"{BENCH_STATION} {i}", overpass_response(f"{BENCH_STATION} {i}")) for i in range(station_count)]
+    compact, compact_bytes = retained_bytes(lambda: [ski_data.parse_station_data(s, d) for s, d in responses])
+    legacy, legacy_bytes = retained_bytes(lambda: [as_lists(ski_data.parse_station_data(s, d)) for s, d in responses])
+    vertices = sum(len(item["coords"]) for info in compact for item in info["pistes"] + info["remontees"])
+    decoded = json.loads(json.dumps(legacy))  # stations telles que /process les reçoit en JSON
+    del responses, legacy
+    _, swap_copy = retained_bytes(lambda: [legacy_station_elements(info) for info in decoded])
+    _, swap_from_json = retained_bytes(lambda: [connections.build_station_elements(info) for info in decoded])
+    _, swap_view = retained_bytes(lambda: [connections.build_station_elements(info) for info in compact])
+    return {
+        "stations": station_count,
+        "vertices": vertices,
+        "harvest": {
+            "lists_bytes": legacy_bytes,
+            "compact_bytes": compact_bytes,
+            "lists_bytes_per_vertex": round(legacy_bytes / max(vertices, 1), 1),
+            "compact_bytes_per_vertex": round(compact_bytes / max(vertices, 1), 1),
+            "reduction": round(1 - compact_bytes / max(legacy_bytes, 1), 3),
+        },
+        # Coordonnées [lon, lat] construites par /process, en plus des stations reçues
+        "lonlat_swap": {
+            "copy_bytes": swap_copy,
+            "compact_from_json_bytes": swap_from_json,
+            "view_bytes": swap_view,
+        },
+    }
+
+
+def bench_spatial(processor, connections, overpass_response, station_count, tolerance, queries, seed):
+    """Store spatial rempli avec `station_count` stations traitées, puis requêtes en des points tirés au hasard."""
+    store = processor.get_spatial_store()
+    names = [f"{BENCH_STATION} {i}" for i in range(station_count)]
+    processed = [connections.process_station(processor_info(connections, overpass_response, name), tolerance)
+                 for name in names]
+    load_timings = []
+    for entry in processed:
+        start = time.perf_counter()
+        store.put_station(entry, content_key=entry["station"])
+        load_timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    unchanged = sum(not store.put_station(entry, content_key=entry["station"]) for entry in processed)
+    skip_s = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    points = []
+    for _ in range(queries):
+        slope = rng.choice(rng.choice(processed)["slopes"])
+        lon, lat = slope["coordinates"][rng.randrange(len(slope["coordinates"]))]
+        points.append((lat + rng.uniform(-0.0002, 0.0002), lon + rng.uniform(-0.0002, 0.0002)))
+
+    def per_query(fn):
+        timings, results = [], []
+        for lat, lon in points:
+            start = time.perf_counter()
+            results.append(fn(lat, lon))
+            timings.append(time.perf_counter() - start)
+        return summarize(timings, hits=sum(1 for r in results if r)), results
+
+    nearest, _ = per_query(lambda lat, lon: store.nearest(lat, lon))
+    nearest_lift, _ = per_query(lambda lat, lon: store.nearest(lat, lon, kind="lift"))
+    which, found = per_query(lambda lat, lon: store.which_piste(lat, lon))
+    bbox, _ = per_query(lambda lat, lon: store.in_bbox(lat - 0.002, lon - 0.002, lat + 0.002, lon + 0.002))
+    return {
+        "stats": store.stats(),
+        "load": summarize(load_timings, stations=station_count),
+        "reload_unchanged_s": round(skip_s, 6),
+        "unchanged_skipped": unchanged,
+        "queries": {"nearest": nearest, "nearest_lift": nearest_lift, "which_piste": which, "bbox_400m": bbox},
+    }
+
+
+def processor_info(connections, overpass_response, name):
+    """Station au format ski-data, telle que /process la reçoit, sans passer par le stub HTTP."""
+    ski_data = sys.modules["ski_data_main"]
+    return ski_data.parse_station_data(name, overpass_response(name))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    if args.overpass_replay:
+        overpass_response = OverpassReplay(args.overpass_replay)
+    else:
+        def overpass_response(station):
+            return synthetic_overpass(station, args.pistes, args.lifts, args.vertices, seed=args.seed)
+    stub = StubServer(overpass_response, latency=args.latency).start()
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "stages": {},
+    }
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure_environment(workdir, stub.base_url)
+            ski_data = load_service(SKI_DATA_DIR, "ski_data_main")
+            overpass_url = f"{stub.base_url}/overpass/api/interpreter"
+            ski_data.OVERPASS_ENDPOINTS = [overpass_url]
+            ski_data.endpoint_pool = ski_data.EndpointPool(ski_data.OVERPASS_ENDPOINTS)
+            processor = load_service(SKI_PROCESSOR_DIR, "ski_processor_main")
+            connections = sys.modules["ski_common.connections"]
+            engines = args.engines or connections.available_engines()
+            stages = report["stages"]
+            if "extract_coords" in args.stages:
+                stages["extract_coords"] = bench_extract_coords(ski_data, overpass_response(BENCH_STATION),
+                                                                args.repeat)
+            stages["get_station_info"], info = bench_get_station_info(ski_data, args.repeat)
+            if "get_station_info" not in args.stages:
+                del stages["get_station_info"]
+            if "trouver_connections" in args.stages:
+                stages["trouver_connections"] = bench_trouver_connections(
+                    connections, info, engines, args.tolerance, args.repeat)
+            if "process" in args.stages:
+                stations = [dict(info, station=f"{BENCH_STATION} {i}") for i in range(args.stations)]
+                stages["process"] = bench_process(processor, stub, stations, args.tolerance, args.repeat)
+            if "fetch_stations" in args.stages:
+                stages["fetch_stations"] = bench_fetch_stations(ski_data, stub, args.stations, args.repeat)
+            if "fetch_fused" in args.stages:
+                stages["fetch_fused"] = bench_fetch_fused(ski_data, stub, args.stations, args.tolerance, args.repeat)
+            if "harvest_memory" in args.stages:
+                stages["harvest_memory"] = bench_harvest_memory(ski_data, connections, overpass_response,
+                                                                args.memory_stations)
+            if "spatial" in args.stages:
+                stages["spatial"] = bench_spatial(processor, connections, overpass_response, args.memory_stations,
+                                                  args.tolerance, args.queries, args.seed)
+    finally:
+        stub.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pistes", type=int, default=40)
+    parser.add_argument("--lifts", type=int, default=15)
+    parser.add_argument("--vertices", type=int, default=60, help="sommets par piste")
+    parser.add_argument("--stations", type=int, default=10, help="stations par appel /process, /fetch-stations et /fetch-for-process")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--engines", nargs="+", default=None,
+                        help="moteurs de trouver_connections (défaut : tous ceux disponibles)")
+    parser.add_argument("--memory-stations", type=int, default=130,
+                        help="stations de la récolte mesurée par harvest_memory et spatial (130 : la liste complète)")
+    parser.add_argument("--queries", type=int, default=1000, help="requêtes par type dans l'étape spatial")
+    parser.add_argument("--tolerance", type=float, default=0.0006)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="latence ajoutée par le stub, en secondes")
+    parser.add_argument("--overpass-replay", help="réponse Overpass enregistrée (fichier ou dossier)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="fichier JSON de sortie (défaut : stdout)")
+    args = parser.parse_args()
+    # Les print() des services vont sur stderr pour garder stdout au seul rapport JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        report = json.dumps(run(args), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
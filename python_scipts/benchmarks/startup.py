@@ -0,0 +1,85 @@
+"""Temps d'import à froid de ski-processor, comparé à un budget.
+
+    python startup.py --budget-ms 400 --output startup.json
+
+Chaque module est importé dans un interpréteur neuf (python -X importtime),
+sans cache disque ni identifiants : on mesure ce que paie un démarrage à froid
+Cloud Run avant la première requête. Le code de sortie vaut 1 si un module
+dépasse le budget, pour qu'un contrôle automatique le signale.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SKI_PROCESSOR_DIR = os.path.join(HERE, "..", "ski-processor")
+SKI_COMMON_DIR = os.path.join(HERE, "..", "ski-common")
+MODULES = ("main", "asgi")
+
+
+def import_time(module, workdir):
+    """(temps total en ms, liste des modules importés avec leur temps cumulé en ms)."""
+    env = dict(os.environ, RESULT_CACHE_DB="", FIREBASE_TOKEN_CACHE=os.path.join(workdir, "firebase-token.json"),
+               PYTHONDONTWRITEBYTECODE="1", PYTHONPATH=os.path.abspath(SKI_COMMON_DIR))
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=SKI_PROCESSOR_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} a échoué :\n{completed.stderr[-2000:]}")
+    modules = []
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.rstrip(), int(cumulative) / 1000))
+    total = next(ms for name, ms in modules if name.strip() == module)
+    return total, modules
+
+
+def measure(module, repeat, top, workdir):
+    totals, modules = [], []
+    for _ in range(repeat):
+        total, modules = import_time(module, workdir)
+        totals.append(total)
+    # Modules de premier niveau (les plus coûteux) de la dernière mesure
+    direct = [(name.strip(), ms) for name, ms in modules if name.startswith("  ") and not name.startswith("    ")]
+    heaviest = sorted(direct, key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "runs": repeat,
+        "min_ms": round(min(totals), 1),
+        "median_ms": round(statistics.median(totals), 1),
+        "max_ms": round(max(totals), 1),
+        "heaviest": [{"module": name, "cumulative_ms": round(ms, 1)} for name, ms in heaviest],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=list(MODULES), choices=MODULES)
+    parser.add_argument("--budget-ms", type=float, default=500.0, help="temps d'import médian maximal par module")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="nombre de modules les plus lents rapportés")
+    parser.add_argument("--output", help="fichier JSON de sortie (défaut : stdout)")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        report = {"budget_ms": args.budget_ms, "python": sys.version.split()[0],
+                  "modules": {module: measure(module, args.repeat, args.top, workdir) for module in args.modules}}
+    over = [module for module, result in report["modules"].items() if result["median_ms"] > args.budget_ms]
+    report["over_budget"] = over
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if over:
+        print(f"Budget d'import dépassé ({args.budget_ms} ms) : {', '.join(over)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
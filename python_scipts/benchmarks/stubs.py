@@ -0,0 +1,213 @@
+"""Stations synthétiques au format Overpass et serveur HTTP local remplaçant
+Overpass, Firebase Auth et l'URL de destination pendant les benchmarks."""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+STEP = 0.0001  # ~10 m entre deux sommets
+DIFFICULTIES = ["novice", "easy", "intermediate", "advanced"]
+AREA_PATTERN = re.compile(r'area\["name"="((?:[^"\\]|\\.)*)"\]')
+
+
+def station_seed(station, seed=0):
+    return int(hashlib.sha256(f"{seed}:{station}".encode("utf-8")).hexdigest()[:8], 16)
+
+
+def synthetic_overpass(station, pistes=40, lifts=15, vertices=60, split_ratio=0.3, seed=0):
+    """Réponse Overpass (out body; >; out skel qt;) d'une station synthétique déterministe.
+
+    Une partie des pistes démarre en haut d'une remontée ou sur une autre piste,
+    et `split_ratio` d'entre elles est découpée en deux ways de même nom pour
+    exercer le recollage de segments de ski-data.
+    """
+    rng = random.Random(station_seed(station, seed))
+    origin = (6.0 + rng.uniform(0, 1), 45.0 + rng.uniform(0, 1))
+    extent = 0.03 * max(pistes / 40, 1) ** 0.5
+    nodes, ways = {}, []
+    next_id = [1]
+
+    def node(lon, lat):
+        node_id = next_id[0]
+        next_id[0] += 1
+        nodes[node_id] = {"type": "node", "id": node_id, "lat": round(lat, 7), "lon": round(lon, 7)}
+        return node_id
+
+    def way(node_ids, tags):
+        ways.append({"type": "way", "id": 10_000_000 + len(ways), "nodes": node_ids, "tags": tags})
+
+    def random_point():
+        return origin[0] + rng.uniform(0, extent), origin[1] + rng.uniform(0, extent)
+
+    lift_tops, piste_nodes = [], []
+    for i in range(lifts):
+        lon, lat = random_point()
+        top = (lon + rng.uniform(-0.01, 0.01), lat + rng.uniform(0.005, 0.015))
+        ids = [node(lon, lat), node((lon + top[0]) / 2, (lat + top[1]) / 2), node(*top)]
+        lift_tops.append(ids[-1])
+        way(ids, {"aerialway": "chair_lift", "name": f"Télésiège {i}"})
+    for i in range(pistes):
+        roll = rng.random()
+        if roll < 0.3 and lift_tops:
+            ids = [rng.choice(lift_tops)]
+        elif roll < 0.6 and piste_nodes:
+            ids = [rng.choice(piste_nodes)]
+        else:
+            ids = [node(*random_point())]
+        lon, lat = nodes[ids[0]]["lon"], nodes[ids[0]]["lat"]
+        heading = rng.uniform(0, 2 * math.pi)
+        for _ in range(vertices - 1):
+            heading += rng.uniform(-0.4, 0.4)
+            lon += STEP * math.cos(heading)
+            lat += STEP * math.sin(heading)
+            ids.append(node(lon, lat))
+        piste_nodes.extend(ids[1:])
+        tags = {"piste:type": "downhill", "piste:difficulty": rng.choice(DIFFICULTIES), "name": f"Piste {i}"}
+        if rng.random() < split_ratio and len(ids) > 3:
+            cut = len(ids) // 2
+            way(ids[:cut + 1], tags)
+            way(ids[cut:], tags)
+        else:
+            way(ids, tags)
+    used = {node_id for w in ways for node_id in w["nodes"]}
+    return {"elements": ways + [nodes[node_id] for node_id in sorted(used)]}
+
+
+class OverpassReplay:
+    """Réponses Overpass enregistrées : un fichier JSON, ou un dossier (un fichier par station).
+
+    Accepte les réponses brutes comme les entrées du cache disque de ski-data
+    ({"station", "fetched_at", "data"}). Une station sans fichier reçoit la
+    première réponse du dossier.
+    """
+
+    def __init__(self, path):
+        self.responses = {}
+        paths = [path] if os.path.isfile(path) else sorted(
+            os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json")
+        )
+        for file_path in paths:
+            with open(file_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if "elements" not in entry and isinstance(entry.get("data"), dict):
+                station, entry = entry.get("station"), entry["data"]
+            else:
+                station = None
+            station = station or os.path.splitext(os.path.basename(file_path))[0]
+            self.responses[station] = entry
+        if not self.responses:
+            raise ValueError(f"Aucune réponse Overpass dans {path}")
+        self.default = next(iter(self.responses.values()))
+
+    def __call__(self, station):
+        return self.responses.get(station, self.default)
+
+
+class StubServer:
+    """Serveur local à trois rôles, selon le chemin :
+
+      /overpass/api/interpreter      Overpass (requêtes simples et groupées)
+      /identity/..., /securetoken/... Firebase Auth (signInWithPassword, refresh)
+      /destination                    destination des stations traitées
+    """
+
+    def __init__(self, overpass_response, latency=0.0):
+        self.overpass_response = overpass_response
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.counters = {"overpass_requests": 0, "auth_requests": 0,
+                         "destination_requests": 0, "destination_bytes": 0}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def reset(self):
+        with self.lock:
+            for name in self.counters:
+                self.counters[name] = 0
+
+    def overpass(self, query):
+        stations = [s.replace('\\"', '"') for s in AREA_PATTERN.findall(query)]
+        if len(stations) == 1:
+            return self.overpass_response(stations[0])
+        elements = []
+        for station in stations:
+            block = self.overpass_response(station)["elements"]
+            elements.append({"type": "count", "id": 0, "tags": {"total": str(len(block))}})
+            elements.extend(block)
+        return {"elements": elements}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _read_body(self):
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    parts = []
+                    while True:
+                        size = int(self.rfile.readline().strip() or b"0", 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return b"".join(parts)
+                        parts.append(self.rfile.read(size))
+                        self.rfile.readline()
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self._read_body()
+                if stub.latency:
+                    time.sleep(stub.latency)
+                path = self.path.split("?")[0]
+                if path.startswith("/overpass"):
+                    stub.count("overpass_requests")
+                    query = parse_qs(body.decode("utf-8")).get("data", [""])[0]
+                    self._send(200, stub.overpass(query))
+                elif path.startswith("/identity"):
+                    stub.count("auth_requests")
+                    self._send(200, {"idToken": "bench-token", "refreshToken": "bench-refresh", "expiresIn": "3600"})
+                elif path.startswith("/securetoken"):
+                    stub.count("auth_requests")
+                    self._send(200, {"id_token": "bench-token", "refresh_token": "bench-refresh", "expires_in": "3600"})
+                elif path.startswith("/destination"):
+                    stub.count("destination_requests")
+                    stub.count("destination_bytes", len(body))
+                    self._send(200, {"status": "stored"})
+                else:
+                    self._send(404, {"error": f"Unknown stub path {path}"})
+
+        return Handler
@@ -0,0 +1,2 @@
+# Modules communs à ski-data et ski-processor (géométrie, format d'échange,
+# détection des connexions, jeton Firebase), installés dans les deux images.
@@ -0,0 +1,585 @@
+import logging
+import math
+
+from .geometry import Polyline
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOLERANCE = 0.0006
+DEFAULT_ENGINE = "grid"
+EARTH_RADIUS_M = 6371008.8
+# Nombre max. de couples extrémité/sommet évalués à la fois par le moteur numpy
+NUMPY_BLOCK_PAIRS = 4_000_000
+
+
+def trouver_connections_reference(slopes, chair_lifts, tolerance=0.0006):
+    """Implémentation d'origine, en force brute : sert de référence pour les autres moteurs."""
+    def points_proches(p1, p2, tol=tolerance):
+        distance = abs(p1[0] - p2[0]) + abs(p1[1] - p2[1])
+        return distance < tol
+    for i, slope in enumerate(slopes):
+        if not slope["coordinates"]:
+            continue
+        debut_slope = slope["coordinates"][0]
+        fin_slope = slope["coordinates"][-1]
+        for j, autre in enumerate(slopes):
+            if i == j or not autre["coordinates"]:
+                continue
+            for coord_autre in autre["coordinates"]:
+                if points_proches(debut_slope, coord_autre) or points_proches(fin_slope, coord_autre):
+                    if not any(c["name"] == slope["name"] for c in autre["connection"]):
+                        autre["connection"].append({
+                            "name": slope["name"],
+                            "coordinates": coord_autre,
+                            "type": "slope"
+                        })
+                    break
+    for slope in slopes:
+        if not slope["coordinates"]:
+            continue
+        debut_slope = slope["coordinates"][0]
+        fin_slope = slope["coordinates"][-1]
+        for chair_lift in chair_lifts:
+            if not chair_lift["coordinates"]:
+                continue
+            bas = chair_lift["coordinates"][0]
+            haut = chair_lift["coordinates"][-1]
+            if points_proches(fin_slope, bas) or points_proches(debut_slope, haut):
+                if not any(c["name"] == slope["name"] for c in chair_lift["connection"]):
+                    chair_lift["connection"].append({
+                        "name": slope["name"],
+                        "coordinates": fin_slope if points_proches(fin_slope, bas) else debut_slope,
+                        "type": "slope"
+                    })
+    for i, lift in enumerate(chair_lifts):
+        if not lift["coordinates"]:
+            continue
+        haut = lift["coordinates"][-1]
+        for j, autre in enumerate(chair_lifts):
+            if i == j or not autre["coordinates"]:
+                continue
+            bas_autre = autre["coordinates"][0]
+            if points_proches(haut, bas_autre):
+                if not any(c["name"] == element_name(lift) for c in autre["connection"]):
+                    autre["connection"].append({
+                        "name": element_name(lift),
+                        "coordinates": haut,
+                        "type": "chair_lift"
+                    })
+    for lift in chair_lifts:
+        if not lift["coordinates"]:
+            continue
+        haut = lift["coordinates"][-1]
+        for slope in slopes:
+            if not slope["coordinates"]:
+                continue
+            debut = slope["coordinates"][0]
+            if points_proches(haut, debut):
+                if not any(c["name"] == element_name(lift) for c in slope["connection"]):
+                    slope["connection"].append({
+                        "name": element_name(lift),
+                        "coordinates": haut,
+                        "type": "chair_lift"
+                    })
+    return slopes, chair_lifts
+
+
+def _grid_key(point, cell):
+    return math.floor(point[0] / cell), math.floor(point[1] / cell)
+
+
+def build_grid(items, cell):
+    """items : (point, valeur). Renvoie {cellule: [valeurs]}."""
+    grid = {}
+    for point, value in items:
+        grid.setdefault(_grid_key(point, cell), []).append(value)
+    return grid
+
+
+def grid_candidates(grid, point, cell):
+    """Valeurs des 9 cellules autour de `point` : tout point à moins d'une cellule sur chaque axe."""
+    kx, ky = _grid_key(point, cell)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            yield from grid.get((kx + dx, ky + dy), ())
+
+
+def trouver_connections_grid(slopes, chair_lifts, tolerance=DEFAULT_TOLERANCE):
+    """Même résultat que trouver_connections_reference, via une grille de hachage.
+
+    Deux points à distance de Manhattan < tolerance sont à moins d'une cellule
+    l'un de l'autre sur chaque axe : il suffit d'examiner les 9 cellules voisines.
+    La marge sur la taille de cellule absorbe les arrondis de la division.
+    """
+    if not tolerance > 0:
+        return slopes, chair_lifts
+    cell = tolerance * (1 + 1e-6)
+
+    def points_proches(p1, p2, tol=tolerance):
+        distance = abs(p1[0] - p2[0]) + abs(p1[1] - p2[1])
+        return distance < tol
+
+    # Pistes entre elles : pour chaque autre piste, premier sommet proche d'une extrémité
+    vertex_grid = build_grid(
+        ((coord, (j, k)) for j, autre in enumerate(slopes) for k, coord in enumerate(autre["coordinates"])),
+        cell
+    )
+    for i, slope in enumerate(slopes):
+        if not slope["coordinates"]:
+            continue
+        first_hit = {}
+        for extremite in (slope["coordinates"][0], slope["coordinates"][-1]):
+            for j, k in grid_candidates(vertex_grid, extremite, cell):
+                if j != i and k < first_hit.get(j, k + 1) and points_proches(extremite, slopes[j]["coordinates"][k]):
+                    first_hit[j] = k
+        for j in sorted(first_hit):
+            autre = slopes[j]
+            coord_autre = autre["coordinates"][first_hit[j]]
+            if not any(c["name"] == slope["name"] for c in autre["connection"]):
+                autre["connection"].append({
+                    "name": slope["name"],
+                    "coordinates": coord_autre,
+                    "type": "slope"
+                })
+
+    lifts_with_coords = [(j, lift) for j, lift in enumerate(chair_lifts) if lift["coordinates"]]
+    bas_grid = build_grid(((lift["coordinates"][0], j) for j, lift in lifts_with_coords), cell)
+    haut_grid = build_grid(((lift["coordinates"][-1], j) for j, lift in lifts_with_coords), cell)
+
+    # Arrivée de piste au bas d'une remontée, ou départ de piste en haut d'une remontée
+    for slope in slopes:
+        if not slope["coordinates"]:
+            continue
+        debut_slope = slope["coordinates"][0]
+        fin_slope = slope["coordinates"][-1]
+        candidates = set(grid_candidates(bas_grid, fin_slope, cell))
+        candidates.update(grid_candidates(haut_grid, debut_slope, cell))
+        for j in sorted(candidates):
+            chair_lift = chair_lifts[j]
+            bas = chair_lift["coordinates"][0]
+            haut = chair_lift["coordinates"][-1]
+            if points_proches(fin_slope, bas) or points_proches(debut_slope, haut):
+                if not any(c["name"] == slope["name"] for c in chair_lift["connection"]):
+                    chair_lift["connection"].append({
+                        "name": slope["name"],
+                        "coordinates": fin_slope if points_proches(fin_slope, bas) else debut_slope,
+                        "type": "slope"
+                    })
+
+    # Haut d'une remontée au bas d'une autre
+    for i, lift in lifts_with_coords:
+        haut = lift["coordinates"][-1]
+        for j in sorted(set(grid_candidates(bas_grid, haut, cell))):
+            if i == j:
+                continue
+            autre = chair_lifts[j]
+            if points_proches(haut, autre["coordinates"][0]):
+                if not any(c["name"] == element_name(lift) for c in autre["connection"]):
+                    autre["connection"].append({
+                        "name": element_name(lift),
+                        "coordinates": haut,
+                        "type": "chair_lift"
+                    })
+
+    # Haut d'une remontée au départ d'une piste
+    debut_grid = build_grid(
+        ((slope["coordinates"][0], j) for j, slope in enumerate(slopes) if slope["coordinates"]),
+        cell
+    )
+    for i, lift in lifts_with_coords:
+        haut = lift["coordinates"][-1]
+        for j in sorted(set(grid_candidates(debut_grid, haut, cell))):
+            slope = slopes[j]
+            if points_proches(haut, slope["coordinates"][0]):
+                if not any(c["name"] == element_name(lift) for c in slope["connection"]):
+                    slope["connection"].append({
+                        "name": element_name(lift),
+                        "coordinates": haut,
+                        "type": "chair_lift"
+                    })
+    return slopes, chair_lifts
+
+
+def manhattan(p1, p2):
+    """Distance de Manhattan, critère des moteurs en degrés (distance < tolerance)."""
+    return abs(p1[0] - p2[0]) + abs(p1[1] - p2[1])
+
+
+def euclidean(p1, p2):
+    return math.hypot(p1[0] - p2[0], p1[1] - p2[1])
+
+
+def metric_frame(slopes, chair_lifts):
+    """Repère équirectangulaire local (lon0, lat0, kx, ky) partagé par les moteurs métriques.
+
+    L'origine est la moyenne des extrémités des éléments non vides ; kx et ky
+    convertissent un écart en degrés en mètres. None si aucun élément n'a de point.
+    """
+    ends = [c for el in slopes + chair_lifts if el["coordinates"]
+            for c in (el["coordinates"][0], el["coordinates"][-1])]
+    if not ends:
+        return None
+    lon0 = sum(p[0] for p in ends) / len(ends)
+    lat0 = sum(p[1] for p in ends) / len(ends)
+    kx = EARTH_RADIUS_M * math.cos(math.radians(lat0)) * math.pi / 180
+    ky = EARTH_RADIUS_M * math.pi / 180
+    return lon0, lat0, kx, ky
+
+
+def _project_metric(slopes, chair_lifts):
+    """Copie des coordonnées [lon, lat] projetées en mètres dans le repère de metric_frame."""
+    frame = metric_frame(slopes, chair_lifts)
+    if frame is None:
+        return [[] for _ in slopes], [[] for _ in chair_lifts]
+    lon0, lat0, kx, ky = frame
+
+    def project(coords):
+        return [((lon - lon0) * kx, (lat - lat0) * ky) for lon, lat in coords]
+
+    return [project(s["coordinates"]) for s in slopes], [project(l["coordinates"]) for l in chair_lifts]
+
+
+def element_name(element):
+    # Les remontées construites par build_station_elements portent leur nom dans "station"
+    return element.get("name", element.get("station"))
+
+
+class _UnionFind:
+    def __init__(self, nodes):
+        self.parent = {node: node for node in nodes}
+        self.size = {node: 1 for node in nodes}
+
+    def find(self, node):
+        while self.parent[node] != node:
+            self.parent[node] = self.parent[self.parent[node]]
+            node = self.parent[node]
+        return node
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+
+def candidate_pairs(slopes, chair_lifts, max_tolerance, metric=False):
+    """Toutes les connexions possibles sous `max_tolerance`, avec leur distance d'activation.
+
+    Renvoie des tuples (distance, type, source, cible) : la connexion existe pour
+    toute tolérance t > distance, selon les mêmes règles que trouver_connections.
+    """
+    if metric:
+        slope_coords, lift_coords = _project_metric(slopes, chair_lifts)
+        distance = euclidean
+    else:
+        slope_coords = [s["coordinates"] for s in slopes]
+        lift_coords = [l["coordinates"] for l in chair_lifts]
+        distance = manhattan
+    cell = max_tolerance * (1 + 1e-6)
+    pairs = []
+
+    vertex_grid = build_grid(
+        ((coord, (j, k)) for j, coords in enumerate(slope_coords) for k, coord in enumerate(coords)), cell
+    )
+    for i, coords in enumerate(slope_coords):
+        if not coords:
+            continue
+        best = {}
+        for extremite in (coords[0], coords[-1]):
+            for j, k in grid_candidates(vertex_grid, extremite, cell):
+                if j != i:
+                    d = distance(extremite, slope_coords[j][k])
+                    if d < best.get(j, max_tolerance):
+                        best[j] = d
+        pairs.extend((d, "slope_slope", ("slope", i), ("slope", j)) for j, d in best.items())
+
+    lifts = [(j, coords) for j, coords in enumerate(lift_coords) if coords]
+    bas_grid = build_grid(((coords[0], j) for j, coords in lifts), cell)
+    haut_grid = build_grid(((coords[-1], j) for j, coords in lifts), cell)
+    debut_grid = build_grid(((coords[0], i) for i, coords in enumerate(slope_coords) if coords), cell)
+    for i, coords in enumerate(slope_coords):
+        if not coords:
+            continue
+        for j in set(grid_candidates(bas_grid, coords[-1], cell)) | set(grid_candidates(haut_grid, coords[0], cell)):
+            d = min(distance(coords[-1], lift_coords[j][0]), distance(coords[0], lift_coords[j][-1]))
+            if d < max_tolerance:
+                pairs.append((d, "slope_lift", ("slope", i), ("lift", j)))
+    for i, coords in lifts:
+        for j in set(grid_candidates(bas_grid, coords[-1], cell)):
+            d = distance(coords[-1], lift_coords[j][0])
+            if i != j and d < max_tolerance:
+                pairs.append((d, "lift_lift", ("lift", i), ("lift", j)))
+        for j in set(grid_candidates(debut_grid, coords[-1], cell)):
+            d = distance(coords[-1], slope_coords[j][0])
+            if d < max_tolerance:
+                pairs.append((d, "lift_slope", ("lift", i), ("slope", j)))
+    return pairs
+
+
+def sweep_tolerances(slopes, chair_lifts, tolerances, metric=False):
+    """Statistiques de connexion pour plusieurs tolérances, en une seule passe.
+
+    Les couples candidats sont calculés une fois sous la plus grande tolérance,
+    triés par distance, puis ajoutés au fil des seuils croissants : les
+    connexions et les composantes connexes (union-find) sont mises à jour
+    incrémentalement. Les listes `connection` ne sont pas modifiées.
+    """
+    thresholds = sorted(set(float(t) for t in tolerances))
+    if not thresholds or not thresholds[-1] > 0:
+        raise ValueError("Au moins une tolérance strictement positive est requise")
+    pairs = sorted(candidate_pairs(slopes, chair_lifts, thresholds[-1], metric), key=lambda p: p[0])
+    elements = {("slope", i): s for i, s in enumerate(slopes)}
+    elements.update({("lift", j): l for j, l in enumerate(chair_lifts)})
+    nodes = [node for node, el in elements.items() if el["coordinates"]]
+
+    union_find = _UnionFind(nodes)
+    seen = set()
+    by_type = {"slope_slope": 0, "slope_lift": 0, "lift_lift": 0, "lift_slope": 0}
+    linked = set()
+    stats, index = {}, 0
+    for threshold in thresholds:
+        while index < len(pairs) and pairs[index][0] < threshold:
+            _, kind, source, target = pairs[index]
+            index += 1
+            union_find.union(source, target)
+            linked.update((source, target))
+            # Même déduplication par nom que les listes `connection`
+            key = (target, element_name(elements[source]))
+            if key not in seen:
+                seen.add(key)
+                by_type[kind] += 1
+        roots = {}
+        for node in nodes:
+            root = union_find.find(node)
+            roots[root] = roots.get(root, 0) + 1
+        stats[threshold] = {
+            "connections": len(seen),
+            "by_type": dict(by_type),
+            "components": len(roots),
+            "largest_component": max(roots.values(), default=0),
+            "isolated": len(nodes) - len(linked),
+        }
+    return [dict(stats[float(t)], tolerance=t) for t in tolerances]
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("Le moteur 'numpy' nécessite le paquet numpy")
+    return numpy
+
+
+def trouver_connections_numpy(slopes, chair_lifts, tolerance=DEFAULT_TOLERANCE, tolerance_m=None):
+    """Version vectorisée : sommets et extrémités dans des tableaux numpy contigus.
+
+    Sans `tolerance_m`, le critère est celui de la référence (distance de
+    Manhattan en degrés < tolerance) et le résultat est identique. Avec
+    `tolerance_m`, les coordonnées [lon, lat] sont projetées une fois dans un
+    repère local en mètres (équirectangulaire autour du centre de la station)
+    et le critère devient une distance euclidienne < tolerance_m.
+    """
+    np = _import_numpy()
+    metric = tolerance_m is not None
+    tol = float(tolerance_m if metric else tolerance)
+    if not tol > 0:
+        return slopes, chair_lifts
+
+    lifts_idx = [j for j, lift in enumerate(chair_lifts) if lift["coordinates"]]
+    slopes_idx = [i for i, slope in enumerate(slopes) if slope["coordinates"]]
+    if not slopes_idx and not lifts_idx:
+        return slopes, chair_lifts
+
+    project = None
+    if metric:
+        lon0, lat0, kx, ky = metric_frame(slopes, chair_lifts)
+        origin, scale = np.array([lon0, lat0]), np.array([kx, ky])
+
+        def project(arr):
+            return (arr - origin) * scale
+
+    def as_array(points):
+        arr = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return project(arr) if project else arr
+
+    def stack(polylines):
+        """Sommets de plusieurs polylignes bout à bout, copiés directement depuis les Polyline."""
+        return as_array(np.concatenate([
+            p.to_numpy() if isinstance(p, Polyline) else np.asarray(p, dtype=np.float64).reshape(-1, 2)
+            for p in polylines
+        ]))
+
+    def proches(a, b):
+        """Matrice len(a) x len(b) des couples de points à moins de la tolérance."""
+        dx = a[:, None, 0] - b[None, :, 0]
+        dy = a[:, None, 1] - b[None, :, 1]
+        if metric:
+            return dx * dx + dy * dy < tol * tol
+        return np.abs(dx) + np.abs(dy) < tol
+
+    # Pistes entre elles : premier sommet (k minimal) de la piste j proche d'une extrémité de la piste i
+    if slopes_idx:
+        counts = np.array([len(slopes[i]["coordinates"]) for i in slopes_idx])
+        vertices = stack([slopes[i]["coordinates"] for i in slopes_idx])
+        owner = np.repeat(slopes_idx, counts)
+        position = np.arange(len(vertices)) - np.repeat(np.cumsum(counts) - counts, counts)
+        by_x = np.argsort(vertices[:, 0], kind="stable")
+        vertices, owner, position = vertices[by_x], owner[by_x], position[by_x]
+
+        ends = as_array([c for i in slopes_idx for c in (slopes[i]["coordinates"][0], slopes[i]["coordinates"][-1])])
+        end_owner = np.repeat(slopes_idx, 2)
+        end_by_x = np.argsort(ends[:, 0], kind="stable")
+        ends, end_owner = ends[end_by_x], end_owner[end_by_x]
+
+        # Fenêtre en x légèrement élargie pour ne rien perdre aux arrondis
+        margin = tol * (1 + 1e-6)
+        block = max(1, NUMPY_BLOCK_PAIRS // max(len(vertices), 1))
+        hits_i, hits_j, hits_k = [], [], []
+        for start in range(0, len(ends), block):
+            e, e_owner = ends[start:start + block], end_owner[start:start + block]
+            lo = np.searchsorted(vertices[:, 0], e[0, 0] - margin, side="left")
+            hi = np.searchsorted(vertices[:, 0], e[-1, 0] + margin, side="right")
+            if lo >= hi:
+                continue
+            rows, cols = np.nonzero(proches(e, vertices[lo:hi]))
+            cols += lo
+            keep = e_owner[rows] != owner[cols]
+            hits_i.append(e_owner[rows][keep])
+            hits_j.append(owner[cols][keep])
+            hits_k.append(position[cols][keep])
+        if hits_i:
+            hits_i, hits_j, hits_k = np.concatenate(hits_i), np.concatenate(hits_j), np.concatenate(hits_k)
+            order = np.lexsort((hits_k, hits_j, hits_i))
+            hits_i, hits_j, hits_k = hits_i[order], hits_j[order], hits_k[order]
+            first = np.ones(len(hits_i), dtype=bool)
+            first[1:] = (hits_i[1:] != hits_i[:-1]) | (hits_j[1:] != hits_j[:-1])
+            for i, j, k in zip(hits_i[first].tolist(), hits_j[first].tolist(), hits_k[first].tolist()):
+                slope, autre = slopes[i], slopes[j]
+                if not any(c["name"] == slope["name"] for c in autre["connection"]):
+                    autre["connection"].append({
+                        "name": slope["name"],
+                        "coordinates": autre["coordinates"][k],
+                        "type": "slope"
+                    })
+
+    if not lifts_idx:
+        return slopes, chair_lifts
+    bas = as_array([chair_lifts[j]["coordinates"][0] for j in lifts_idx])
+    haut = as_array([chair_lifts[j]["coordinates"][-1] for j in lifts_idx])
+
+    # Arrivée de piste au bas d'une remontée, ou départ de piste en haut d'une remontée
+    if slopes_idx:
+        debuts = as_array([slopes[i]["coordinates"][0] for i in slopes_idx])
+        fins = as_array([slopes[i]["coordinates"][-1] for i in slopes_idx])
+        fin_bas = proches(fins, bas)
+        for si, li in zip(*np.nonzero(fin_bas | proches(debuts, haut))):
+            slope, chair_lift = slopes[slopes_idx[si]], chair_lifts[lifts_idx[li]]
+            if not any(c["name"] == slope["name"] for c in chair_lift["connection"]):
+                chair_lift["connection"].append({
+                    "name": slope["name"],
+                    "coordinates": slope["coordinates"][-1] if fin_bas[si, li] else slope["coordinates"][0],
+                    "type": "slope"
+                })
+
+    # Haut d'une remontée au bas d'une autre
+    haut_bas = proches(haut, bas)
+    np.fill_diagonal(haut_bas, False)
+    for li, lj in zip(*np.nonzero(haut_bas)):
+        lift, autre = chair_lifts[lifts_idx[li]], chair_lifts[lifts_idx[lj]]
+        if not any(c["name"] == element_name(lift) for c in autre["connection"]):
+            autre["connection"].append({
+                "name": element_name(lift),
+                "coordinates": lift["coordinates"][-1],
+                "type": "chair_lift"
+            })
+
+    # Haut d'une remontée au départ d'une piste
+    if slopes_idx:
+        for li, si in zip(*np.nonzero(proches(haut, debuts))):
+            lift, slope = chair_lifts[lifts_idx[li]], slopes[slopes_idx[si]]
+            if not any(c["name"] == element_name(lift) for c in slope["connection"]):
+                slope["connection"].append({
+                    "name": element_name(lift),
+                    "coordinates": lift["coordinates"][-1],
+                    "type": "chair_lift"
+                })
+    return slopes, chair_lifts
+
+
+ENGINES = {
+    "reference": trouver_connections_reference,
+    "grid": trouver_connections_grid,
+    "numpy": trouver_connections_numpy,
+}
+METRIC_ENGINES = ("numpy",)
+
+
+def available_engines():
+    """Moteurs utilisables dans cet environnement (numpy est optionnel)."""
+    engines = list(ENGINES)
+    try:
+        _import_numpy()
+    except RuntimeError:
+        engines.remove("numpy")
+    return engines
+
+
+def trouver_connections(slopes, chair_lifts, tolerance=DEFAULT_TOLERANCE, engine=None, tolerance_m=None):
+    """Ajoute les connexions entre pistes et remontées dans leurs listes `connection`.
+
+    `tolerance` est en degrés (distance de Manhattan) ; `tolerance_m`, en mètres,
+    n'est pris en charge que par le moteur numpy, choisi par défaut dans ce cas.
+    """
+    if tolerance_m is not None:
+        engine = engine or METRIC_ENGINES[0]
+        if engine not in METRIC_ENGINES:
+            raise ValueError(f"Le moteur '{engine}' ne gère pas tolerance_m")
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Moteur de connexions inconnu : {engine}")
+    if tolerance_m is not None:
+        logger.info(f"Recherche de connexions - Pistes: {len(slopes)}, Remontées: {len(chair_lifts)}, Tolérance: {tolerance_m} m, Moteur: {engine}")
+        return ENGINES[engine](slopes, chair_lifts, tolerance_m=tolerance_m)
+    logger.info(f"Recherche de connexions - Pistes: {len(slopes)}, Remontées: {len(chair_lifts)}, Tolérance: {tolerance}, Moteur: {engine}")
+    return ENGINES[engine](slopes, chair_lifts, tolerance)
+
+
+def build_station_elements(station):
+    """Pistes et remontées d'une station ski-data au format attendu par trouver_connections ([lon, lat]).
+
+    Les coordonnées ski-data sont en [lat, lon] : l'inversion est une vue sur la même Polyline.
+    """
+    slopes = [
+        {
+            "name": p.get("name", "Unnamed"),
+            "difficulty": p.get("difficulty", "unknown"),
+            "coordinates": Polyline.from_points(p.get("coords", [])).swapped(),
+            "connection": []
+        }
+        for p in station.get("pistes", [])
+    ]
+    chair_lifts = [
+        {
+            "station": l.get("name", "Unnamed"),
+            "type": l.get("type", "unknown"),
+            "coordinates": Polyline.from_points(l.get("coords", [])).swapped(),
+            "connection": []
+        }
+        for l in station.get("remontees", [])
+        if l.get("type") not in ["magic_carpet", ""]
+    ]
+    return slopes, chair_lifts
+
+
+def process_station(station, tolerance=DEFAULT_TOLERANCE, engine=None, tolerance_m=None):
+    """Station ski-data -> station traitée {"station", "slopes", "chair_lifts"}, telle qu'envoyée à la destination."""
+    slopes, chair_lifts = build_station_elements(station)
+    slopes, chair_lifts = trouver_connections(slopes, chair_lifts, tolerance, engine, tolerance_m)
+    return {
+        "station": station.get("station", "Unknown Station"),
+        "slopes": slopes,
+        "chair_lifts": chair_lifts
+    }
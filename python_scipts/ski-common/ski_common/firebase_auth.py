@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# URLs surchargeables pour pointer vers un émulateur ou un stub local
+DEFAULT_IDENTITY_URL = "https://identitytoolkit.googleapis.com/v1"
+DEFAULT_SECURE_TOKEN_URL = "https://securetoken.googleapis.com/v1"
+# Renouvellement anticipé : le jeton est rafraîchi 5 min avant son expiration
+REFRESH_MARGIN = 300
+AUTH_TIMEOUT = 30
+
+
+class FirebaseAuthError(Exception):
+    pass
+
+
+class FirebaseTokenCache:
+    """Jeton d'identification Firebase partagé par tout le processus.
+
+    Le jeton (idToken, refreshToken, expiration) est aussi écrit dans un fichier
+    protégé par un verrou, pour que les workers gunicorn se le partagent : un
+    seul appel au fournisseur d'identité à la fois, les autres attendent et
+    relisent le jeton obtenu (single-flight).
+    """
+
+    def __init__(self, email, password, api_key, identity_url=DEFAULT_IDENTITY_URL,
+                 secure_token_url=DEFAULT_SECURE_TOKEN_URL, cache_path=None, margin=REFRESH_MARGIN):
+        self.email = email
+        self.password = password
+        self.api_key = api_key
+        self.identity_url = identity_url.rstrip("/")
+        self.secure_token_url = secure_token_url.rstrip("/")
+        self.cache_path = cache_path
+        self.margin = margin
+        self.lock = threading.Lock()
+        self.token = None  # {"id_token", "refresh_token", "expires_at"}
+
+    def _is_fresh(self, token):
+        return bool(token) and token["expires_at"] - self.margin > time.time()
+
+    @contextmanager
+    def _file_lock(self):
+        if not self.cache_path or fcntl is None:
+            yield
+            return
+        with open(self.cache_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_shared(self):
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path) as f:
+                token = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Un jeton d'un autre compte (changement de variables d'environnement) est ignoré
+        return token if token.get("email") == self.email else None
+
+    def _write_shared(self, token):
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(dict(token, email=self.email), f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Unable to write Firebase token cache {self.cache_path}: {str(e)}")
+
+    def _sign_in(self):
+        response = requests.post(
+            f"{self.identity_url}/accounts:signInWithPassword",
+            params={"key": self.api_key},
+            json={"email": self.email, "password": self.password, "returnSecureToken": True},
+            timeout=AUTH_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise FirebaseAuthError(f"Firebase authentication failed: {response.status_code} - {response.text}")
+        data = response.json()
+        logger.info("Firebase authentication successful")
+        return {
+            "id_token": data["idToken"],
+            "refresh_token": data.get("refreshToken"),
+            "expires_at": time.time() + int(data.get("expiresIn", 3600))
+        }
+
+    def _refresh(self, refresh_token):
+        response = requests.post(
+            f"{self.secure_token_url}/token",
+            params={"key": self.api_key},
+            data={"grant_type": "refresh_token", "refresh_token": refresh_token},
+            timeout=AUTH_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise FirebaseAuthError(f"Firebase token refresh failed: {response.status_code} - {response.text}")
+        data = response.json()
+        logger.info("Firebase token refreshed")
+        return {
+            "id_token": data["id_token"],
+            "refresh_token": data.get("refresh_token", refresh_token),
+            "expires_at": time.time() + int(data.get("expires_in", 3600))
+        }
+
+    def _renew(self, token):
+        if token and token.get("refresh_token"):
+            try:
+                return self._refresh(token["refresh_token"])
+            except (FirebaseAuthError, requests.exceptions.RequestException, KeyError, ValueError) as e:
+                logger.warning(f"{str(e)}, falling back to sign-in")
+        return self._sign_in()
+
+    def get_token(self):
+        token = self.token
+        if self._is_fresh(token):
+            return token["id_token"]
+        with self.lock:
+            if self._is_fresh(self.token):
+                return self.token["id_token"]
+            with self._file_lock():
+                shared = self._read_shared()
+                if self._is_fresh(shared):
+                    self.token = shared
+                    return shared["id_token"]
+                token = self._renew(self.token or shared)
+                self._write_shared(token)
+                self.token = token
+                return token["id_token"]
+
+    def invalidate(self, id_token=None):
+        """Force un renouvellement au prochain appel (jeton refusé par la destination).
+
+        Avec `id_token`, seul ce jeton est écarté : s'il a déjà été remplacé par
+        un autre appelant, le nouveau jeton est conservé.
+        """
+        with self.lock:
+            if self.token and id_token in (None, self.token["id_token"]):
+                self.token = dict(self.token, expires_at=0)
+            with self._file_lock():
+                shared = self._read_shared()
+                if shared and id_token in (None, shared.get("id_token")):
+                    self._write_shared(dict(shared, expires_at=0))
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """Cache construit depuis FIREBASE_EMAIL / FIREBASE_PASSWORD / FIREBASE_API_KEY, ou None."""
+    global _token_cache
+    with _token_cache_lock:
+        if _token_cache is None:
+            email = os.getenv('FIREBASE_EMAIL')
+            password = os.getenv('FIREBASE_PASSWORD')
+            api_key = os.getenv('FIREBASE_API_KEY')
+            if not all([email, password, api_key]):
+                return None
+            _token_cache = FirebaseTokenCache(
+                email, password, api_key,
+                identity_url=os.getenv('FIREBASE_IDENTITY_URL', DEFAULT_IDENTITY_URL),
+                secure_token_url=os.getenv('FIREBASE_SECURE_TOKEN_URL', DEFAULT_SECURE_TOKEN_URL),
+                cache_path=os.getenv('FIREBASE_TOKEN_CACHE',
+                                     os.path.join(tempfile.gettempdir(), 'ski-processor-firebase-token.json')) or None
+            )
+        return _token_cache
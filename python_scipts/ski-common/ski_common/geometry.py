@@ -0,0 +1,87 @@
+# Géométrie compacte partagée par ski-data et ski-processor : les sommets d'une
+# piste ou d'une remontée sont rangés à plat dans un array('d'), 16 octets par
+# point au lieu d'une liste de couples de floats Python (plus de 100 octets par
+# point).
+#
+# Les Polyline se comportent comme des listes de points (len, index, tranches,
+# itération) ; le JSON n'est produit qu'aux frontières, via json_default.
+from array import array
+from itertools import chain
+
+
+class Polyline:
+    """Suite de points (a, b) stockée dans un array('d') : a0, b0, a1, b1, ...
+
+    `swapped()` renvoie une vue sur le même tableau avec les colonnes
+    inversées ([lat, lon] -> [lon, lat]) : aucun sommet n'est copié.
+    """
+
+    __slots__ = ("values", "swap")
+
+    def __init__(self, values=None, swap=False):
+        self.values = values if values is not None else array("d")
+        self.swap = swap
+
+    @classmethod
+    def from_points(cls, points):
+        """Polyline depuis une suite de couples ; une Polyline est renvoyée telle quelle."""
+        if isinstance(points, cls):
+            return points
+        return cls(array("d", chain.from_iterable(points)))
+
+    def swapped(self):
+        return Polyline(self.values, not self.swap)
+
+    def __len__(self):
+        return len(self.values) // 2
+
+    def __bool__(self):
+        return bool(self.values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return Polyline(self.values[2 * start:2 * max(stop, start)], self.swap)
+            return Polyline.from_points(self[i] for i in range(start, stop, step))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Polyline index out of range")
+        a, b = self.values[2 * index], self.values[2 * index + 1]
+        return (b, a) if self.swap else (a, b)
+
+    def __iter__(self):
+        values = iter(self.values)
+        if self.swap:
+            return ((a, b) for b, a in zip(values, values))
+        return zip(values, values)
+
+    def __eq__(self, other):
+        if isinstance(other, Polyline):
+            return len(self) == len(other) and all(p == q for p, q in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Polyline({self.tolist()!r})"
+
+    @property
+    def nbytes(self):
+        return self.values.itemsize * len(self.values)
+
+    def tolist(self):
+        """Forme JSON : [[a, b], ...] dans l'ordre de la vue."""
+        return [list(point) for point in self]
+
+    def to_numpy(self):
+        """Tableau numpy (n, 2) partageant la mémoire de l'array (vue inversée si `swap`)."""
+        import numpy
+        points = numpy.frombuffer(self.values, dtype=numpy.float64).reshape(-1, 2)
+        return points[:, ::-1] if self.swap else points
+
+
+def json_default(obj):
+    """Paramètre `default` de json.dumps / msgpack.packb pour les objets géométriques."""
+    if isinstance(obj, Polyline):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,212 @@
+# Format d'échange compact entre ski-data et ski-processor.
+#
+# La négociation passe par les en-têtes HTTP :
+#   X-Coords-Encoding : json (défaut) ou polylineN (polyligne Google, N décimales)
+#   Content-Type      : application/json (défaut) ou application/msgpack
+#   Content-Encoding  : identity (défaut), gzip ou zstd
+import gzip
+import io
+import json
+import re
+
+from .geometry import Polyline, json_default
+
+COORDS_HEADER = "X-Coords-Encoding"
+CONTENT_TYPES = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+}
+COMPRESSIONS = ("identity", "gzip", "zstd")
+# 7 décimales : la précision native d'OSM, l'encodage est alors sans perte
+DEFAULT_POLYLINE_PRECISION = 7
+# Taille maximale d'un corps décompressé : quelques Ko de gzip/zstd peuvent se
+# décompresser en plusieurs Go (bombe de décompression)
+DEFAULT_MAX_DECOMPRESSED_BYTES = 512 * 1024 * 1024
+DECOMPRESS_CHUNK_SIZE = 1024 * 1024
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+class PayloadTooLarge(WireFormatError):
+    pass
+
+
+def encode_polyline(coords, precision=DEFAULT_POLYLINE_PRECISION):
+    factor = 10 ** precision
+    chunks, prev_lat, prev_lon = [], 0, 0
+    for lat, lon in coords:
+        lat_i, lon_i = round(lat * factor), round(lon * factor)
+        for delta in (lat_i - prev_lat, lon_i - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat, prev_lon = lat_i, lon_i
+    return "".join(chunks)
+
+
+def decode_polyline(text, precision=DEFAULT_POLYLINE_PRECISION):
+    factor = 10 ** precision
+    coords, index, lat, lon = Polyline(), 0, 0, 0
+    length = len(text)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift, result = 0, 0
+            while True:
+                if index >= length:
+                    raise WireFormatError("Polyligne tronquée")
+                byte = ord(text[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.values.append(lat / factor)
+        coords.values.append(lon / factor)
+    return coords
+
+
+def parse_coords_encoding(name):
+    """Renvoie la précision d'un encodage polylineN, ou None pour du JSON brut."""
+    name = (name or "json").strip().lower()
+    if name == "json":
+        return None
+    match = re.fullmatch(r"polyline(\d)?", name)
+    if not match:
+        raise WireFormatError(f"Encodage de coordonnées inconnu : {name}")
+    return int(match.group(1)) if match.group(1) else DEFAULT_POLYLINE_PRECISION
+
+
+def _map_station_coords(station, convert):
+    station = dict(station)
+    for key in ("pistes", "remontees"):
+        if key in station:
+            station[key] = [dict(item, coords=convert(item.get("coords", []))) for item in station[key]]
+    return station
+
+
+def encode_station_coords(station, precision=DEFAULT_POLYLINE_PRECISION):
+    return _map_station_coords(station, lambda coords: encode_polyline(coords, precision))
+
+
+def decode_station_coords(station, precision=DEFAULT_POLYLINE_PRECISION):
+    return _map_station_coords(
+        station,
+        lambda coords: decode_polyline(coords, precision) if isinstance(coords, str) else coords
+    )
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise WireFormatError("msgpack n'est pas installé")
+    return msgpack
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise WireFormatError("zstandard n'est pas installé")
+    return zstandard
+
+
+def compress(body, compression):
+    if compression in (None, "", "identity"):
+        return body
+    if compression == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    if compression == "zstd":
+        return _zstd().ZstdCompressor(level=3).compress(body)
+    raise WireFormatError(f"Compression inconnue : {compression}")
+
+
+def iter_decompressed(stream, compression, max_size=DEFAULT_MAX_DECOMPRESSED_BYTES,
+                      chunk_size=DECOMPRESS_CHUNK_SIZE):
+    """Morceaux décompressés de `stream` (objet avec read), d'au plus `chunk_size` octets chacun.
+
+    La compression est vérifiée dès l'appel ; au-delà de `max_size` octets
+    décompressés au total, la lecture s'arrête sur PayloadTooLarge. Un corps
+    compressé invalide lève ValueError.
+    """
+    compression = (compression or "identity").strip().lower()
+    if compression == "identity":
+        reader, invalid = stream, ()
+    elif compression == "gzip":
+        reader, invalid = gzip.GzipFile(fileobj=stream, mode="rb"), (OSError, EOFError)
+    elif compression == "zstd":
+        zstandard = _zstd()
+        reader, invalid = zstandard.ZstdDecompressor().stream_reader(stream), (zstandard.ZstdError,)
+    else:
+        raise WireFormatError(f"Compression inconnue : {compression}")
+    return _read_limited(reader, compression, invalid, max_size, chunk_size)
+
+
+def _read_limited(reader, compression, invalid, max_size, chunk_size):
+    total = 0
+    while True:
+        try:
+            chunk = reader.read(chunk_size)
+        except invalid as e:
+            raise ValueError(f"Corps {compression} invalide : {e}")
+        if not chunk:
+            return
+        total += len(chunk)
+        if max_size is not None and total > max_size:
+            raise PayloadTooLarge(f"Corps de la requête trop volumineux : plus de {max_size} octets "
+                                  "une fois décompressé")
+        yield chunk
+
+
+def decompress(body, compression, max_size=DEFAULT_MAX_DECOMPRESSED_BYTES):
+    if (compression or "identity").strip().lower() == "identity" and (max_size is None or len(body) <= max_size):
+        return body
+    return b"".join(iter_decompressed(io.BytesIO(body), compression, max_size))
+
+
+def encode_payload(payload, coords="json", content_type="json", compression="identity"):
+    """Sérialise un payload {"data": [stations], ...} ; renvoie (corps, en-têtes)."""
+    if content_type not in CONTENT_TYPES:
+        raise WireFormatError(f"Content-Type inconnu : {content_type}")
+    if compression not in COMPRESSIONS:
+        raise WireFormatError(f"Compression inconnue : {compression}")
+    precision = parse_coords_encoding(coords)
+    headers = {"Content-Type": CONTENT_TYPES[content_type]}
+    if precision is not None:
+        payload = dict(payload, data=[encode_station_coords(s, precision) for s in payload.get("data", [])])
+        headers[COORDS_HEADER] = f"polyline{precision}"
+    if content_type == "msgpack":
+        body = _msgpack().packb(payload, use_bin_type=True, default=json_default)
+    else:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=json_default).encode("utf-8")
+    if compression != "identity":
+        body = compress(body, compression)
+        headers["Content-Encoding"] = compression
+    return body, headers
+
+
+def decode_payload(body, headers, max_size=DEFAULT_MAX_DECOMPRESSED_BYTES):
+    """Inverse d'encode_payload, à partir du corps brut et des en-têtes de la requête.
+
+    PayloadTooLarge si le corps dépasse `max_size` octets une fois décompressé.
+    """
+    body = decompress(body, headers.get("Content-Encoding"), max_size)
+    content_type = (headers.get("Content-Type") or CONTENT_TYPES["json"]).split(";")[0].strip().lower()
+    if content_type == CONTENT_TYPES["msgpack"]:
+        payload = _msgpack().unpackb(body, raw=False)
+    elif content_type == CONTENT_TYPES["json"]:
+        payload = json.loads(body)
+    else:
+        raise WireFormatError(f"Content-Type non supporté : {content_type}")
+    precision = parse_coords_encoding(headers.get(COORDS_HEADER))
+    if precision is not None and isinstance(payload, dict) and isinstance(payload.get("data"), list):
+        payload["data"] = [decode_station_coords(s, precision) for s in payload["data"]]
+    return payload
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Paquet importable sans installation
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
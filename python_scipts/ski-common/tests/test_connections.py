@@ -0,0 +1,104 @@
+import json
+import random
+
+import pytest
+
+from ski_common.connections import (DEFAULT_TOLERANCE, build_station_elements, sweep_tolerances,
+                                    trouver_connections)
+from ski_common.geometry import json_default
+
+
+def random_station(seed, pistes=40, remontees=12, spread=0.01):
+    """Station synthétique : les extrémités tombent souvent près d'autres éléments."""
+    rng = random.Random(seed)
+    anchors = [(45.0 + rng.uniform(0, spread), 6.0 + rng.uniform(0, spread)) for _ in range(15)]
+
+    def polyline(points):
+        start = rng.choice(anchors)
+        coords = [(start[0] + rng.uniform(-4e-4, 4e-4), start[1] + rng.uniform(-4e-4, 4e-4))]
+        for _ in range(points - 1):
+            coords.append((coords[-1][0] + rng.uniform(-1e-3, 1e-3), coords[-1][1] + rng.uniform(-1e-3, 1e-3)))
+        return [list(c) for c in coords]
+
+    return {
+        "station": f"Station {seed}",
+        "pistes": [{"name": f"Piste {i}", "difficulty": "Bleu", "coords": polyline(rng.randint(2, 12))}
+                   for i in range(pistes)] + [{"name": "Vide", "coords": []}],
+        "remontees": [{"name": f"TS {j}", "type": "chair_lift", "coords": polyline(2)} for j in range(remontees)],
+    }
+
+
+def connections(station, engine, tolerance=DEFAULT_TOLERANCE, **options):
+    slopes, chair_lifts = trouver_connections(*build_station_elements(station), tolerance, engine, **options)
+    return json.loads(json.dumps({"slopes": slopes, "chair_lifts": chair_lifts}, default=json_default))
+
+
+def count(result):
+    return sum(len(e["connection"]) for e in result["slopes"] + result["chair_lifts"])
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("tolerance", [1e-4, DEFAULT_TOLERANCE, 2e-3])
+def test_grid_matches_reference(seed, tolerance):
+    station = random_station(seed)
+    reference = connections(station, "reference", tolerance)
+    assert count(reference) > 0
+    assert connections(station, "grid", tolerance) == reference
+
+
+def test_grid_keeps_strict_tolerance_at_cell_boundary():
+    # Distance de Manhattan exactement égale à la tolérance : pas de connexion (comparaison stricte)
+    station = {
+        "pistes": [{"name": "A", "coords": [[45.0, 6.0], [45.001, 6.0]]},
+                   {"name": "B", "coords": [[45.001, 6.0005], [45.002, 6.0005]]}],
+        "remontees": [],
+    }
+    assert connections(station, "grid", 0.0005) == connections(station, "reference", 0.0005)
+    assert count(connections(station, "grid", 0.00051)) == 2  # A -> B et B -> A
+
+
+def test_grid_ignores_non_positive_tolerance():
+    assert count(connections(random_station(0), "grid", 0)) == 0
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("tolerance", [1e-4, DEFAULT_TOLERANCE, 2e-3])
+def test_numpy_matches_reference(seed, tolerance):
+    pytest.importorskip("numpy")
+    station = random_station(seed)
+    assert connections(station, "numpy", tolerance) == connections(station, "reference", tolerance)
+
+
+def test_numpy_blocks_do_not_change_result(monkeypatch):
+    pytest.importorskip("numpy")
+    from ski_common import connections as module
+    station = random_station(7, pistes=80)
+    expected = connections(station, "numpy")
+    monkeypatch.setattr(module, "NUMPY_BLOCK_PAIRS", 50)
+    assert connections(station, "numpy") == expected
+
+
+def test_numpy_metric_tolerance_in_meters():
+    pytest.importorskip("numpy")
+    # B démarre ~30 m à l'est de la fin de A (1e-5 degré de longitude ~ 0,79 m à 45°N)
+    station = {
+        "pistes": [{"name": "A", "coords": [[45.0, 6.0], [45.001, 6.0]]},
+                   {"name": "B", "coords": [[45.001, 6.00038], [45.002, 6.00038]]}],
+        "remontees": [],
+    }
+    assert count(connections(station, "numpy", tolerance_m=40)) == 2
+    assert count(connections(station, "numpy", tolerance_m=20)) == 0
+    with pytest.raises(ValueError):
+        connections(station, "grid", tolerance_m=40)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_metric_sweep_matches_numpy_engine(seed):
+    pytest.importorskip("numpy")
+    # Le balayage et le moteur numpy doivent projeter dans le même repère métrique
+    station = random_station(seed, spread=0.05)
+    tolerances = [5, 20, 60]
+    sweep = sweep_tolerances(*build_station_elements(station), tolerances, metric=True)
+    assert [s["connections"] for s in sweep] == [
+        count(connections(station, "numpy", tolerance_m=t)) for t in tolerances
+    ]
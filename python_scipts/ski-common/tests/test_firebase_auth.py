@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from ski_common import firebase_auth
+from ski_common.firebase_auth import FirebaseTokenCache
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data or {}
+        self.text = str(self.data)
+
+    def json(self):
+        return self.data
+
+
+class IdentityProvider:
+    """Remplace requests.post : signInWithPassword et /token, avec un compteur d'appels."""
+
+    def __init__(self, refresh_status=200, delay=0.0):
+        self.refresh_status = refresh_status
+        self.delay = delay
+        self.sign_ins = 0
+        self.refreshes = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, url, params=None, json=None, data=None, timeout=None):
+        time.sleep(self.delay)
+        with self.lock:
+            if url.endswith("/accounts:signInWithPassword"):
+                self.sign_ins += 1
+                return FakeResponse(200, {"idToken": f"signin-{self.sign_ins}", "refreshToken": "refresh-1",
+                                          "expiresIn": "3600"})
+            self.refreshes += 1
+            if self.refresh_status != 200:
+                return FakeResponse(self.refresh_status, {"error": "TOKEN_EXPIRED"})
+            assert data == {"grant_type": "refresh_token", "refresh_token": "refresh-1"}
+            return FakeResponse(200, {"id_token": f"refreshed-{self.refreshes}", "expires_in": "3600"})
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = IdentityProvider()
+    monkeypatch.setattr(firebase_auth.requests, "post", provider)
+    return provider
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000000.0]
+    monkeypatch.setattr(firebase_auth.time, "time", lambda: now[0])
+    return now
+
+
+def token_cache(cache_path=None):
+    return FirebaseTokenCache("ski@example.com", "secret", "key", cache_path=cache_path)
+
+
+def test_token_is_reused_while_fresh(provider, clock):
+    cache = token_cache()
+    assert cache.get_token() == "signin-1"
+    clock[0] += 3600 - firebase_auth.REFRESH_MARGIN - 1
+    assert cache.get_token() == "signin-1"
+    assert provider.sign_ins == 1
+    assert provider.refreshes == 0
+
+
+def test_expiring_token_is_exchanged_with_refresh_token(provider, clock):
+    cache = token_cache()
+    cache.get_token()
+    clock[0] += 3600 - firebase_auth.REFRESH_MARGIN + 1
+    assert cache.get_token() == "refreshed-1"
+    assert (provider.sign_ins, provider.refreshes) == (1, 1)
+
+
+def test_failed_refresh_falls_back_to_password_sign_in(provider, clock):
+    cache = token_cache()
+    cache.get_token()
+    provider.refresh_status = 400
+    clock[0] += 3600
+    assert cache.get_token() == "signin-2"
+    assert (provider.sign_ins, provider.refreshes) == (2, 1)
+
+
+def test_concurrent_callers_share_one_sign_in(monkeypatch, tmp_path):
+    provider = IdentityProvider(delay=0.05)
+    monkeypatch.setattr(firebase_auth.requests, "post", provider)
+    path = str(tmp_path / "token.json")
+    caches = [token_cache(path), token_cache(path)]  # deux workers partageant le fichier
+    barrier = threading.Barrier(8)
+    tokens = []
+
+    def worker(cache):
+        barrier.wait()
+        tokens.append(cache.get_token())
+
+    threads = [threading.Thread(target=worker, args=(caches[i % 2],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tokens == ["signin-1"] * 8
+    assert provider.sign_ins == 1
+
+
+def test_invalidate_skips_a_token_already_replaced(provider, clock):
+    cache = token_cache()
+    cache.get_token()
+    cache.invalidate("signin-1")
+    assert cache.get_token() == "refreshed-1"
+    # Un second appelant refusé avec l'ancien jeton ne force pas un nouveau renouvellement
+    cache.invalidate("signin-1")
+    assert cache.get_token() == "refreshed-1"
+    assert provider.refreshes == 1
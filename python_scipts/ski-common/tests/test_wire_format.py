@@ -0,0 +1,55 @@
+import gzip
+import io
+
+import pytest
+
+from ski_common.geometry import Polyline
+from ski_common.wire_format import (PayloadTooLarge, WireFormatError, compress, decode_payload, decompress,
+                                    encode_payload, iter_decompressed)
+
+STATION = {"station": "Test", "pistes": [{"name": "A", "difficulty": "Bleu",
+                                          "coords": Polyline.from_points([(45.1234567, 6.7654321), (45.2, 6.8)])}],
+           "remontees": []}
+
+
+@pytest.mark.parametrize("coords", ["json", "polyline7"])
+@pytest.mark.parametrize("content_type", ["json", "msgpack"])
+@pytest.mark.parametrize("compression", ["identity", "gzip", "zstd"])
+def test_payload_round_trip(coords, content_type, compression):
+    body, headers = encode_payload({"data": [STATION]}, coords, content_type, compression)
+    payload = decode_payload(body, headers)
+    piste = payload["data"][0]["pistes"][0]
+    assert [tuple(c) for c in piste["coords"]] == [(45.1234567, 6.7654321), (45.2, 6.8)]
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_decompression_stops_at_max_size(compression):
+    bomb = compress(b"\0" * (8 * 1024 * 1024), compression)
+    assert len(bomb) < 64 * 1024
+    with pytest.raises(PayloadTooLarge):
+        decompress(bomb, compression, max_size=1024 * 1024)
+    assert len(decompress(bomb, compression, max_size=8 * 1024 * 1024)) == 8 * 1024 * 1024
+
+
+def test_decompressed_chunks_are_bounded():
+    bomb = gzip.compress(b"x" * (4 * 1024 * 1024))
+    chunks = list(iter_decompressed(io.BytesIO(bomb), "gzip", chunk_size=64 * 1024))
+    assert max(len(c) for c in chunks) <= 64 * 1024
+    assert sum(len(c) for c in chunks) == 4 * 1024 * 1024
+
+
+def test_identity_body_over_max_size():
+    with pytest.raises(PayloadTooLarge):
+        decode_payload(b"[" + b" " * 2048 + b"]", {}, max_size=1024)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_invalid_compressed_body(compression):
+    with pytest.raises(ValueError) as excinfo:
+        decompress(b"not compressed", compression)
+    assert not isinstance(excinfo.value, WireFormatError)
+
+
+def test_unknown_compression():
+    with pytest.raises(WireFormatError):
+        iter_decompressed(io.BytesIO(b""), "br")
@@ -0,0 +1,139 @@
+import threading
+import time
+
+
+class NoEndpointAvailable(Exception):
+    pass
+
+
+class AllEndpointsOpen(NoEndpointAvailable):
+    """Tous les disjoncteurs sont ouverts au-delà de l'échéance de la requête."""
+
+    def __init__(self, retry_in):
+        super().__init__(f"Tous les endpoints Overpass API sont suspendus (réessai dans {retry_in:.1f} s)")
+        self.retry_in = retry_in
+
+
+class EndpointState:
+    def __init__(self, url):
+        self.url = url
+        self.latency = None  # moyenne glissante, en secondes
+        self.in_flight = 0
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.throttled = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.last_status = None
+        self.last_error = None
+
+    def is_open(self, now):
+        return self.open_until > now
+
+    def as_dict(self, now):
+        return {
+            "url": self.url,
+            "state": "open" if self.is_open(now) else "closed",
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "successes": self.successes,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_s": round(max(self.open_until - now, 0), 1),
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+        }
+
+
+class EndpointPool:
+    """Pool d'endpoints Overpass classés par latence mesurée, avec disjoncteur.
+
+    Chaque requête part vers l'endpoint sain le plus rapide, pondéré par le
+    nombre de requêtes en cours pour répartir la charge entre miroirs. Un
+    endpoint qui répond 429/504 (ou ne répond pas) est écarté pendant un délai
+    qui double à chaque échec consécutif, puis retenté.
+    """
+
+    THROTTLE_STATUSES = (429, 502, 503, 504)
+
+    def __init__(self, urls, base_backoff=5.0, max_backoff=300.0, smoothing=0.3):
+        self.lock = threading.Lock()
+        self.endpoints = [EndpointState(url) for url in urls]
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.smoothing = smoothing
+
+    def _score(self, endpoint):
+        # Un endpoint jamais mesuré passe en premier pour obtenir sa latence
+        latency = endpoint.latency if endpoint.latency is not None else 0.0
+        return latency * (1 + endpoint.in_flight), endpoint.in_flight
+
+    def acquire(self, exclude=(), deadline=None):
+        """Réserve le meilleur endpoint disponible ; à libérer via record_success/record_failure.
+
+        Si tous les disjoncteurs sont ouverts, attend la réouverture la plus
+        proche tant qu'elle tombe avant `deadline` (horloge time.monotonic),
+        sinon lève AllEndpointsOpen pour que l'appelant se retire.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                candidates = [e for e in self.endpoints if e.url not in exclude]
+                if not candidates:
+                    raise NoEndpointAvailable("Aucun endpoint Overpass API disponible")
+                healthy = [e for e in candidates if not e.is_open(now)]
+                if healthy:
+                    endpoint = min(healthy, key=self._score)
+                    endpoint.in_flight += 1
+                    endpoint.requests += 1
+                    return endpoint.url
+                reopen = min(e.open_until for e in candidates)
+            if deadline is None or reopen > deadline:
+                raise AllEndpointsOpen(reopen - now)
+            # Attente hors verrou : les autres threads peuvent libérer leurs endpoints
+            time.sleep(max(reopen - now, 0))
+
+    def _get(self, url):
+        for endpoint in self.endpoints:
+            if endpoint.url == url:
+                return endpoint
+        raise KeyError(url)
+
+    def record_success(self, url, elapsed, status=200):
+        with self.lock:
+            endpoint = self._get(url)
+            endpoint.in_flight = max(endpoint.in_flight - 1, 0)
+            endpoint.successes += 1
+            endpoint.consecutive_failures = 0
+            endpoint.open_until = 0.0
+            endpoint.last_status = status
+            if endpoint.latency is None:
+                endpoint.latency = elapsed
+            else:
+                endpoint.latency += self.smoothing * (elapsed - endpoint.latency)
+
+    def record_failure(self, url, status=None, error=None, retry_after=None):
+        with self.lock:
+            endpoint = self._get(url)
+            endpoint.in_flight = max(endpoint.in_flight - 1, 0)
+            endpoint.errors += 1
+            endpoint.last_status = status
+            endpoint.last_error = error
+            if status is not None and status not in self.THROTTLE_STATUSES:
+                # Erreur liée à la requête elle-même : l'endpoint reste sain
+                return
+            if status in (429, 504):
+                endpoint.throttled += 1
+            endpoint.consecutive_failures += 1
+            backoff = min(self.base_backoff * 2 ** (endpoint.consecutive_failures - 1), self.max_backoff)
+            if retry_after is not None:
+                backoff = max(backoff, min(retry_after, self.max_backoff))
+            endpoint.open_until = time.monotonic() + backoff
+
+    def stats(self):
+        with self.lock:
+            now = time.monotonic()
+            return [endpoint.as_dict(now) for endpoint in self.endpoints]
@@ -0,0 +1,14 @@
+"""Hooks gunicorn de ski-data : reprise des jobs interrompus, une seule fois par déploiement."""
+import os
+import uuid
+
+
+def on_starting(server):
+    # Exécuté une fois par le maître ; les workers héritent de l'identifiant
+    os.environ["SKI_DATA_DEPLOYMENT_ID"] = uuid.uuid4().hex
+
+
+def post_worker_init(worker):
+    from main import resume_unfinished_jobs
+
+    resume_unfinished_jobs(os.environ["SKI_DATA_DEPLOYMENT_ID"])
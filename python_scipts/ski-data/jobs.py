@@ -0,0 +1,185 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from ski_common.geometry import json_default
+
+# pending -> running -> done | failed ; un job est queued -> running -> forwarding -> completed | failed
+UNFINISHED_JOB_STATUSES = ("queued", "running", "forwarding")
+REDACTED = "[redacted]"
+
+
+def redact_params(params):
+    """Paramètres tels qu'écrits sur disque : les valeurs des en-têtes (jetons, cookies) sont masquées."""
+    if not params or not params.get("headers"):
+        return params
+    return dict(params, headers={name: REDACTED for name in params["headers"]})
+
+
+class JobStore:
+    """État persistant des récoltes en tâche de fond (SQLite), station par station.
+
+    Les résultats de chaque station terminée sont enregistrés au fil de l'eau :
+    après un redémarrage, un job reprend à la première station non terminée.
+    Les en-têtes d'envoi ne sont pas conservés (voir redact_params).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " params TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " summary TEXT,"
+                " error TEXT);"
+                "CREATE TABLE IF NOT EXISTS job_stations ("
+                " job_id TEXT NOT NULL,"
+                " position INTEGER NOT NULL,"
+                " station TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL,"
+                " result TEXT,"
+                " error TEXT,"
+                " PRIMARY KEY (job_id, position));"
+                "CREATE TABLE IF NOT EXISTS job_resumes ("
+                " deployment TEXT PRIMARY KEY,"
+                " claimed_at REAL NOT NULL);"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, kind, params, stations):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(redact_params(params)), now, now)
+            )
+            conn.executemany(
+                "INSERT INTO job_stations (job_id, position, station, status) VALUES (?, ?, ?, 'pending')",
+                [(job_id, i, station) for i, station in enumerate(stations)]
+            )
+        return job_id
+
+    def set_status(self, job_id, status, summary=None, error=None):
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, summary = COALESCE(?, summary), error = ? WHERE id = ?",
+                (status, time.time(), json.dumps(summary) if summary is not None else None, error, job_id)
+            )
+
+    def station_started(self, job_id, station):
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE job_stations SET status = 'running', started_at = ? WHERE job_id = ? AND station = ?",
+                (time.time(), job_id, station)
+            )
+
+    def station_finished(self, job_id, station, result=None, error=None):
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE job_stations SET status = ?, started_at = COALESCE(started_at, ?), finished_at = ?,"
+                " result = ?, error = ? WHERE job_id = ? AND station = ?",
+                ("failed" if error else "done", now, now,
+                 json.dumps(result, default=json_default) if result is not None else None, error, job_id, station)
+            )
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+
+    def get_params(self, job_id):
+        with self.lock, self._connect() as conn:
+            row = conn.execute("SELECT kind, params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return (row["kind"], json.loads(row["params"])) if row else (None, None)
+
+    def remaining_stations(self, job_id):
+        with self.lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT station FROM job_stations WHERE job_id = ? AND status IN ('pending', 'running')"
+                " ORDER BY position", (job_id,)
+            ).fetchall()
+        return [row["station"] for row in rows]
+
+    def collected(self, job_id):
+        """Résultats et erreurs des stations terminées, dans l'ordre d'origine."""
+        results, errors = [], []
+        with self.lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT station, status, result, error FROM job_stations WHERE job_id = ? ORDER BY position",
+                (job_id,)
+            ).fetchall()
+        for row in rows:
+            if row["status"] == "failed":
+                errors.append({"station": row["station"], "error": row["error"]})
+            elif row["status"] == "done" and row["result"]:
+                results.append(json.loads(row["result"]))
+        return results, errors
+
+    def claim_resume(self, deployment):
+        """Vrai pour le seul appelant autorisé à reprendre les jobs de ce déploiement.
+
+        Le verrou est une ligne de job_resumes : entre plusieurs workers partageant
+        le fichier, seul le premier à l'insérer reprend les jobs interrompus.
+        """
+        with self.lock, self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO job_resumes (deployment, claimed_at) VALUES (?, ?)", (deployment, time.time())
+            )
+        return cursor.rowcount == 1
+
+    def unfinished_jobs(self):
+        with self.lock, self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id FROM jobs WHERE status IN ({','.join('?' * len(UNFINISHED_JOB_STATUSES))})"
+                " ORDER BY created_at", UNFINISHED_JOB_STATUSES
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def describe(self, job_id, include_results=False):
+        with self.lock, self._connect() as conn:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            rows = conn.execute(
+                "SELECT * FROM job_stations WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        stations = []
+        for row in rows:
+            counts[row["status"]] += 1
+            entry = {"station": row["station"], "status": row["status"], "error": row["error"]}
+            if row["started_at"] and row["finished_at"]:
+                entry["duration_s"] = round(row["finished_at"] - row["started_at"], 3)
+            if include_results and row["result"]:
+                entry["result"] = json.loads(row["result"])
+            stations.append(entry)
+        return {
+            "job_id": job["id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "elapsed_s": round(job["updated_at"] - job["created_at"], 3),
+            "progress": dict(counts, total=len(rows)),
+            "stations": stations,
+            "summary": json.loads(job["summary"]) if job["summary"] else None,
+            "error": job["error"],
+        }
@@ -1,7 +1,23 @@
+import os
+import json
+import math
 import time
+import queue
+import threading
+import uuid
 import requests
 import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from flask import Blueprint, jsonify, request, current_app, Flask
+from endpoint_pool import AllEndpointsOpen, EndpointPool
+from jobs import JobStore
+from overpass_cache import OverpassCache, OverpassCacheMiss
+from station_state import IncrementalTracker, StationHashStore
+from ski_common.connections import DEFAULT_TOLERANCE, ENGINES, METRIC_ENGINES, process_station
+from ski_common.firebase_auth import FirebaseAuthError, get_token_cache
+from ski_common.geometry import Polyline, json_default
+from ski_common.wire_format import WireFormatError, encode_payload
 
 app = Flask(__name__)
 fetch_bp = Blueprint('fetch_stations', __name__)
@@ -154,24 +170,162 @@ DIFFICULTY_LABELS = {
     "advanced": "Noir"
 }
 
-def get_working_overpass_url():
-    test_query = "[out:json][timeout:5];node(1);out;"
-    for url in OVERPASS_ENDPOINTS:
+# Harvest parallèle : nombre de workers et débit par endpoint Overpass
+DEFAULT_CONCURRENCY = 2
+MAX_CONCURRENCY = 16
+# Débit par endpoint partagé par toutes les requêtes ; un `rate` / `burst` de requête ne peut que le réduire
+DEFAULT_RATE_PER_ENDPOINT = float(os.getenv("OVERPASS_RATE", 1 / 1.5))  # requêtes par seconde
+DEFAULT_BURST = int(os.getenv("OVERPASS_BURST", 2))
+OVERPASS_TIMEOUT = 60
+
+# Requêtes groupées : nombre de stations par requête Overpass (1 = une requête par station)
+DEFAULT_BATCH_SIZE = 1
+MAX_BATCH_SIZE = 20
+
+# Service ski-processor utilisé par /fetch-for-process (mode "remote")
+PROCESS_URL = os.getenv("PROCESS_URL", "https://ski-processor-251891772802.europe-west1.run.app/process")
+# remote : envoi de la récolte au service /process, fused : détection des
+# connexions dans ce processus, seules les stations traitées sont envoyées
+PROCESS_MODES = ("remote", "fused")
+
+# Envoi en flux vers la destination
+# none : un seul POST final, ndjson : une ligne par station dans un corps chunked,
+# batches : un POST {"data": [...]} toutes les `stream_batch_size` stations
+STREAM_MODES = ("none", "ndjson", "batches")
+DEFAULT_STREAM_BATCH_SIZE = 5
+
+# Récolte incrémentale : empreinte de la dernière version transmise de chaque station
+STATION_STATE_DB = os.getenv("STATION_STATE_DB", "/tmp/ski_data_state.sqlite")
+_station_store = None
+
+def get_station_store():
+    global _station_store
+    if _station_store is None:
+        _station_store = StationHashStore(STATION_STATE_DB)
+    return _station_store
+
+# Cache disque des réponses Overpass
+# online : lit le cache puis Overpass, refresh : ignore le cache en lecture,
+# offline : rejoue uniquement le cache, off : désactivé
+CACHE_MODES = ("online", "refresh", "offline", "off")
+DEFAULT_CACHE_MODE = os.getenv("OVERPASS_CACHE_MODE", "online")
+overpass_cache = OverpassCache(
+    os.getenv("OVERPASS_CACHE_DIR", "/tmp/overpass_cache"),
+    ttl=float(os.getenv("OVERPASS_CACHE_TTL", 7 * 24 * 3600)),
+    max_bytes=int(os.getenv("OVERPASS_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+)
+
+
+class TokenBucket:
+    """Limiteur de débit : `rate` jetons par seconde, au plus `burst` en réserve."""
+
+    def __init__(self, rate, burst=1):
+        self.lock = threading.Lock()
+        self.configure(rate, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def configure(self, rate, burst=1):
+        self.rate = max(float(rate), 0.01)
+        self.burst = max(int(burst), 1)
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(overpass_url):
+    """Limiteur partagé de `overpass_url`, au débit configuré : il n'est jamais reconfiguré par une requête."""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(overpass_url)
+        if limiter is None:
+            limiter = TokenBucket(DEFAULT_RATE_PER_ENDPOINT, DEFAULT_BURST)
+            _rate_limiters[overpass_url] = limiter
+        return limiter
+
+def request_rate_limiters(rate=None, burst=None):
+    """Limiteurs propres à une récolte, un par endpoint, plafonnés au débit configuré.
+
+    Ils s'ajoutent aux limiteurs partagés : une requête peut ralentir sa
+    propre récolte, pas accélérer les appels à Overpass des autres.
+    """
+    if rate is None and burst is None:
+        return None
+    rate = min(float(rate if rate is not None else DEFAULT_RATE_PER_ENDPOINT), DEFAULT_RATE_PER_ENDPOINT)
+    burst = min(int(burst if burst is not None else DEFAULT_BURST), DEFAULT_BURST)
+    return {url: TokenBucket(rate, burst) for url in OVERPASS_ENDPOINTS}
+
+# Pool partagé par toutes les requêtes : santé et latence sont conservées d'un appel à l'autre
+endpoint_pool = EndpointPool(OVERPASS_ENDPOINTS)
+
+def parse_retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def post_overpass_query(query, timeout=OVERPASS_TIMEOUT, limiters=None):
+    """Envoie la requête au meilleur endpoint du pool, et bascule sur un autre en cas d'échec."""
+    tried, last_error = [], None
+    deadline = time.monotonic() + timeout
+    for _ in OVERPASS_ENDPOINTS:
+        try:
+            url = endpoint_pool.acquire(exclude=tried, deadline=deadline)
+        except AllEndpointsOpen:
+            # Les miroirs restants sont suspendus : on remonte la dernière vraie erreur
+            if last_error is not None:
+                raise last_error
+            raise
+        tried.append(url)
+        if limiters and url in limiters:
+            limiters[url].acquire()
+        get_rate_limiter(url).acquire()
+        start = time.monotonic()
         try:
-            response = requests.post(url, data=test_query, timeout=10)
-            if response.status_code == 200:
-                return url
-        except:
+            response = requests.post(url, data={"data": query}, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            endpoint_pool.record_failure(url, error=str(e))
+            last_error = e
             continue
-    raise Exception("Aucun endpoint Overpass API disponible")
+        if response.status_code in EndpointPool.THROTTLE_STATUSES:
+            endpoint_pool.record_failure(url, status=response.status_code,
+                                         error=response.text[:200], retry_after=parse_retry_after(response))
+            last_error = requests.exceptions.HTTPError(f"{response.status_code} depuis {url}", response=response)
+            continue
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            endpoint_pool.record_failure(url, status=response.status_code, error=str(e))
+            raise
+        try:
+            data = response.json()
+        except ValueError as e:
+            # Overpass renvoie parfois une page d'erreur HTML avec un statut 200
+            endpoint_pool.record_failure(url, error=f"Réponse non JSON : {e}")
+            last_error = e
+            continue
+        endpoint_pool.record_success(url, time.monotonic() - start, response.status_code)
+        return data
+    raise last_error or Exception("Aucun endpoint Overpass API disponible")
 
 def normalize_name(name):
     name = name.strip().lower()
     name = unicodedata.normalize("NFD", name)
     return "".join(c for c in name if not unicodedata.combining(c))
 
-def get_overpass_data(station, overpass_url):
-    query = f"""
+def build_overpass_query(station):
+    return f"""
     [out:json][timeout:25];
     area["name"="{station}"]->.a;
     (
@@ -185,11 +339,127 @@ def get_overpass_data(station, overpass_url):
     >;
     out skel qt;
     """
-    response = requests.post(overpass_url, data={"data": query})
-    response.raise_for_status()
-    return response.json()
 
-def extract_coords(elem, all_elements):
+def build_batch_overpass_query(stations):
+    """Une seule requête pour plusieurs stations : un bloc de sortie par zone nommée.
+
+    Chaque bloc commence par un `out count;` qui sert de séparateur pour
+    redécouper la réponse station par station (voir split_batch_response).
+    """
+    blocks = []
+    for i, station in enumerate(stations):
+        blocks.append(f"""
+    area["name"="{station}"]->.a{i};
+    (
+      way(area.a{i})["piste:type"];
+      relation(area.a{i})["piste:type"];
+      node(area.a{i})["aerialway"];
+      way(area.a{i})["aerialway"];
+      relation(area.a{i})["aerialway"];
+    )->.r{i};
+    .r{i} out count;
+    .r{i} out body;
+    .r{i} >;
+    out skel qt;""")
+    timeout = min(25 * len(stations), 180)
+    return f"""
+    [out:json][timeout:{timeout}];{"".join(blocks)}
+    """
+
+def split_batch_response(data, stations):
+    groups = []
+    for el in data.get("elements", []):
+        if el["type"] == "count":
+            groups.append([])
+        elif groups:
+            groups[-1].append(el)
+        else:
+            raise ValueError("Réponse groupée sans séparateur de bloc")
+    if len(groups) != len(stations):
+        raise ValueError(f"Réponse groupée incomplète : {len(groups)} blocs pour {len(stations)} stations")
+    return {station: {"elements": elements} for station, elements in zip(stations, groups)}
+
+def check_cache_mode(cache_mode):
+    cache_mode = cache_mode or DEFAULT_CACHE_MODE
+    if cache_mode not in CACHE_MODES:
+        raise ValueError(f"cache_mode invalide : {cache_mode}")
+    return cache_mode
+
+def get_cached_overpass_data(station, cache_mode):
+    if cache_mode not in ("online", "offline"):
+        return None
+    return overpass_cache.get(station, build_overpass_query(station), allow_stale=cache_mode == "offline")
+
+def get_overpass_data(station, cache_mode=None, limiters=None):
+    cache_mode = check_cache_mode(cache_mode)
+    query = build_overpass_query(station)
+    cached = get_cached_overpass_data(station, cache_mode)
+    if cached is not None:
+        return cached
+    if cache_mode == "offline":
+        raise OverpassCacheMiss(f"Aucune réponse en cache pour {station}")
+
+    data = post_overpass_query(query, limiters=limiters)
+    if cache_mode != "off":
+        overpass_cache.put(station, query, data)
+    return data
+
+def get_overpass_data_batch(stations, cache_mode=None, limiters=None):
+    """Renvoie {station: réponse} ; seules les stations absentes du cache sont interrogées, en une requête."""
+    cache_mode = check_cache_mode(cache_mode)
+    results, missing = {}, []
+    for station in stations:
+        cached = get_cached_overpass_data(station, cache_mode)
+        if cached is not None:
+            results[station] = cached
+        else:
+            missing.append(station)
+    if not missing:
+        return results
+    if cache_mode == "offline":
+        raise OverpassCacheMiss(f"Aucune réponse en cache pour {', '.join(missing)}")
+    if len(missing) == 1:
+        results[missing[0]] = get_overpass_data(missing[0], cache_mode, limiters)
+        return results
+
+    query = build_batch_overpass_query(missing)
+    batch_data = post_overpass_query(query, timeout=OVERPASS_TIMEOUT + 25 * len(missing), limiters=limiters)
+    for station, data in split_batch_response(batch_data, missing).items():
+        if cache_mode != "off":
+            overpass_cache.put(station, build_overpass_query(station), data)
+        results[station] = data
+    return results
+
+def index_elements(elements):
+    """Indexe une réponse Overpass : id de node -> (lat, lon), (type, id) -> way/relation."""
+    node_index, element_index = {}, {}
+    for el in elements:
+        if el["type"] == "node":
+            if "lat" in el and "lon" in el:
+                node_index.setdefault(el["id"], (el["lat"], el["lon"]))
+        else:
+            element_index.setdefault((el["type"], el["id"]), el)
+    return node_index, element_index
+
+def iter_node_ids(elem, element_index=None, visited=None):
+    """Parcourt les ids de node d'un way ou d'une relation (membres way/relation résolus récursivement)."""
+    if elem["type"] == "way":
+        yield from elem.get("nodes", [])
+    elif elem["type"] == "relation":
+        if visited is None:
+            visited = set()
+        if elem["id"] in visited:
+            return
+        visited.add(elem["id"])
+        for member in elem.get("members", []):
+            if member["type"] == "node":
+                yield member["ref"]
+            elif element_index is not None:
+                child = element_index.get((member["type"], member["ref"]))
+                if child is not None:
+                    yield from iter_node_ids(child, element_index, visited)
+
+def extract_coords(elem, node_index, element_index=None):
     coords, seen = [], set()
     if elem["type"] == "node":
         coord = (elem["lat"], elem["lon"])
@@ -197,28 +467,74 @@ def extract_coords(elem, all_elements):
             coords.append(coord)
             seen.add(coord)
     else:
-        node_ids = []
-        if elem["type"] == "way":
-            node_ids = elem.get("nodes", [])
-        elif elem["type"] == "relation":
-            for member in elem.get("members", []):
-                if member["type"] == "node":
-                    node_ids.append(member["ref"])
-        for nid in node_ids:
-            for node in all_elements:
-                if node["type"] == "node" and node["id"] == nid:
-                    coord = (node["lat"], node["lon"])
-                    if coord not in seen:
-                        coords.append(coord)
-                        seen.add(coord)
+        for nid in iter_node_ids(elem, element_index):
+            coord = node_index.get(nid)
+            if coord is not None and coord not in seen:
+                coords.append(coord)
+                seen.add(coord)
+    return coords
+
+def stitch_segments(segments):
+    """Raccorde les ways qui partagent une extrémité en polylignes continues.
+
+    Le sens du premier segment de chaque chaîne est conservé ; les segments
+    suivants sont retournés si nécessaire pour prolonger la chaîne.
+    """
+    by_endpoint = {}
+    for i, segment in enumerate(segments):
+        for point in {segment[0], segment[-1]}:
+            by_endpoint.setdefault(point, []).append(i)
+    used = [False] * len(segments)
+
+    def take(point, forward):
+        # Priorité aux segments déjà orientés dans le sens de la chaîne
+        candidates = [i for i in by_endpoint.get(point, ()) if not used[i]]
+        if not candidates:
+            return None
+        oriented = [i for i in candidates if (segments[i][0] if forward else segments[i][-1]) == point]
+        i = (oriented or candidates)[0]
+        used[i] = True
+        return segments[i]
+
+    chains = []
+    for i, segment in enumerate(segments):
+        if used[i]:
+            continue
+        used[i] = True
+        chain = deque(segment)
+        while True:
+            after = take(chain[-1], forward=True)
+            if after is None:
+                break
+            chain.extend(after[1:] if after[0] == chain[-1] else reversed(after[:-1]))
+        while True:
+            before = take(chain[0], forward=False)
+            if before is None:
+                break
+            part = before[:-1] if before[-1] == chain[0] else before[:0:-1]
+            chain.extendleft(reversed(part))
+        chains.append(list(chain))
+    return chains
+
+def merge_segments(segments):
+    """Fusionne les ways d'une même piste : chaînes raccordées, sans doublon, ordre conservé."""
+    coords, seen = [], set()
+    for chain in stitch_segments(segments):
+        for c in chain:
+            if c not in seen:
+                coords.append(c)
+                seen.add(c)
     return coords
 
-def get_station_info(station, overpass_url):
-    data = get_overpass_data(station, overpass_url)
+def get_station_info(station, cache_mode=None, limiters=None):
+    return parse_station_data(station, get_overpass_data(station, cache_mode, limiters))
+
+def parse_station_data(station, data):
     if not data or "elements" not in data:
         return None
 
     elements = data["elements"]
+    node_index, element_index = index_elements(elements)
     pistes_dict, remontees = {}, []
 
     for el in elements:
@@ -230,7 +546,7 @@ def get_station_info(station, overpass_url):
         if not name or name.lower() in ["", "none", "null", "unknown", "(nom inconnu)"]:
             continue
 
-        coords = extract_coords(el, elements)
+        coords = extract_coords(el, node_index, element_index)
         if not coords:
             continue
 
@@ -243,26 +559,507 @@ def get_station_info(station, overpass_url):
                 pistes_dict[norm_name] = {
                     "name": name,
                     "difficulty": diff_label,
-                    "coords": coords
+                    "coords": [coords]
                 }
             else:
-                for c in coords:
-                    if c not in pistes_dict[norm_name]["coords"]:
-                        pistes_dict[norm_name]["coords"].append(c)
+                pistes_dict[norm_name]["coords"].append(coords)
 
         elif "aerialway" in tags and tags["aerialway"] not in ("pylon", "goods"):
             remontees.append({
                 "name": name,
                 "type": tags.get("aerialway", "unknown"),
-                "coords": coords
+                "coords": Polyline.from_points(coords)
             })
 
-    pistes = list(pistes_dict.values())
+    pistes = []
+    for piste in pistes_dict.values():
+        segments = piste["coords"]
+        piste["coords"] = Polyline.from_points(segments[0] if len(segments) == 1 else merge_segments(segments))
+        pistes.append(piste)
     return {
         "station": station,
         "pistes": pistes,
         "remontees": remontees
     }
+def fetch_station_safe(station, cache_mode=None, on_start=None, limiters=None):
+    if on_start:
+        on_start(station)
+    try:
+        return station, get_station_info(station, cache_mode, limiters), None
+    except Exception as e:
+        print(f"Erreur pour la station {station}: {e}")
+        return station, None, str(e)
+
+def fetch_batch_safe(batch, cache_mode=None, on_start=None, limiters=None):
+    if on_start:
+        for station in batch:
+            on_start(station)
+    try:
+        batch_data = get_overpass_data_batch(batch, cache_mode, limiters)
+    except Exception as e:
+        print(f"Échec de la requête groupée ({len(batch)} stations), repli station par station : {e}")
+        return [fetch_station_safe(station, cache_mode, on_start, limiters) for station in batch]
+    outcomes = []
+    for station in batch:
+        try:
+            outcomes.append((station, parse_station_data(station, batch_data[station]), None))
+        except Exception as e:
+            print(f"Erreur pour la station {station}: {e}")
+            outcomes.append((station, None, str(e)))
+    return outcomes
+
+def iter_harvest(stations, concurrency=DEFAULT_CONCURRENCY, rate=None, burst=None,
+                 cache_mode=None, batch_size=DEFAULT_BATCH_SIZE, on_start=None):
+    """Récupère les stations en parallèle et produit (station, info, erreur) dans l'ordre de `stations`."""
+    concurrency = min(max(int(concurrency), 1), MAX_CONCURRENCY)
+    batch_size = min(max(int(batch_size), 1), MAX_BATCH_SIZE)
+    limiters = request_rate_limiters(rate, burst)
+    batches = [stations[i:i + batch_size] for i in range(0, len(stations), batch_size)]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if batch_size == 1:
+            yield from executor.map(lambda s: fetch_station_safe(s, cache_mode, on_start, limiters), stations)
+        else:
+            for batch_outcomes in executor.map(lambda b: fetch_batch_safe(b, cache_mode, on_start, limiters),
+                                               batches):
+                yield from batch_outcomes
+
+def harvest_stations(stations, tracker=None, **options):
+    """Renvoie (résultats, erreurs) dans l'ordre de `stations`."""
+    results, errors = [], []
+    outcomes = iter_harvest(stations, **options)
+    if tracker:
+        outcomes = tracker.filter(outcomes)
+    for station, info, error in outcomes:
+        if error:
+            errors.append({"station": station, "error": error})
+        elif info:
+            results.append(info)
+    return results, errors
+
+def describe_response(response, limit=1000):
+    return {
+        "status_code": response.status_code,
+        "headers": dict(response.headers),
+        "response_text": response.text[:limit],
+    }
+
+def delivered_stations(response, stations):
+    """Stations dont la réception est confirmée par la réponse de la destination.
+
+    Tout 2xx (200, 201 à la création côté ski_api...) confirme l'envoi entier,
+    sauf 207 (réponse partielle de /process) qui n'est retenu que pour les
+    stations listées en succès dans "results". Tout autre statut ne confirme
+    rien, pour que ces stations soient renvoyées à la récolte suivante.
+    """
+    if 200 <= response.status_code < 300 and response.status_code != 207:
+        return list(stations)
+    if response.status_code != 207:
+        return []
+    try:
+        results = response.json().get("results")
+    except (ValueError, AttributeError):
+        return []
+    if not isinstance(results, list):
+        return []
+    succeeded = {r.get("station") for r in results if isinstance(r, dict) and r.get("status") == "success"}
+    return [station for station in stations if station in succeeded]
+
+def stream_ndjson(outcomes, destination_url, headers, summary, tracker=None):
+    """Envoie chaque station dès qu'elle est prête, une ligne NDJSON par station, dans un seul POST chunked."""
+    sent = []
+
+    def body():
+        for station, info, error in outcomes:
+            if error:
+                summary["failed_stations"].append({"station": station, "error": error})
+            elif info:
+                line = (json.dumps(info, ensure_ascii=False, default=json_default) + "\n").encode("utf-8")
+                summary["stations_count"] += 1
+                summary["bytes_sent"] += len(line)
+                sent.append(info["station"])
+                yield line
+
+    request_headers = dict(headers, **{"Content-Type": "application/x-ndjson"})
+    response = requests.post(destination_url, data=body(), headers=request_headers, timeout=60)
+    summary["destination_responses"].append(describe_response(response))
+    if tracker:
+        tracker.commit(delivered_stations(response, sent))
+
+def stream_batches(outcomes, destination_url, headers, batch_size, summary, extra_payload=None, wire=None,
+                   tracker=None):
+    """Envoie les stations par lots de `batch_size`, au format {"data": [...]} habituel."""
+    def send(batch):
+        payload = dict(extra_payload or {}, data=batch)
+        body, wire_headers = encode_payload(payload, **(wire or {}))
+        try:
+            response = requests.post(destination_url, data=body, headers=dict(headers, **wire_headers), timeout=60)
+            result = describe_response(response)
+            if tracker:
+                tracker.commit(delivered_stations(response, [info["station"] for info in batch]))
+        except requests.exceptions.RequestException as e:
+            result = {"error": str(e)}
+        result["stations"] = [info["station"] for info in batch]
+        summary["bytes_sent"] += len(body)
+        summary["destination_responses"].append(result)
+
+    batch = []
+    for station, info, error in outcomes:
+        if error:
+            summary["failed_stations"].append({"station": station, "error": error})
+        elif info:
+            batch.append(info)
+            summary["stations_count"] += 1
+            if len(batch) >= batch_size:
+                send(batch)
+                batch = []
+    if batch:
+        send(batch)
+
+def forward_streaming(options, stream_mode, stream_batch_size, destination_url, headers, extra_payload=None,
+                      wire=None, incremental=False):
+    summary = {
+        "status": "success",
+        "data_sent_to": destination_url,
+        "stream": stream_mode,
+        "stations_count": 0,
+        "failed_stations": [],
+        "bytes_sent": 0,
+        "destination_responses": [],
+    }
+    outcomes = iter_harvest(station_names, **options)
+    tracker = IncrementalTracker(get_station_store()) if incremental else None
+    if tracker:
+        outcomes = tracker.filter(outcomes)
+    if stream_mode == "ndjson":
+        stream_ndjson(outcomes, destination_url, headers, summary, tracker)
+    else:
+        stream_batches(outcomes, destination_url, headers, max(int(stream_batch_size), 1), summary,
+                       extra_payload, wire, tracker)
+    if tracker:
+        summary["incremental"] = True
+        summary["skipped_stations"] = tracker.skipped
+    return summary
+
+def positive_option(body, name, default=None, integer=False):
+    """Option numérique strictement positive du corps (entier si `integer`) ; ValueError sinon."""
+    value = body.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+        raise ValueError(f"'{name}' must be a positive number")
+    if integer:
+        if value != int(value):
+            raise ValueError(f"'{name}' must be a positive integer")
+        return int(value)
+    return float(value)
+
+def harvest_options(body):
+    """Options de récolte du corps, vérifiées (ValueError -> 400 dans les routes)."""
+    body = body or {}
+    return {
+        "concurrency": positive_option(body, "concurrency", DEFAULT_CONCURRENCY, integer=True),
+        "rate": positive_option(body, "rate"),
+        "burst": positive_option(body, "burst", integer=True),
+        "cache_mode": check_cache_mode(body.get("cache_mode")),
+        "batch_size": positive_option(body, "batch_size", DEFAULT_BATCH_SIZE, integer=True),
+    }
+
+def wire_options(body):
+    """Format d'envoi demandé via {"wire_format": {"coords", "content_type", "compression"}}."""
+    wire_format = (body or {}).get("wire_format") or {}
+    wire = {
+        "coords": wire_format.get("coords", "json"),
+        "content_type": wire_format.get("content_type", "json"),
+        "compression": wire_format.get("compression", "identity"),
+    }
+    # Valide les options avant de lancer la récolte
+    encode_payload({"data": []}, **wire)
+    return wire
+
+def forward_results(params, results, fetch_errors, tracker=None):
+    """Envoi final de /fetch-stations : un seul POST {"data": [...]} vers destination_url."""
+    destination_url = params.get("destination_url")
+    headers = params.get("headers", {})
+    wire = wire_options(params)
+    if tracker and not results:
+        return {
+            "status": "unchanged",
+            "data_sent_to": None,
+            "stations_count": 0,
+            "failed_stations": fetch_errors,
+            "skipped_stations": tracker.skipped,
+        }
+
+    # Envoi direct des données vers l'URL de destination
+    payload = {
+        "data": results
+    }
+
+    # Force le Content-Type explicitement
+    request_headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
+    if headers:
+        request_headers.update(headers)
+    body, wire_headers = encode_payload(payload, **wire)
+    request_headers.update(wire_headers)
+
+    print(f"Envoi vers {destination_url} avec {len(results)} stations")
+    print(f"Taille du payload: {len(body)} octets")
+    print(f"Headers envoyés: {request_headers}")
+
+    destination_response = requests.post(
+        destination_url, 
+        data=body, 
+        headers=request_headers,
+        timeout=60
+    )
+    if tracker:
+        tracker.commit(delivered_stations(destination_response, [info["station"] for info in results]))
+
+    # Debug amélioré
+    response_data = {
+        "status": "success",
+        "data_sent_to": destination_url,
+        "stations_count": len(results),
+        "failed_stations": fetch_errors,
+        "payload_size": len(str(payload)),
+        "payload_bytes": len(body),
+        "skipped_stations": tracker.skipped if tracker else [],
+        "destination_response": {
+            "status_code": destination_response.status_code,
+            "headers": dict(destination_response.headers),
+            "response_text": destination_response.text[:1000],  # Premiers 1000 caractères
+        }
+    }
+
+    # Essayer de parser en JSON si possible
+    try:
+        if destination_response.headers.get('content-type', '').startswith('application/json'):
+            response_data["destination_response"]["json"] = destination_response.json()
+    except:
+        pass
+
+    return response_data
+
+def process_options(body):
+    """Paramètres de trouver_connections du mode fusionné (mêmes clés que /process)."""
+    body = body or {}
+    engine = body.get("engine")
+    tolerance_m = body.get("tolerance_m")
+    if engine is not None and engine not in ENGINES:
+        raise ValueError(f"Unknown 'engine', expected one of {list(ENGINES)}")
+    if tolerance_m is not None and engine is not None and engine not in METRIC_ENGINES:
+        raise ValueError(f"'tolerance_m' requires one of {list(METRIC_ENGINES)}")
+    return {
+        "tolerance": body.get("tolerance", DEFAULT_TOLERANCE),
+        "engine": engine,
+        "tolerance_m": tolerance_m,
+    }
+
+def fused_headers(headers=None):
+    """En-têtes des envois du mode fusionné, avec le jeton Firebase si des identifiants sont configurés."""
+    request_headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+    request_headers.update(headers or {})
+    token_cache = get_token_cache()
+    if token_cache is not None:
+        request_headers['Authorization'] = f"Bearer {token_cache.get_token()}"
+    return request_headers
+
+def forward_fused(params, outcomes, tracker=None):
+    """Mode fusionné de /fetch-for-process : chaque station est traitée dès sa récolte, puis envoyée seule.
+
+    Le corps envoyé à forward_to_url est celui que produirait ski-processor
+    ({"station", "slopes", "chair_lifts"}), sans passer par le service /process.
+    """
+    forward_to_url = params.get("forward_to_url", "http://httpbin.org/post")
+    options = process_options(params)
+    headers = fused_headers(params.get("headers"))
+    summary = {
+        "status": "success",
+        "mode": "fused",
+        "forward_to_url": forward_to_url,
+        "stations_collected": 0,
+        "stations_count": 0,
+        "failed_stations": [],
+        "bytes_sent": 0,
+        "destination_responses": [],
+    }
+    for station, info, error in outcomes:
+        if error:
+            summary["failed_stations"].append({"station": station, "error": error})
+            continue
+        if not info:
+            continue
+        summary["stations_collected"] += 1
+        try:
+            processed = process_station(info, **options)
+        except Exception as e:
+            print(f"Erreur de traitement pour la station {station}: {e}")
+            summary["failed_stations"].append({"station": station, "error": str(e)})
+            continue
+        body = json.dumps(processed, ensure_ascii=False, default=json_default).encode("utf-8")
+        try:
+            response = requests.post(forward_to_url, data=body, headers=headers, timeout=60)
+            result = describe_response(response)
+            # Même règle que les autres modes : un 207 sans succès pour cette station est un échec
+            if delivered_stations(response, [station]):
+                summary["stations_count"] += 1
+                if tracker:
+                    tracker.commit([station])
+            else:
+                summary["failed_stations"].append({"station": station, "error": f"HTTP {response.status_code}"})
+        except requests.exceptions.RequestException as e:
+            result = {"error": str(e)}
+            summary["failed_stations"].append({"station": station, "error": str(e)})
+        result["station"] = station
+        summary["bytes_sent"] += len(body)
+        summary["destination_responses"].append(result)
+    if tracker:
+        summary["incremental"] = True
+        summary["skipped_stations"] = tracker.skipped
+    print(f"Mode fusionné : {summary['stations_count']} stations traitées envoyées vers {forward_to_url}")
+    return summary
+
+def forward_to_process(params, results, fetch_errors, tracker=None):
+    """Envoi final de /fetch-for-process : un seul POST vers le service /process (ou traitement local)."""
+    if params.get("mode", "remote") == "fused":
+        outcomes = [(info["station"], info, None) for info in results]
+        summary = forward_fused(params, outcomes, tracker)
+        summary["failed_stations"] = fetch_errors + summary["failed_stations"]
+        return summary
+    process_url = params.get("process_url") or PROCESS_URL
+    forward_to_url = params.get("forward_to_url", "http://httpbin.org/post")
+    wire = wire_options(params)
+    if tracker and not results:
+        return {
+            "status": "unchanged",
+            "process_url": process_url,
+            "stations_collected": 0,
+            "failed_stations": fetch_errors,
+            "skipped_stations": tracker.skipped,
+        }
+
+    # Format exact attendu par votre /process
+    payload = {
+        "data": results,
+        "destination_url": forward_to_url
+    }
+
+    body, wire_headers = encode_payload(payload, **wire)
+    request_headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
+    request_headers.update(wire_headers)
+
+    print(f"Envoi vers {process_url}")
+    print(f"Données seront transférées vers: {forward_to_url}")
+    print(f"Stations collectées: {len(results)}")
+    print(f"Taille du payload: {len(body)} octets")
+
+    # Envoi vers votre service /process
+    process_response = requests.post(
+        process_url,
+        data=body,
+        headers=request_headers,
+        timeout=60
+    )
+    if tracker:
+        tracker.commit(delivered_stations(process_response, [info["station"] for info in results]))
+
+    return {
+        "status": "success",
+        "process_url": process_url,
+        "forward_to_url": forward_to_url,
+        "stations_collected": len(results),
+        "failed_stations": fetch_errors,
+        "payload_size": len(str(payload)),
+        "payload_bytes": len(body),
+        "skipped_stations": tracker.skipped if tracker else [],
+        "process_response": {
+            "status_code": process_response.status_code,
+            "headers": dict(process_response.headers),
+            "response": process_response.json() if process_response.headers.get('content-type', '').startswith('application/json') else process_response.text[:1000]
+        }
+    }
+
+# Jobs : récolte en tâche de fond, un job à la fois, état persisté dans JOBS_DB
+JOBS_DB = os.getenv("JOBS_DB", "/tmp/ski_data_jobs.sqlite")
+JOB_FORWARDERS = {
+    "fetch-stations": forward_results,
+    "fetch-for-process": forward_to_process,
+}
+job_store = JobStore(JOBS_DB)
+job_queue = queue.Queue()
+# En-têtes d'envoi des jobs soumis par ce processus : jamais écrits dans JOBS_DB
+_job_headers = {}
+_job_worker = None
+_job_worker_lock = threading.Lock()
+
+def run_job(job_id):
+    kind, params = job_store.get_params(job_id)
+    if kind is None:
+        return
+    headers = _job_headers.pop(job_id, None)
+    if headers is None and params.get("headers"):
+        print(f"Job {job_id} repris sans ses en-têtes d'envoi (non conservés sur disque)")
+    params = dict(params, headers=headers or {})
+    try:
+        job_store.set_status(job_id, "running")
+        options = harvest_options(params)
+        on_start = lambda station: job_store.station_started(job_id, station)
+        for station, info, error in iter_harvest(job_store.remaining_stations(job_id), on_start=on_start, **options):
+            job_store.station_finished(job_id, station, info, error)
+
+        job_store.set_status(job_id, "forwarding")
+        results, fetch_errors = job_store.collected(job_id)
+        tracker = None
+        if params.get("incremental"):
+            tracker = IncrementalTracker(get_station_store())
+            results = [info for _, info, _ in tracker.filter((info["station"], info, None) for info in results)]
+        summary = JOB_FORWARDERS[kind](params, results, fetch_errors, tracker)
+        job_store.set_status(job_id, "completed", summary=summary)
+    except Exception as e:
+        print(f"Erreur du job {job_id} : {e}")
+        job_store.set_status(job_id, "failed", error=str(e))
+
+def job_worker():
+    while True:
+        run_job(job_queue.get())
+
+def enqueue_job(job_id):
+    global _job_worker
+    with _job_worker_lock:
+        if _job_worker is None:
+            _job_worker = threading.Thread(target=job_worker, name="harvest-jobs", daemon=True)
+            _job_worker.start()
+    job_queue.put(job_id)
+
+def submit_job(kind, params):
+    job_id = job_store.create(kind, params, station_names)
+    _job_headers[job_id] = params.get("headers") or {}
+    enqueue_job(job_id)
+    return job_id
+
+def resume_unfinished_jobs(deployment):
+    """Relance les jobs interrompus par l'arrêt précédent ; appelé une fois au démarrage.
+
+    Sous gunicorn, le hook post_worker_init (gunicorn.conf.py) passe l'identifiant
+    du déploiement : seul le premier worker à prendre le verrou reprend les jobs.
+    """
+    if not job_store.claim_resume(deployment):
+        return []
+    job_ids = job_store.unfinished_jobs()
+    for job_id in job_ids:
+        print(f"Reprise du job {job_id}")
+        enqueue_job(job_id)
+    return job_ids
+
+def job_accepted(job_id):
+    return jsonify({"status": "accepted", "job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
 @app.route("/")
 def index():
     return "L'API fonctionne !"
@@ -271,14 +1068,11 @@ def index():
 @fetch_bp.route("/fetch-stations", methods=["POST"])
 def fetch_and_forward():
     try:
-        overpass_url = get_working_overpass_url()
-        results = []
-
-        for station in station_names:
-            info = get_station_info(station, overpass_url)
-            if info:
-                results.append(info)
-            time.sleep(1.5)
+        try:
+            options = harvest_options(request.json)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        wire = wire_options(request.json)
 
         # Envoi direct vers l'URL de destination
         destination_url = request.json.get("destination_url")
@@ -286,53 +1080,30 @@ def fetch_and_forward():
             return jsonify({"error": "Missing 'destination_url'"}), 400
 
         headers = request.json.get("headers", {})
-        
-        # Envoi direct des données vers l'URL de destination
-        payload = {
-            "data": results
-        }
-        
-        # Force le Content-Type explicitement
-        request_headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-        if headers:
-            request_headers.update(headers)
+        incremental = bool(request.json.get("incremental", False))
 
-        print(f"Envoi vers {destination_url} avec {len(results)} stations")
-        print(f"Taille du payload: {len(str(payload))} caractères")
-        print(f"Headers envoyés: {request_headers}")
+        stream_mode = request.json.get("stream", "none")
+        if stream_mode not in STREAM_MODES:
+            return jsonify({"error": f"Invalid 'stream' mode, expected one of {STREAM_MODES}"}), 400
+        if request.json.get("async"):
+            if stream_mode != "none":
+                return jsonify({"error": "'async' cannot be combined with 'stream'"}), 400
+            return job_accepted(submit_job("fetch-stations", request.json))
+        if stream_mode != "none":
+            stream_headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+            stream_headers.update(headers)
+            return jsonify(forward_streaming(
+                options, stream_mode,
+                request.json.get("stream_batch_size", DEFAULT_STREAM_BATCH_SIZE),
+                destination_url, stream_headers, wire=wire, incremental=incremental
+            ))
 
-        destination_response = requests.post(
-            destination_url, 
-            json=payload, 
-            headers=request_headers,
-            timeout=60
-        )
-        
-        # Debug amélioré
-        response_data = {
-            "status": "success",
-            "data_sent_to": destination_url,
-            "stations_count": len(results),
-            "payload_size": len(str(payload)),
-            "destination_response": {
-                "status_code": destination_response.status_code,
-                "headers": dict(destination_response.headers),
-                "response_text": destination_response.text[:1000],  # Premiers 1000 caractères
-            }
-        }
-        
-        # Essayer de parser en JSON si possible
-        try:
-            if destination_response.headers.get('content-type', '').startswith('application/json'):
-                response_data["destination_response"]["json"] = destination_response.json()
-        except:
-            pass
-            
-        return jsonify(response_data)
+        tracker = IncrementalTracker(get_station_store()) if incremental else None
+        results, fetch_errors = harvest_stations(station_names, tracker, **options)
+        return jsonify(forward_results(request.json, results, fetch_errors, tracker))
 
+    except WireFormatError as e:
+        return jsonify({"error": str(e)}), 400
     except requests.exceptions.Timeout:
         return jsonify({"error": "Timeout lors de l'envoi vers le service de destination"}), 504
     except requests.exceptions.ConnectionError as e:
@@ -340,13 +1111,30 @@ def fetch_and_forward():
     except Exception as e:
         current_app.logger.error(f"Erreur fetch_and_forward : {e}")
         return jsonify({"error": str(e)}), 500
+@fetch_bp.route("/overpass-cache", methods=["GET"])
+def overpass_cache_stats():
+    return jsonify(overpass_cache.stats())
+
+
+@fetch_bp.route("/overpass-endpoints", methods=["GET"])
+def overpass_endpoints_stats():
+    return jsonify({"endpoints": endpoint_pool.stats()})
+
+
+@fetch_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    include_results = request.args.get("results", "").lower() in ("1", "true", "yes")
+    job = job_store.describe(job_id, include_results)
+    if job is None:
+        return jsonify({"error": f"Unknown job '{job_id}'"}), 404
+    return jsonify(job)
+
+
 @fetch_bp.route("/test-single-station", methods=["POST"])
 def test_single_station():
     try:
-        overpass_url = get_working_overpass_url()
-        
         # Test avec seulement Vars
-        info = get_station_info("Vars", overpass_url)
+        info = get_station_info("Vars")
         if not info:
             return jsonify({"error": "Aucune donnée trouvée pour Vars"}), 404
             
@@ -369,7 +1157,7 @@ def test_single_station():
         
         response = requests.post(
             destination_url,
-            json=payload,
+            data=json.dumps(payload, default=json_default),
             headers=request_headers,
             timeout=15
         )
@@ -393,61 +1181,70 @@ def test_single_station():
 def fetch_for_process():
     """Endpoint spécialement formaté pour votre service /process"""
     try:
-        overpass_url = get_working_overpass_url()
-        results = []
-
-        for station in station_names:
-            info = get_station_info(station, overpass_url)
-            if info:
-                results.append(info)
-            time.sleep(1.5)
+        try:
+            options = harvest_options(request.json)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        wire = wire_options(request.json)
 
         # URL de votre service /process
-        process_url = "https://ski-processor-251891772802.europe-west1.run.app/process"
+        process_url = request.json.get("process_url") or PROCESS_URL
         
         # URL où votre service /process doit envoyer les données finales
         forward_to_url = request.json.get("forward_to_url", "http://httpbin.org/post")
+        incremental = bool(request.json.get("incremental", False))
+
+        mode = request.json.get("mode", "remote")
+        if mode not in PROCESS_MODES:
+            return jsonify({"error": f"Invalid 'mode', expected one of {PROCESS_MODES}"}), 400
+        if mode == "fused":
+            try:
+                process_options(request.json)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+        # /process attend {"data": [...], "destination_url": ...} : seul l'envoi par lots est possible
+        stream_mode = request.json.get("stream", "none")
+        if stream_mode not in ("none", "batches"):
+            return jsonify({"error": "Invalid 'stream' mode, expected 'none' or 'batches'"}), 400
+        if request.json.get("async"):
+            if stream_mode != "none":
+                return jsonify({"error": "'async' cannot be combined with 'stream'"}), 400
+            return job_accepted(submit_job("fetch-for-process", request.json))
+        if mode == "fused":
+            if stream_mode != "none":
+                return jsonify({"error": "'fused' mode already sends each station as soon as it is processed"}), 400
+            # Traitement au fil de la récolte : aucun aller-retour JSON vers /process
+            tracker = IncrementalTracker(get_station_store()) if incremental else None
+            outcomes = iter_harvest(station_names, **options)
+            if tracker:
+                outcomes = tracker.filter(outcomes)
+            return jsonify(forward_fused(request.json, outcomes, tracker))
+        if stream_mode == "batches":
+            summary = forward_streaming(
+                options, stream_mode,
+                request.json.get("stream_batch_size", DEFAULT_STREAM_BATCH_SIZE),
+                process_url, {'Content-Type': 'application/json', 'Accept': 'application/json'},
+                extra_payload={"destination_url": forward_to_url}, wire=wire, incremental=incremental
+            )
+            summary["forward_to_url"] = forward_to_url
+            return jsonify(summary)
+
+        tracker = IncrementalTracker(get_station_store()) if incremental else None
+        results, fetch_errors = harvest_stations(station_names, tracker, **options)
+        return jsonify(forward_to_process(request.json, results, fetch_errors, tracker))
         
-        # Format exact attendu par votre /process
-        payload = {
-            "data": results,
-            "destination_url": forward_to_url
-        }
-        
-        request_headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-        
-        print(f"Envoi vers {process_url}")
-        print(f"Données seront transférées vers: {forward_to_url}")
-        print(f"Stations collectées: {len(results)}")
-        print(f"Taille du payload: {len(str(payload))} caractères")
-        
-        # Envoi vers votre service /process
-        process_response = requests.post(
-            process_url,
-            json=payload,
-            headers=request_headers,
-            timeout=60
-        )
-        
-        return jsonify({
-            "status": "success",
-            "process_url": process_url,
-            "forward_to_url": forward_to_url,
-            "stations_collected": len(results),
-            "payload_size": len(str(payload)),
-            "process_response": {
-                "status_code": process_response.status_code,
-                "headers": dict(process_response.headers),
-                "response": process_response.json() if process_response.headers.get('content-type', '').startswith('application/json') else process_response.text[:1000]
-            }
-        })
-        
+    except WireFormatError as e:
+        return jsonify({"error": str(e)}), 400
+    except FirebaseAuthError as e:
+        return jsonify({"status": "error", "message": str(e)}), 401
     except requests.exceptions.Timeout:
         return jsonify({"error": "Timeout lors de l'envoi vers le service /process"}), 504
     except Exception as e:
         current_app.logger.error(f"Erreur fetch_for_process : {e}")
         return jsonify({"error": str(e)}), 500
-app.register_blueprint(fetch_bp)
\ No newline at end of file
+app.register_blueprint(fetch_bp)
+
+if __name__ == "__main__":
+    resume_unfinished_jobs(uuid.uuid4().hex)
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", 8080)))
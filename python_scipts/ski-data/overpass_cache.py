@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+
+class OverpassCacheMiss(LookupError):
+    pass
+
+
+class OverpassCache:
+    """Cache disque des réponses Overpass, une entrée JSON par (station, hash de la requête).
+
+    Les entrées expirent après `ttl` secondes. La taille totale est bornée par
+    `max_bytes` : au-delà, les entrées les moins récemment lues sont supprimées.
+    """
+
+    def __init__(self, directory, ttl, max_bytes):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def _path(self, station, query):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", station).strip("_")[:60] or "station"
+        digest = hashlib.sha256(f"{station}\n{query}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{slug}-{digest}.json")
+
+    def get(self, station, query, allow_stale=False):
+        path = self._path(station, query)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not allow_stale and time.time() - entry.get("fetched_at", 0) > self.ttl:
+            return None
+        try:
+            # L'ordre LRU suit la date de modification du fichier
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get("data")
+
+    def put(self, station, query, data):
+        path = self._path(station, query)
+        entry = {"station": station, "fetched_at": time.time(), "data": data}
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def _evict(self):
+        entries, total = [], 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        while total > self.max_bytes and len(entries) > 1:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        count, total = 0, 0
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    count += 1
+                    total += os.path.getsize(os.path.join(self.directory, name))
+        return {"directory": self.directory, "entries": count, "bytes": total,
+                "ttl": self.ttl, "max_bytes": self.max_bytes}
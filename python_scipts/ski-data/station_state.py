@@ -0,0 +1,85 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from ski_common.geometry import json_default
+
+
+def content_hash(info):
+    """Empreinte du résultat normalisé de get_station_info (clés triées, séparateurs fixes)."""
+    normalized = json.dumps(info, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=json_default)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class StationHashStore:
+    """Dernière empreinte transmise pour chaque station, dans un fichier SQLite local."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS station_hashes ("
+                " station TEXT PRIMARY KEY,"
+                " content_hash TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_all(self):
+        with self.lock, self._connect() as conn:
+            return dict(conn.execute("SELECT station, content_hash FROM station_hashes"))
+
+    def save(self, hashes):
+        if not hashes:
+            return
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO station_hashes (station, content_hash, updated_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(station) DO UPDATE SET content_hash = excluded.content_hash,"
+                " updated_at = excluded.updated_at",
+                [(station, digest, now) for station, digest in hashes.items()]
+            )
+
+
+class IncrementalTracker:
+    """Filtre une récolte pour ne garder que les stations nouvelles ou modifiées.
+
+    Les empreintes ne sont enregistrées (commit) qu'une fois l'envoi confirmé par
+    la destination, pour qu'un envoi raté soit retenté à la récolte suivante.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.known = store.get_all()
+        self.pending = {}
+        self.skipped = []
+
+    def filter(self, outcomes):
+        for station, info, error in outcomes:
+            if info and not error:
+                digest = content_hash(info)
+                if self.known.get(station) == digest:
+                    self.skipped.append(station)
+                    continue
+                self.pending[station] = digest
+            yield station, info, error
+
+    def commit(self, stations=None):
+        if stations is None:
+            stations = list(self.pending)
+        hashes = {s: self.pending.pop(s) for s in stations if s in self.pending}
+        self.store.save(hashes)
+        self.known.update(hashes)
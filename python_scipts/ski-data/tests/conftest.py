@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# Service et modules communs importables sans installation ; état local (caches,
+# jobs, empreintes) dans un dossier temporaire, jamais dans /tmp partagé
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, ".."), os.path.join(HERE, "..", "..", "ski-common")]
+
+_workdir = tempfile.mkdtemp(prefix="ski-data-tests-")
+os.environ.update({
+    "JOBS_DB": os.path.join(_workdir, "jobs.sqlite"),
+    "STATION_STATE_DB": os.path.join(_workdir, "state.sqlite"),
+    "OVERPASS_CACHE_DIR": os.path.join(_workdir, "overpass_cache"),
+    "OVERPASS_CACHE_MODE": "off",
+})
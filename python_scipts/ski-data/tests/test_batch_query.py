@@ -0,0 +1,85 @@
+import re
+
+import pytest
+
+import main
+
+AREA = re.compile(r'area\["name"="([^"]+)"\]')
+
+
+def station_elements(station, offset):
+    """Réponse Overpass minimale d'une station : une piste de deux nœuds."""
+    return [
+        {"type": "way", "id": offset, "nodes": [offset + 1, offset + 2],
+         "tags": {"name": f"Piste {station}", "piste:type": "downhill", "piste:difficulty": "easy"}},
+        {"type": "node", "id": offset + 1, "lat": 45.0, "lon": 6.0},
+        {"type": "node", "id": offset + 2, "lat": 45.001, "lon": 6.0},
+    ]
+
+
+def fake_overpass(query):
+    """Overpass simulé : un bloc `out count` puis les éléments, pour chaque zone de la requête."""
+    stations = AREA.findall(query)
+    elements = []
+    for i, station in enumerate(stations):
+        block = station_elements(station, 100 * (i + 1))
+        if "out count" in query:
+            elements.append({"type": "count", "id": 0, "tags": {"total": str(len(block))}})
+        elements.extend(block)
+    return {"elements": elements}
+
+
+@pytest.fixture
+def overpass(monkeypatch):
+    queries = []
+
+    def post(query, timeout=None, limiters=None):
+        queries.append(query)
+        return fake_overpass(query)
+
+    monkeypatch.setattr(main, "post_overpass_query", post)
+    return queries
+
+
+def test_batch_query_has_one_count_block_per_station():
+    stations = ["Tignes", "Val d'Isère", "Les Arcs"]
+    query = main.build_batch_overpass_query(stations)
+    assert AREA.findall(query) == stations
+    assert query.count("out count;") == 3
+
+
+def test_split_batch_response_round_trip():
+    stations = ["Tignes", "Les Arcs"]
+    split = main.split_batch_response(fake_overpass(main.build_batch_overpass_query(stations)), stations)
+    assert list(split) == stations
+    assert split["Les Arcs"] == {"elements": station_elements("Les Arcs", 200)}
+
+
+@pytest.mark.parametrize("elements", [
+    [{"type": "node", "id": 1}],  # aucun séparateur avant les éléments
+    [{"type": "count", "id": 0}],  # un bloc pour deux stations
+])
+def test_split_batch_response_rejects_malformed(elements):
+    with pytest.raises(ValueError):
+        main.split_batch_response({"elements": elements}, ["A", "B"])
+
+
+def test_batch_fetch_uses_one_query(overpass):
+    outcomes = main.fetch_batch_safe(["Tignes", "Les Arcs"], cache_mode="off")
+    assert len(overpass) == 1
+    assert [(s, info["pistes"][0]["name"], error) for s, info, error in outcomes] == [
+        ("Tignes", "Piste Tignes", None), ("Les Arcs", "Piste Les Arcs", None)]
+
+
+def test_failed_batch_falls_back_to_single_queries(monkeypatch, overpass):
+    def post(query, timeout=None, limiters=None):
+        overpass.append(query)
+        if "out count" in query:
+            raise RuntimeError("504 depuis l'endpoint")
+        return fake_overpass(query)
+
+    monkeypatch.setattr(main, "post_overpass_query", post)
+    outcomes = main.fetch_batch_safe(["Tignes", "Les Arcs"], cache_mode="off")
+    assert len(overpass) == 3
+    assert [(s, info["pistes"][0]["name"], error) for s, info, error in outcomes] == [
+        ("Tignes", "Piste Tignes", None), ("Les Arcs", "Piste Les Arcs", None)]
@@ -0,0 +1,64 @@
+import pytest
+
+import endpoint_pool
+from endpoint_pool import AllEndpointsOpen, EndpointPool
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(endpoint_pool.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(endpoint_pool.time, "sleep", clock.sleep)
+    return clock
+
+
+def open_all(pool, backoffs):
+    for url, backoff in backoffs.items():
+        pool.acquire(exclude=[u for u in backoffs if u != url])
+        pool.record_failure(url, status=429, retry_after=backoff)
+
+
+def test_healthy_endpoint_is_returned_without_waiting(clock):
+    pool = EndpointPool(["a", "b"])
+    open_all(pool, {"a": 30})
+    assert pool.acquire() == "b"
+    assert clock.sleeps == []
+
+
+def test_all_open_waits_for_earliest_reopening_within_deadline(clock):
+    pool = EndpointPool(["a", "b"])
+    open_all(pool, {"a": 30, "b": 10})
+    assert pool.acquire(deadline=clock.now + 60) == "b"
+    assert clock.sleeps == [10]
+
+
+def test_all_open_beyond_deadline_raises(clock):
+    pool = EndpointPool(["a", "b"])
+    open_all(pool, {"a": 30, "b": 10})
+    with pytest.raises(AllEndpointsOpen) as excinfo:
+        pool.acquire(deadline=clock.now + 5)
+    assert excinfo.value.retry_in == 10
+    assert clock.sleeps == []
+    # Aucune réservation ne doit fuiter
+    assert all(e["in_flight"] == 0 for e in pool.stats())
+
+
+def test_all_open_without_deadline_raises_immediately(clock):
+    pool = EndpointPool(["a"])
+    open_all(pool, {"a": 10})
+    with pytest.raises(AllEndpointsOpen):
+        pool.acquire()
+    assert clock.sleeps == []
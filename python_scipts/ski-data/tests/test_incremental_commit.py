@@ -0,0 +1,91 @@
+import json
+
+import main
+from station_state import IncrementalTracker, StationHashStore
+
+
+class FakeResponse:
+    headers = {"content-type": "application/json"}
+
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+        self.text = ""
+
+    def json(self):
+        if self.data is None:
+            raise ValueError("no JSON")
+        return self.data
+
+
+def station_info(name):
+    return {"station": name, "pistes": [{"name": "Verte", "difficulty": "Vert", "coords": [[45.0, 6.0]]}],
+            "remontees": []}
+
+
+def partial_process_response():
+    return FakeResponse(207, {
+        "status": "completed",
+        "results": [{"station": "A", "status": "success"}],
+        "errors": [{"station": "B", "error": "HTTP 500"}],
+    })
+
+
+def test_delivered_stations_requires_2xx_or_reported_success():
+    assert main.delivered_stations(FakeResponse(200), ["A", "B"]) == ["A", "B"]
+    assert main.delivered_stations(partial_process_response(), ["A", "B"]) == ["A"]
+    assert main.delivered_stations(FakeResponse(207), ["A", "B"]) == []
+    assert main.delivered_stations(FakeResponse(201), ["A", "B"]) == ["A", "B"]
+    assert main.delivered_stations(FakeResponse(202), ["A", "B"]) == ["A", "B"]
+    assert main.delivered_stations(FakeResponse(301), ["A"]) == []
+    assert main.delivered_stations(FakeResponse(500, {"results": []}), ["A"]) == []
+
+
+def test_partial_process_response_commits_only_successful_stations(tmp_path, monkeypatch):
+    store = StationHashStore(str(tmp_path / "state.sqlite"))
+    tracker = IncrementalTracker(store)
+    results = [info for _, info, _ in tracker.filter((n, station_info(n), None) for n in ("A", "B"))]
+    monkeypatch.setattr(main.requests, "post", lambda *args, **kwargs: partial_process_response())
+
+    summary = main.forward_to_process({"process_url": "http://process"}, results, [], tracker)
+
+    assert summary["process_response"]["status_code"] == 207
+    assert set(store.get_all()) == {"A"}
+    # B n'est pas validée : elle repart à la récolte suivante
+    retry = IncrementalTracker(store)
+    assert [s for s, _, _ in retry.filter((n, station_info(n), None) for n in ("A", "B"))] == ["B"]
+    assert retry.skipped == ["A"]
+
+
+def fused_destination(monkeypatch, responses):
+    """Répond aux envois du mode fusionné avec la réponse prévue pour chaque station."""
+    posted = []
+
+    def post(url, data=None, headers=None, timeout=None):
+        station = json.loads(data)["station"]
+        posted.append(station)
+        return responses[station]
+
+    monkeypatch.setattr(main, "get_token_cache", lambda: None)
+    monkeypatch.setattr(main.requests, "post", post)
+    return posted
+
+
+def test_forward_fused_commits_200_201_and_reported_207_success(tmp_path, monkeypatch):
+    store = StationHashStore(str(tmp_path / "state.sqlite"))
+    tracker = IncrementalTracker(store)
+    posted = fused_destination(monkeypatch, {
+        "A": FakeResponse(200),
+        "B": FakeResponse(201),
+        "C": FakeResponse(207, {"results": [{"station": "C", "status": "success"}]}),
+        "D": FakeResponse(207, {"results": [{"station": "D", "status": "error"}]}),
+    })
+    names = ("A", "B", "C", "D")
+    outcomes = tracker.filter((n, station_info(n), None) for n in names)
+
+    summary = main.forward_fused({"forward_to_url": "http://dest"}, outcomes, tracker)
+
+    assert posted == list(names)
+    assert summary["stations_count"] == 3
+    assert summary["failed_stations"] == [{"station": "D", "error": "HTTP 207"}]
+    assert set(store.get_all()) == {"A", "B", "C"}
@@ -0,0 +1,53 @@
+import json
+import sqlite3
+
+import main
+from jobs import REDACTED, JobStore
+
+
+def test_params_are_stored_without_header_values(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    params = {"destination_url": "http://dest", "headers": {"Authorization": "Bearer secret"}}
+    job_id = store.create("fetch-stations", params, ["A"])
+
+    with sqlite3.connect(store.path) as conn:
+        raw = conn.execute("SELECT params FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert "secret" not in raw
+    assert json.loads(raw)["headers"] == {"Authorization": REDACTED}
+    assert params["headers"]["Authorization"] == "Bearer secret"
+
+
+def test_resume_lock_is_taken_once_per_deployment(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    first, second = JobStore(path), JobStore(path)
+    assert first.claim_resume("deploy-1")
+    assert not second.claim_resume("deploy-1")
+    assert second.claim_resume("deploy-2")
+
+
+def test_import_does_not_resume_jobs(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    job_id = store.create("fetch-stations", {"headers": {"Authorization": "Bearer secret"}}, ["A"])
+    enqueued = []
+    monkeypatch.setattr(main, "job_store", store)
+    monkeypatch.setattr(main, "enqueue_job", enqueued.append)
+
+    assert main.resume_unfinished_jobs("deploy") == [job_id]
+    assert main.resume_unfinished_jobs("deploy") == []
+    assert enqueued == [job_id]
+
+
+def test_submitted_job_forwards_with_in_memory_headers(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    seen = []
+    monkeypatch.setattr(main, "job_store", store)
+    monkeypatch.setattr(main, "station_names", [])
+    monkeypatch.setattr(main, "enqueue_job", lambda job_id: None)
+    monkeypatch.setitem(main.JOB_FORWARDERS, "fetch-stations",
+                        lambda params, results, errors, tracker: seen.append(params["headers"]) or {})
+
+    job_id = main.submit_job("fetch-stations", {"headers": {"Authorization": "Bearer secret"}})
+    main.run_job(job_id)
+
+    assert seen == [{"Authorization": "Bearer secret"}]
+    assert store.describe(job_id)["status"] == "completed"
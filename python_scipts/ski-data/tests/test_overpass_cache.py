@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+import main
+from overpass_cache import OverpassCache, OverpassCacheMiss
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("overpass_cache.time.time", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = OverpassCache(str(tmp_path), ttl=60, max_bytes=10**6)
+    cache.put("Tignes", "q", {"elements": [1]})
+    clock.now += 59
+    assert cache.get("Tignes", "q") == {"elements": [1]}
+    clock.now += 2
+    assert cache.get("Tignes", "q") is None
+    # Hors ligne, une entrée expirée reste servie
+    assert cache.get("Tignes", "q", allow_stale=True) == {"elements": [1]}
+    assert cache.get("Tignes", "autre requête") is None
+
+
+def test_least_recently_read_entry_is_evicted(tmp_path):
+    cache = OverpassCache(str(tmp_path), ttl=3600, max_bytes=10**6)
+    for i, station in enumerate(("A", "B", "C")):
+        cache.put(station, "q", {"elements": ["x" * 100]})
+        os.utime(cache._path(station, "q"), (1000 + i, 1000 + i))
+    cache.get("A", "q")  # A redevient la plus récemment lue
+    cache.max_bytes = 2 * os.path.getsize(cache._path("A", "q")) + 1
+    cache.put("D", "q", {"elements": ["x" * 100]})
+    assert cache.get("B", "q") is None and cache.get("C", "q") is None
+    assert cache.get("A", "q") is not None and cache.get("D", "q") is not None
+    assert cache.stats()["entries"] == 2
+
+
+@pytest.fixture
+def overpass(tmp_path, monkeypatch):
+    """Cache temporaire et Overpass simulé : renvoie la liste des requêtes envoyées."""
+    queries = []
+    monkeypatch.setattr(main, "overpass_cache", OverpassCache(str(tmp_path), ttl=3600, max_bytes=10**6))
+
+    def post(query, timeout=None, limiters=None):
+        queries.append(query)
+        return {"elements": [{"type": "node", "id": len(queries)}]}
+
+    monkeypatch.setattr(main, "post_overpass_query", post)
+    return queries
+
+
+def test_online_mode_reads_and_fills_cache(overpass):
+    first = main.get_overpass_data("Tignes", "online")
+    assert main.get_overpass_data("Tignes", "online") == first
+    assert len(overpass) == 1
+
+
+def test_refresh_mode_bypasses_cache_then_stores(overpass):
+    main.get_overpass_data("Tignes", "online")
+    refreshed = main.get_overpass_data("Tignes", "refresh")
+    assert len(overpass) == 2
+    assert main.get_overpass_data("Tignes", "online") == refreshed
+    assert len(overpass) == 2
+
+
+def test_offline_mode_never_queries(overpass):
+    with pytest.raises(OverpassCacheMiss):
+        main.get_overpass_data("Tignes", "offline")
+    assert overpass == []
+    main.get_overpass_data("Tignes", "online")
+    assert main.get_overpass_data("Tignes", "offline")["elements"][0]["id"] == 1
+    assert len(overpass) == 1
+
+
+def test_off_mode_neither_reads_nor_writes(overpass):
+    main.get_overpass_data("Tignes", "off")
+    main.get_overpass_data("Tignes", "off")
+    assert len(overpass) == 2
+    assert main.overpass_cache.stats()["entries"] == 0
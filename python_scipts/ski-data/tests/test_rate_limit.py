@@ -0,0 +1,74 @@
+import pytest
+
+import main
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.calls = 0
+
+    def acquire(self):
+        self.calls += 1
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+    text = ""
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"elements": []}
+
+
+def test_request_limits_are_capped_at_configured_rate():
+    limiters = main.request_rate_limiters(rate=1000, burst=1000)
+    assert set(limiters) == set(main.OVERPASS_ENDPOINTS)
+    for limiter in limiters.values():
+        assert limiter.rate == main.DEFAULT_RATE_PER_ENDPOINT
+        assert limiter.burst == main.DEFAULT_BURST
+    slower = main.request_rate_limiters(rate=0.1)
+    assert all(limiter.rate == 0.1 for limiter in slower.values())
+    assert main.request_rate_limiters() is None
+
+
+def test_request_rate_never_reconfigures_shared_limiter():
+    shared = [main.get_rate_limiter(url) for url in main.OVERPASS_ENDPOINTS]
+    outcomes = list(main.iter_harvest(["Station inconnue"], rate=1000, burst=1000, cache_mode="offline"))
+    assert outcomes[0][2]  # absente du cache hors ligne
+    for url, limiter in zip(main.OVERPASS_ENDPOINTS, shared):
+        assert main.get_rate_limiter(url) is limiter
+        assert limiter.rate == main.DEFAULT_RATE_PER_ENDPOINT
+        assert limiter.burst == main.DEFAULT_BURST
+
+
+def test_query_waits_on_request_and_shared_limiters(monkeypatch):
+    url = main.OVERPASS_ENDPOINTS[0]
+    shared, local = CountingLimiter(), CountingLimiter()
+    monkeypatch.setattr(main.endpoint_pool, "acquire", lambda exclude=(), deadline=None: url)
+    monkeypatch.setattr(main, "get_rate_limiter", lambda overpass_url: shared)
+    monkeypatch.setattr(main.requests, "post", lambda *args, **kwargs: FakeResponse())
+    assert main.post_overpass_query("[out:json];", limiters={url: local}) == {"elements": []}
+    assert (shared.calls, local.calls) == (1, 1)
+
+
+@pytest.mark.parametrize("body", [
+    {"rate": "fast"}, {"rate": 0}, {"rate": -1}, {"burst": 1.5}, {"burst": True},
+    {"concurrency": "4"}, {"concurrency": 0}, {"batch_size": -2}, {"cache_mode": "sometimes"},
+])
+def test_invalid_harvest_options_are_400(body):
+    client = main.app.test_client()
+    for path in ("/fetch-stations", "/fetch-for-process"):
+        response = client.post(path, json=dict(body, destination_url="http://dest"))
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+
+def test_harvest_options_are_coerced():
+    options = main.harvest_options({"rate": 2, "burst": 3.0, "concurrency": 4})
+    assert options["rate"] == 2.0 and isinstance(options["rate"], float)
+    assert options["burst"] == 3 and isinstance(options["burst"], int)
+    assert options["concurrency"] == 4
+    assert options["batch_size"] == main.DEFAULT_BATCH_SIZE
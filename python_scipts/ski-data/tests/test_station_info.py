@@ -0,0 +1,111 @@
+import json
+import os
+
+import main
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def legacy_extract_coords(elem, all_elements):
+    # extract_coords d'origine : parcours de toute la réponse pour chaque node référencé
+    coords, seen = [], set()
+    if elem["type"] == "node":
+        coord = (elem["lat"], elem["lon"])
+        if coord not in seen:
+            coords.append(coord)
+            seen.add(coord)
+    else:
+        node_ids = []
+        if elem["type"] == "way":
+            node_ids = elem.get("nodes", [])
+        elif elem["type"] == "relation":
+            for member in elem.get("members", []):
+                if member["type"] == "node":
+                    node_ids.append(member["ref"])
+        for nid in node_ids:
+            for node in all_elements:
+                if node["type"] == "node" and node["id"] == nid:
+                    coord = (node["lat"], node["lon"])
+                    if coord not in seen:
+                        coords.append(coord)
+                        seen.add(coord)
+    return coords
+
+
+def legacy_station_info(station, data):
+    # Corps de get_station_info d'origine, sans l'appel Overpass
+    elements = data["elements"]
+    pistes_dict, remontees = {}, []
+    for el in elements:
+        if el["type"] not in ("way", "relation") or "tags" not in el:
+            continue
+        tags = el["tags"]
+        name = tags.get("name", "").strip()
+        if not name or name.lower() in ["", "none", "null", "unknown", "(nom inconnu)"]:
+            continue
+        coords = legacy_extract_coords(el, elements)
+        if not coords:
+            continue
+        if "piste:type" in tags:
+            raw_diff = tags.get("piste:difficulty", "easy").lower()
+            diff_label = main.DIFFICULTY_LABELS.get(raw_diff, "Vert")
+            norm_name = main.normalize_name(name)
+            if norm_name not in pistes_dict:
+                pistes_dict[norm_name] = {"name": name, "difficulty": diff_label, "coords": coords}
+            else:
+                for c in coords:
+                    if c not in pistes_dict[norm_name]["coords"]:
+                        pistes_dict[norm_name]["coords"].append(c)
+        elif "aerialway" in tags and tags["aerialway"] not in ("pylon", "goods"):
+            remontees.append({"name": name, "type": tags.get("aerialway", "unknown"), "coords": coords})
+    return {"station": station, "pistes": list(pistes_dict.values()), "remontees": remontees}
+
+
+def as_tuples(info):
+    return dict(info, **{key: [dict(item, coords=[tuple(c) for c in item["coords"]]) for item in info[key]]
+                         for key in ("pistes", "remontees")})
+
+
+def test_extract_coords_matches_legacy():
+    data = load_fixture("overpass_station.json")
+    elements = data["elements"]
+    node_index, element_index = main.index_elements(elements)
+    for el in elements:
+        if el["type"] in ("way", "relation"):
+            assert main.extract_coords(el, node_index, element_index) == legacy_extract_coords(el, elements)
+
+
+def test_get_station_info_matches_legacy(monkeypatch):
+    data = load_fixture("overpass_station.json")
+    monkeypatch.setattr(main, "get_overpass_data", lambda station, *args: data)
+    info = main.get_station_info("Les Gets")
+    assert as_tuples(info) == legacy_station_info("Les Gets", data)
+    assert [p["name"] for p in info["pistes"]] == [
+        "Les Chavannes", "Grand Cry", "Bleuets", "Écureuil", "Boucle du Lac", "Hors-piste du Ranfoilly",
+        "Tour du Mont Chéry", "Piste de luge",
+    ]
+    assert [l["type"] for l in info["remontees"]] == ["chair_lift", "drag_lift", "gondola", "magic_carpet"]
+
+
+def test_relation_resolves_member_ways():
+    elements = [
+        {"type": "relation", "id": 1, "members": [{"type": "way", "ref": 10, "role": ""},
+                                                  {"type": "relation", "ref": 2, "role": ""}],
+         "tags": {"piste:type": "downhill", "name": "Liaison"}},
+        {"type": "relation", "id": 2, "members": [{"type": "way", "ref": 11, "role": ""},
+                                                  {"type": "relation", "ref": 1, "role": ""}]},
+        {"type": "way", "id": 10, "nodes": [100, 101]},
+        {"type": "way", "id": 11, "nodes": [101, 102]},
+        {"type": "node", "id": 100, "lat": 45.0, "lon": 6.0},
+        {"type": "node", "id": 101, "lat": 45.001, "lon": 6.001},
+        {"type": "node", "id": 102, "lat": 45.002, "lon": 6.002},
+    ]
+    node_index, element_index = main.index_elements(elements)
+    # Les relations imbriquées en cycle ne sont parcourues qu'une fois
+    assert main.extract_coords(elements[0], node_index, element_index) == [(45.0, 6.0), (45.001, 6.001), (45.002, 6.002)]
+    assert legacy_extract_coords(elements[0], elements) == []
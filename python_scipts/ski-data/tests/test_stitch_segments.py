@@ -0,0 +1,46 @@
+import main
+
+A, B, C, D, E, F = (45.0, 6.0), (45.1, 6.1), (45.2, 6.2), (45.3, 6.3), (45.4, 6.4), (46.0, 7.0)
+
+
+def test_chained_in_order():
+    assert main.stitch_segments([[A, B], [B, C], [C, D]]) == [[A, B, C, D]]
+
+
+def test_out_of_order_and_reversed_segments():
+    # Le sens du premier segment est conservé, les autres sont retournés au besoin
+    assert main.stitch_segments([[B, C], [D, C], [A, B]]) == [[A, B, C, D]]
+
+
+def test_disjoint_segments_stay_separate():
+    assert main.stitch_segments([[A, B], [E, F], [B, C]]) == [[A, B, C], [E, F]]
+
+
+def test_branch_prefers_oriented_segment():
+    # Deux segments partent de B : celui qui part de B dans le sens de la chaîne est pris en premier
+    assert main.stitch_segments([[A, B], [C, B], [B, D]]) == [[A, B, D], [C, B]]
+
+
+def test_loop_closes_once():
+    assert main.stitch_segments([[A, B], [B, C], [C, A]]) == [[A, B, C, A]]
+
+
+def test_merge_segments_drops_repeated_vertices():
+    # Way dupliqué et way qui revient sur ses pas : chaque sommet n'apparaît qu'une fois
+    assert main.merge_segments([[A, B], [B, C], [B, C], [C, D, C]]) == [A, B, C, D]
+
+
+def test_station_piste_ways_are_stitched():
+    data = {"elements": [
+        {"type": "way", "id": 2, "nodes": [3, 4], "tags": {"piste:type": "downhill", "name": "Combe"}},
+        {"type": "way", "id": 1, "nodes": [2, 1], "tags": {"piste:type": "downhill", "name": "Combe"}},
+        {"type": "way", "id": 3, "nodes": [2, 3], "tags": {"piste:type": "downhill", "name": "combe"}},
+        {"type": "node", "id": 1, "lat": A[0], "lon": A[1]},
+        {"type": "node", "id": 2, "lat": B[0], "lon": B[1]},
+        {"type": "node", "id": 3, "lat": C[0], "lon": C[1]},
+        {"type": "node", "id": 4, "lat": D[0], "lon": D[1]},
+    ]}
+    info = main.parse_station_data("Test", data)
+    assert len(info["pistes"]) == 1
+    # Une seule polyligne continue : départ et arrivée sont les vraies extrémités
+    assert list(info["pistes"][0]["coords"]) == [A, B, C, D]
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+import requests
+
+import main
+
+
+class FakeResponse:
+    headers = {"content-type": "application/json"}
+    text = "{}"
+
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+    def json(self):
+        return {}
+
+
+class Destination:
+    """Remplace requests.post : consomme le corps (y compris un générateur) et le garde."""
+
+    def __init__(self, status_code=200, fail_on=None):
+        self.status_code = status_code
+        self.fail_on = fail_on
+        self.calls = []
+
+    def __call__(self, url, data=None, headers=None, timeout=None):
+        body = b"".join(data) if not isinstance(data, bytes) else data
+        self.calls.append({"url": url, "body": body, "headers": headers})
+        if self.fail_on is not None and len(self.calls) == self.fail_on:
+            raise requests.exceptions.ConnectionError("connexion refusée")
+        return FakeResponse(self.status_code)
+
+
+def station_info(name):
+    return {"station": name, "pistes": [{"name": "Verte", "difficulty": "Vert", "coords": [[45.0, 6.0]]}],
+            "remontees": []}
+
+
+def outcomes():
+    return [
+        ("A", station_info("A"), None),
+        ("B", None, "HTTP 504"),
+        ("C", station_info("C"), None),
+        ("D", station_info("D"), None),
+    ]
+
+
+def empty_summary():
+    return {"stations_count": 0, "failed_stations": [], "bytes_sent": 0, "destination_responses": []}
+
+
+@pytest.fixture
+def destination(monkeypatch):
+    destination = Destination()
+    monkeypatch.setattr(main.requests, "post", destination)
+    return destination
+
+
+def test_stream_ndjson_sends_one_line_per_station(destination):
+    summary = empty_summary()
+    main.stream_ndjson(outcomes(), "http://dest/process", {"Authorization": "Bearer t"}, summary)
+
+    assert len(destination.calls) == 1
+    call = destination.calls[0]
+    assert call["headers"]["Content-Type"] == "application/x-ndjson"
+    assert call["headers"]["Authorization"] == "Bearer t"
+    lines = call["body"].decode("utf-8").split("\n")
+    assert lines[-1] == ""
+    assert [json.loads(line)["station"] for line in lines[:-1]] == ["A", "C", "D"]
+    assert summary["stations_count"] == 3
+    assert summary["bytes_sent"] == len(call["body"])
+    assert summary["failed_stations"] == [{"station": "B", "error": "HTTP 504"}]
+    assert summary["destination_responses"][0]["status_code"] == 200
+
+
+def test_stream_batches_frames_batches_with_extra_payload(destination):
+    summary = empty_summary()
+    main.stream_batches(outcomes(), "http://dest/process", {}, 2, summary, extra_payload={"tolerance": 30})
+
+    bodies = [json.loads(call["body"]) for call in destination.calls]
+    assert [[s["station"] for s in body["data"]] for body in bodies] == [["A", "C"], ["D"]]
+    assert all(body["tolerance"] == 30 for body in bodies)
+    assert summary["stations_count"] == 3
+    assert summary["bytes_sent"] == sum(len(call["body"]) for call in destination.calls)
+    assert summary["failed_stations"] == [{"station": "B", "error": "HTTP 504"}]
+    assert [r["stations"] for r in summary["destination_responses"]] == [["A", "C"], ["D"]]
+
+
+def test_stream_batches_records_transport_error_per_batch(monkeypatch):
+    destination = Destination(fail_on=1)
+    monkeypatch.setattr(main.requests, "post", destination)
+    summary = empty_summary()
+    main.stream_batches(outcomes(), "http://dest/process", {}, 2, summary)
+
+    first, second = summary["destination_responses"]
+    assert first == {"error": "connexion refusée", "stations": ["A", "C"]}
+    assert second["status_code"] == 200
+    assert second["stations"] == ["D"]
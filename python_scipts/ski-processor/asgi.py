@@ -0,0 +1,244 @@
+# Mode de service asynchrone de ski-processor (SERVE_MODE=asgi) :
+#
+#   uvicorn asgi:app --host 0.0.0.0 --port 8080
+#
+# Adaptateur à base de threads, pas un pipeline asynchrone : pour /process
+# (payload JSON/msgpack habituel), la boucle d'événements ne fait que
+# coordonner. Le calcul des stations (cache de résultats, pool de processus,
+# store spatial), l'authentification Firebase et les envois vers la
+# destination (requests, bloquant) tournent dans les threads de l'exécuteur ;
+# le gain est de calculer pendant l'authentification, pas d'économiser des
+# threads. Les autres routes, le mode balayage et les corps lus en flux sont
+# confiés à l'application Flask via le middleware WSGI d'uvicorn.
+import asyncio
+import json
+import logging
+import queue
+import threading
+from urllib.parse import parse_qs
+
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+from main import (MAX_BODY_BYTES, PROCESS_PARALLEL, PROCESS_WORKERS, app as wsgi_app, check_process_options,
+                  get_firebase_token, get_result_cache, get_spatial_store, iter_cached_stations, record_spatial,
+                  write_processed_stations)
+from stream_ingest import NDJSON_CONTENT_TYPE
+from ski_common.wire_format import PayloadTooLarge, WireFormatError, decode_payload
+
+logger = logging.getLogger(__name__)
+
+# Stations calculées d'avance, en attente de l'envoi (pendant l'authentification notamment)
+PREFETCH_STATIONS = 2 * PROCESS_WORKERS
+
+
+def terminated_input(environ, start_response):
+    # Le middleware a lu tout le corps : Flask peut le lire jusqu'au bout même sans Content-Length (chunked)
+    environ["wsgi.input_terminated"] = True
+    return wsgi_app(environ, start_response)
+
+
+# Application Flask servie depuis un pool de threads
+wsgi = WSGIMiddleware(terminated_input)
+
+
+class Prefetch:
+    """Consomme un itérateur dans un thread (run), au plus `size` éléments d'avance.
+
+    L'itération (__iter__) relit les éléments dans l'ordre et relance l'exception
+    éventuelle du producteur ; cancel() arrête le producteur à l'élément suivant.
+    """
+
+    _END = object()
+
+    def __init__(self, iterator, size):
+        self.iterator = iterator
+        self.queue = queue.Queue(maxsize=max(size, 1))
+        self.stopped = threading.Event()
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        try:
+            for item in self.iterator:
+                if not self._put((item, None)):
+                    return
+        except Exception as e:
+            self._put((self._END, e))
+        else:
+            self._put((self._END, None))
+        finally:
+            if hasattr(self.iterator, "close"):
+                self.iterator.close()
+
+    def __iter__(self):
+        while True:
+            item, error = self.queue.get()
+            if item is self._END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+
+    def cancel(self):
+        self.stopped.set()
+
+
+async def process_in_threads(payload):
+    """Corps de /process, exécuté dans les threads de l'exécuteur ; renvoie (statut HTTP, réponse JSON)."""
+    loop = asyncio.get_running_loop()
+    destination_url = payload['destination_url']
+    headers = dict(payload.get('headers', {}))
+    tolerance = payload.get('tolerance', 0.0006)
+    batch_size = payload.get('batch_size', 1)
+    cache = get_result_cache() if payload.get('cache', True) else None
+    cache_stats = {"hits": 0, "result_hits": 0, "misses": 0}
+    # L'authentification (jeton en cache le plus souvent) avance pendant le calcul
+    token_task = loop.run_in_executor(None, get_firebase_token)
+    processed = iter_cached_stations(payload['data'], tolerance, payload.get('engine'), payload.get('tolerance_m'),
+                                     payload.get('parallel', PROCESS_PARALLEL), destination_url, cache, cache_stats)
+    prefetch = Prefetch(record_spatial(processed, get_spatial_store()), PREFETCH_STATIONS)
+    producer = loop.run_in_executor(None, prefetch.run)
+    try:
+        token = await token_task
+        if not token:
+            raise PermissionError("Failed to authenticate with Firebase")
+        headers['Authorization'] = f'Bearer {token}'
+        results, errors = await loop.run_in_executor(None, write_processed_stations, iter(prefetch),
+                                                     destination_url, headers, batch_size, cache)
+    except BaseException:
+        # Échec d'authentification ou requête abandonnée : plus aucune station n'est calculée
+        prefetch.cancel()
+        raise
+    finally:
+        await asyncio.shield(producer)
+    response = {
+        "status": "completed",
+        "successful_stations": len(results),
+        "failed_stations": len(errors),
+        "results": results,
+        "errors": errors if errors else None
+    }
+    if cache is not None:
+        response["cache"] = cache_stats
+    return (200 if not errors else 207), response
+
+
+def limit_body(receive):
+    """receive() qui lève PayloadTooLarge dès que le corps reçu dépasse MAX_BODY_BYTES."""
+    received = 0
+
+    async def limited():
+        nonlocal received
+        message = await receive()
+        received += len(message.get("body", b""))
+        if received > MAX_BODY_BYTES:
+            raise PayloadTooLarge(f"Request body exceeds {MAX_BODY_BYTES} bytes")
+        return message
+
+    return limited
+
+
+def replay(body):
+    """receive() qui restitue un corps déjà lu, pour le confier à l'application Flask."""
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return receive
+
+
+async def read_body(receive):
+    receive = limit_body(receive)
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ConnectionError("Client disconnected")
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def forward_to_wsgi(scope, receive, send):
+    """Confie la requête à Flask ; corps borné à MAX_BODY_BYTES (413 au-delà)."""
+    try:
+        await wsgi(scope, limit_body(receive), send)
+    except PayloadTooLarge as e:
+        # Levée pendant la lecture du corps, avant toute réponse de Flask
+        await send_json(send, 413, {"error": str(e)})
+
+
+def request_headers(scope):
+    return {k.decode("latin-1").title(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+
+
+def is_stream_scope(scope, headers):
+    """Même critère que main.is_stream_request, à partir de la requête ASGI."""
+    content_type = (headers.get("Content-Type") or "").split(";")[0].strip().lower()
+    stream = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("stream", [""])[0]
+    return content_type == NDJSON_CONTENT_TYPE or stream.lower() in ("1", "true", "yes")
+
+
+async def handle_process(scope, body, send):
+    headers = request_headers(scope)
+    try:
+        payload = decode_payload(body, headers, MAX_BODY_BYTES)
+    except PayloadTooLarge as e:
+        return await send_json(send, 413, {"error": str(e)})
+    except WireFormatError as e:
+        return await send_json(send, 415, {"error": str(e)})
+    except (ValueError, OSError) as e:
+        return await send_json(send, 400, {"error": f"Invalid request body: {str(e)}"})
+    if not payload or not isinstance(payload, dict):
+        return await send_json(send, 400, {"error": "No JSON data provided"})
+    if not payload.get('data'):
+        return await send_json(send, 400, {"error": "No 'data' field in JSON"})
+    if payload.get('tolerances_m') is not None or payload.get('tolerances') is not None:
+        # Mode balayage : pas d'envoi réseau, l'implémentation Flask suffit
+        return await forward_to_wsgi(scope, replay(body), send)
+    options_error = check_process_options(payload)
+    if options_error:
+        return await send_json(send, 400, {"error": options_error})
+    try:
+        status, response = await process_in_threads(payload)
+    except PermissionError as e:
+        return await send_json(send, 401, {"status": "error", "message": str(e)})
+    except Exception as e:
+        logger.error(f"Error in process_ski_data: {str(e)}")
+        return await send_json(send, 500, {"status": "error", "message": f"Internal server error: {str(e)}"})
+    await send_json(send, status, response)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    if (scope["path"] == "/process" and scope["method"] == "POST"
+            and not is_stream_scope(scope, request_headers(scope))):
+        try:
+            body = await read_body(receive)
+        except PayloadTooLarge as e:
+            return await send_json(send, 413, {"error": str(e)})
+        return await handle_process(scope, body, send)
+    # Autres routes et corps lus en flux : Flask lit lui-même le corps
+    await forward_to_wsgi(scope, receive, send)
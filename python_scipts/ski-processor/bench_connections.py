@@ -0,0 +1,130 @@
+"""Banc d'essai des moteurs de trouver_connections sur des stations synthétiques.
+
+    python bench_connections.py --scales 1 10 100 --engines reference grid
+
+Chaque moteur est vérifié contre le moteur de référence (mêmes listes
+`connection`), puis chronométré. Le résultat est écrit en JSON sur stdout.
+"""
+import argparse
+import copy
+import json
+import math
+import random
+import time
+
+from ski_common.connections import ENGINES, DEFAULT_TOLERANCE, available_engines
+
+# Taille d'une station réelle de bonne taille (ordre de grandeur La Plagne)
+BASE_SLOPES = 40
+BASE_LIFTS = 15
+BASE_VERTICES = 60
+STEP = 0.0001  # ~10 m entre deux sommets
+
+
+def random_walk(rng, start, length):
+    lon, lat = start
+    heading = rng.uniform(0, 6.283)
+    points = [[lon, lat]]
+    for _ in range(length - 1):
+        heading += rng.uniform(-0.4, 0.4)
+        lon += STEP * math.cos(heading)
+        lat += STEP * math.sin(heading)
+        points.append([round(lon, 7), round(lat, 7)])
+    return points
+
+
+def synthetic_station(scale=1, vertices=BASE_VERTICES, seed=0):
+    """Pistes et remontées au format de process_ski_data ([lon, lat], listes `connection` vides).
+
+    L'emprise grandit avec l'échelle pour garder une densité comparable, et une
+    partie des pistes démarre sur une piste ou en haut d'une remontée existante.
+    """
+    rng = random.Random(seed)
+    n_slopes, n_lifts = BASE_SLOPES * scale, BASE_LIFTS * scale
+    extent = 0.03 * scale ** 0.5
+    origin = (6.5, 45.3)
+
+    def random_point():
+        return [origin[0] + rng.uniform(0, extent), origin[1] + rng.uniform(0, extent)]
+
+    chair_lifts = []
+    for i in range(n_lifts):
+        bas = random_point()
+        haut = [bas[0] + rng.uniform(-0.01, 0.01), bas[1] + rng.uniform(0.005, 0.015)]
+        chair_lifts.append({
+            "station": f"Remontée {i}",
+            "name": f"Remontée {i}",
+            "type": "chair_lift",
+            "coordinates": [bas, [(bas[0] + haut[0]) / 2, (bas[1] + haut[1]) / 2], haut],
+            "connection": []
+        })
+    slopes = []
+    for i in range(n_slopes):
+        roll = rng.random()
+        if roll < 0.3 and chair_lifts:
+            start = list(rng.choice(chair_lifts)["coordinates"][-1])
+        elif roll < 0.6 and slopes:
+            start = list(rng.choice(rng.choice(slopes)["coordinates"]))
+        else:
+            start = random_point()
+        slopes.append({
+            "name": f"Piste {i}",
+            "difficulty": rng.choice(["Vert", "Bleu", "Rouge", "Noir"]),
+            "coordinates": random_walk(rng, start, vertices),
+            "connection": []
+        })
+    return slopes, chair_lifts
+
+
+def connections_of(slopes, chair_lifts):
+    return [s["connection"] for s in slopes], [l["connection"] for l in chair_lifts]
+
+
+def run(scales, engines, tolerance, repeat, max_reference_scale, seed):
+    report = {"tolerance": tolerance, "runs": []}
+    for scale in scales:
+        slopes, chair_lifts = synthetic_station(scale, seed=seed)
+        expected = None
+        if "reference" in engines and scale <= max_reference_scale:
+            s, l = copy.deepcopy(slopes), copy.deepcopy(chair_lifts)
+            ENGINES["reference"](s, l, tolerance)
+            expected = connections_of(s, l)
+        for engine in engines:
+            if engine == "reference" and scale > max_reference_scale:
+                continue
+            timings = []
+            for _ in range(repeat):
+                s, l = copy.deepcopy(slopes), copy.deepcopy(chair_lifts)
+                start = time.perf_counter()
+                ENGINES[engine](s, l, tolerance)
+                timings.append(time.perf_counter() - start)
+            result = connections_of(s, l)
+            report["runs"].append({
+                "scale": scale,
+                "engine": engine,
+                "slopes": len(slopes),
+                "chair_lifts": len(chair_lifts),
+                "vertices": sum(len(s["coordinates"]) for s in slopes),
+                "connections": sum(len(c) for c in result[0]) + sum(len(c) for c in result[1]),
+                "best_s": round(min(timings), 6),
+                "matches_reference": None if expected is None else result == expected,
+            })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--engines", nargs="+", default=available_engines(), choices=list(ENGINES))
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-reference-scale", type=int, default=10,
+                        help="au-delà, le moteur de référence (quadratique) n'est pas exécuté")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    report = run(args.scales, args.engines, args.tolerance, args.repeat, args.max_reference_scale, args.seed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ski_common.firebase_auth import FirebaseAuthError, get_token_cache
+from ski_common.geometry import json_default
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 30
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+# Réponses pour lesquelles un nouvel essai a une chance d'aboutir
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+BEARER_PREFIX = "Bearer "
+
+
+def parse_retry_after(value):
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class DestinationWriter:
+    """Envoi des stations traitées vers la base de destination.
+
+    Les connexions HTTP sont réutilisées (keep-alive) via une session partagée,
+    au plus `max_in_flight` envois sont en cours à la fois, et les échecs
+    transitoires (réseau, 429, 5xx) sont retentés avec un délai exponentiel.
+    Chaque appel à post() tire un en-tête Idempotency-Key, repris par ses seuls
+    nouveaux essais : la destination peut ignorer un doublon quand un essai a
+    abouti sans que la réponse arrive, sans confondre deux envois distincts
+    d'un même contenu. Un
+    jeton Firebase refusé (401) est renouvelé, et l'envoi retenté une fois.
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, retries=DEFAULT_RETRIES,
+                 timeout=DEFAULT_TIMEOUT, backoff=DEFAULT_BACKOFF):
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="destination")
+
+    def _delay(self, attempt, retry_after=None):
+        delay = min(self.backoff * 2 ** attempt, MAX_BACKOFF)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, MAX_BACKOFF))
+        return delay
+
+    def _send(self, destination_url, body, headers):
+        """Un POST ; sur un 401, renouvelle le jeton Firebase et renvoie une seule fois.
+
+        `headers` est mis à jour avec le nouveau jeton pour les essais suivants.
+        """
+        response = self.session.post(destination_url, data=body, headers=headers, timeout=self.timeout)
+        authorization = headers.get("Authorization", "")
+        if response.status_code != 401 or not authorization.startswith(BEARER_PREFIX):
+            return response
+        token_cache = get_token_cache()
+        if token_cache is None:
+            return response
+        token_cache.invalidate(authorization[len(BEARER_PREFIX):])
+        try:
+            headers["Authorization"] = BEARER_PREFIX + token_cache.get_token()
+        except (FirebaseAuthError, requests.exceptions.RequestException) as e:
+            logger.error(f"Unable to renew Firebase token after 401 from {destination_url}: {str(e)}")
+            return response
+        logger.warning(f"Firebase token rejected by {destination_url}, retrying with a renewed token")
+        return self.session.post(destination_url, data=body, headers=headers, timeout=self.timeout)
+
+    def post(self, data, destination_url, headers=None):
+        """Envoi synchrone avec nouveaux essais ; renvoie {"status": "success"|"error", ...}."""
+        headers = dict(headers or {})
+        headers.setdefault("Content-Type", "application/json")
+        headers[IDEMPOTENCY_HEADER] = uuid.uuid4().hex
+        body = json.dumps(data, ensure_ascii=False, default=json_default).encode("utf-8")
+        last_error = None
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                response = self._send(destination_url, body, headers)
+                if response.status_code in RETRY_STATUSES:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    last_error = f"{response.status_code} Server Error for url: {destination_url}"
+                else:
+                    response.raise_for_status()
+                    logger.info(f"Data successfully posted to {destination_url}")
+                    return {
+                        "status": "success",
+                        "response": response.json() if response.content else None,
+                        "attempts": attempt + 1
+                    }
+            except requests.exceptions.HTTPError as e:
+                # Erreur 4xx : la requête elle-même est en cause, inutile de retenter
+                logger.error(f"Error posting to {destination_url}: {str(e)}")
+                return {"status": "error", "message": str(e), "attempts": attempt + 1}
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                last_error = str(e)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.error(f"Error posting to {destination_url}: {str(e)}")
+                return {"status": "error", "message": str(e), "attempts": attempt + 1}
+            if attempt < self.retries:
+                delay = self._delay(attempt, retry_after)
+                logger.warning(f"Posting to {destination_url} failed ({last_error}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        logger.error(f"Error posting to {destination_url}: {last_error}")
+        return {"status": "error", "message": last_error, "attempts": self.retries + 1}
+
+    def submit(self, data, destination_url, headers=None):
+        """Envoi en tâche de fond ; le Future renvoie le même dictionnaire que post()."""
+        return self.executor.submit(self.post, data, destination_url, headers)
+
+    def post_batch(self, items, destination_url, headers=None):
+        """Envoie plusieurs stations en une requête {"stations": [...]} ; un statut par station.
+
+        La destination peut répondre {"results": [...]} (une entrée par station,
+        dans l'ordre) ; sinon sa réponse est attribuée à toutes les stations du lot.
+        """
+        result = self.post({"stations": items}, destination_url, headers)
+        if result["status"] != "success":
+            return [dict(result) for _ in items]
+        response = result.get("response")
+        per_station = response.get("results") if isinstance(response, dict) else None
+        if isinstance(per_station, list) and len(per_station) == len(items):
+            return [dict(result, response=r) for r in per_station]
+        return [dict(result) for _ in items]
+
+    def submit_batch(self, items, destination_url, headers=None):
+        return self.executor.submit(self.post_batch, items, destination_url, headers)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer(max_in_flight=DEFAULT_MAX_IN_FLIGHT, retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT):
+    """Writer partagé par le processus (pool de connexions et threads d'envoi réutilisés)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = DestinationWriter(max_in_flight=max_in_flight, retries=retries, timeout=timeout)
+        return _writer
@@ -1,216 +1,730 @@
 import json
 import flask
-import requests
 from flask import Flask, request, jsonify
 import os
-from google.cloud import storage
 import logging
+import math
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain
+from concurrent.futures.process import BrokenProcessPool
+from destination_writer import get_writer
+from result_cache import ResultCache, result_key
+from routing import ROUTE_MODES, GraphCache, build_resort_graph, station_graph_key
+from spatial_store import DEFAULT_PISTE_DISTANCE_M, ELEMENT_KINDS, NEAREST_MAX_M, SpatialStore
+from stream_ingest import (NDJSON_CONTENT_TYPE, LateOptionsError, StreamError, iter_stream_stations,
+                           require_options_first, spool)
+from ski_common.connections import (DEFAULT_TOLERANCE, ENGINES, METRIC_ENGINES, build_station_elements,
+                                    process_station, sweep_tolerances)
+from ski_common.firebase_auth import FirebaseAuthError, get_token_cache
+from ski_common.wire_format import DEFAULT_MAX_DECOMPRESSED_BYTES, PayloadTooLarge, WireFormatError, decode_payload
 
 app = flask.Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 app = Flask(__name__)
 
+# Détection des connexions en parallèle : un processus par cœur par défaut
+PROCESS_WORKERS = int(os.getenv('PROCESS_WORKERS', os.cpu_count() or 1))
+PROCESS_PARALLEL = os.getenv('PROCESS_PARALLEL', '1') not in ('0', 'false', 'no')
+# Pas de fork d'un serveur multithreadé (verrous hérités dans un état incohérent)
+PROCESS_START_METHOD = os.getenv('PROCESS_START_METHOD', 'forkserver')
+_process_pool = None
+_process_pool_lock = threading.Lock()
+# Envoi vers la destination : envois simultanés, nouveaux essais, délai par requête
+DESTINATION_MAX_IN_FLIGHT = int(os.getenv('DESTINATION_MAX_IN_FLIGHT', 8))
+DESTINATION_RETRIES = int(os.getenv('DESTINATION_RETRIES', 3))
+DESTINATION_TIMEOUT = float(os.getenv('DESTINATION_TIMEOUT', 30))
+# Graphes de circulation déjà construits, par empreinte de station
+graph_cache = GraphCache(int(os.getenv('GRAPH_CACHE_SIZE', 64)))
+# Résultats déjà calculés et envoyés, par empreinte d'entrée (RESULT_CACHE_DB vide : désactivé)
+RESULT_CACHE_DB = os.getenv('RESULT_CACHE_DB', '/tmp/ski_processor_results.sqlite')
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+_result_cache = None
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None and RESULT_CACHE_DB:
+        _result_cache = ResultCache(RESULT_CACHE_DB, RESULT_CACHE_MAX_BYTES)
+    return _result_cache
+
+# Pistes et remontées traitées, indexées pour les requêtes spatiales (SPATIAL_DB vide : désactivé)
+SPATIAL_DB = os.getenv('SPATIAL_DB', '/tmp/ski_processor_spatial.sqlite')
+_spatial_store = None
+
+def get_spatial_store():
+    global _spatial_store
+    if _spatial_store is None and SPATIAL_DB:
+        _spatial_store = SpatialStore(SPATIAL_DB)
+    return _spatial_store
+
+MAX_NEAREST_LIMIT = 100
+# Taille maximale d'un corps de requête une fois décompressé (gzip/zstd), au-delà : 413
+MAX_BODY_BYTES = int(os.getenv('MAX_BODY_BYTES', DEFAULT_MAX_DECOMPRESSED_BYTES))
+
+def get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS,
+                                                mp_context=multiprocessing.get_context(PROCESS_START_METHOD))
+        return _process_pool
+
+def reset_process_pool():
+    """Abandonne un pool cassé (worker tué) pour qu'il soit recréé à la prochaine requête."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False)
+        _process_pool = None
+
 def get_firebase_token():
     try:
-        firebase_email = os.getenv('FIREBASE_EMAIL')
-        firebase_password = os.getenv('FIREBASE_PASSWORD')
-        firebase_api_key = os.getenv('FIREBASE_API_KEY')
-        if not all([firebase_email, firebase_password, firebase_api_key]):
+        token_cache = get_token_cache()
+        if token_cache is None:
             logger.error("Missing Firebase credentials in environment variables")
             return None
-        auth_url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={firebase_api_key}"
-        auth_data = {
-            "email": firebase_email,
-            "password": firebase_password,
-            "returnSecureToken": True
-        }
-        response = requests.post(auth_url, json=auth_data)
-        if response.status_code == 200:
-            token = response.json().get('idToken')
-            logger.info("Firebase authentication successful")
-            return token
-        else:
-            logger.error(f"Firebase authentication failed: {response.status_code} - {response.text}")
-            return None
+        return token_cache.get_token()
+    except FirebaseAuthError as e:
+        logger.error(str(e))
+        return None
     except Exception as e:
         logger.error(f"Error during Firebase authentication: {str(e)}")
         return None
 
-def trouver_connections(slopes, chair_lifts, tolerance=0.0006):
-    logger.info(f"Recherche de connexions - Pistes: {len(slopes)}, Remontées: {len(chair_lifts)}, Tolérance: {tolerance}")
-    def points_proches(p1, p2, tol=tolerance):
-        distance = abs(p1[0] - p2[0]) + abs(p1[1] - p2[1])
-        return distance < tol
-    for i, slope in enumerate(slopes):
-        if not slope["coordinates"]:
-            continue
-        debut_slope = slope["coordinates"][0]
-        fin_slope = slope["coordinates"][-1]
-        for j, autre in enumerate(slopes):
-            if i == j or not autre["coordinates"]:
-                continue
-            for coord_autre in autre["coordinates"]:
-                if points_proches(debut_slope, coord_autre) or points_proches(fin_slope, coord_autre):
-                    if not any(c["name"] == slope["name"] for c in autre["connection"]):
-                        autre["connection"].append({
-                            "name": slope["name"],
-                            "coordinates": coord_autre,
-                            "type": "slope"
-                        })
-                    break
-    for slope in slopes:
-        if not slope["coordinates"]:
-            continue
-        debut_slope = slope["coordinates"][0]
-        fin_slope = slope["coordinates"][-1]
-        for chair_lift in chair_lifts:
-            if not chair_lift["coordinates"]:
-                continue
-            bas = chair_lift["coordinates"][0]
-            haut = chair_lift["coordinates"][-1]
-            if points_proches(fin_slope, bas) or points_proches(debut_slope, haut):
-                if not any(c["name"] == slope["name"] for c in chair_lift["connection"]):
-                    chair_lift["connection"].append({
-                        "name": slope["name"],
-                        "coordinates": fin_slope if points_proches(fin_slope, bas) else debut_slope,
-                        "type": "slope"
-                    })
-    for i, lift in enumerate(chair_lifts):
-        if not lift["coordinates"]:
+def get_destination_writer():
+    return get_writer(DESTINATION_MAX_IN_FLIGHT, DESTINATION_RETRIES, DESTINATION_TIMEOUT)
+
+def post_to_destination(data, destination_url, headers=None):
+    return get_destination_writer().post(data, destination_url, headers)
+
+def write_processed_stations(processed, destination_url, headers, batch_size=1, cache=None):
+    """Envoie les stations au fil de leur traitement ; renvoie (results, errors) dans l'ordre d'entrée.
+
+    `processed` produit (station, données traitées, erreur, état du cache) comme
+    iter_cached_stations. Avec batch_size > 1, les stations sont regroupées par
+    requête vers la destination. Les stations déjà envoyées (cache) ne le sont pas à nouveau.
+    """
+    writer = get_destination_writer()
+    entries, batch = deque(), []  # entrée : [nom, erreur, future, position dans le lot, état du cache]
+    results, errors = [], []
+
+    def collect(entry):
+        station_name, error, future, position, cached = entry
+        if error:
+            errors.append({"station": station_name, "error": error})
+            return
+        try:
+            post_result = future.result()
+            if position is not None:
+                post_result = post_result[position]
+        except Exception as e:
+            post_result = {"status": "error", "message": str(e)}
+        if post_result["status"] == "success":
+            result = {"station": station_name, "status": "success", "response": post_result.get("response")}
+            if cached:
+                result["cache"] = cached["hit"] or "miss"
+                if cached["hit"] != "hit":
+                    cache.record_delivery(cached["key"], destination_url, post_result.get("response"))
+            results.append(result)
+        else:
+            errors.append({"station": station_name, "error": post_result["message"]})
+
+    def collect_ready():
+        # Les envois terminés sont relevés au fur et à mesure ; au-delà de deux fois
+        # max_in_flight envois en attente, on attend le plus ancien (mémoire bornée)
+        while entries and (entries[0][1] or (entries[0][2] is not None and (
+                entries[0][2].done() or len(entries) > 2 * writer.max_in_flight * max(batch_size, 1)))):
+            collect(entries.popleft())
+
+    def flush():
+        future = writer.submit_batch([data for _, data in batch], destination_url, headers)
+        for entry, _ in batch:
+            entry[2] = future
+        batch.clear()
+
+    for station, processed_data, error, cached in processed:
+        if error:
+            entries.append([station.get("station", "Unknown"), error, None, None, cached])
+            collect_ready()
             continue
-        haut = lift["coordinates"][-1]
-        for j, autre in enumerate(chair_lifts):
-            if i == j or not autre["coordinates"]:
+        if cached and cached["hit"] == "hit":
+            # Même entrée déjà envoyée à cette destination : rien à recalculer ni à renvoyer
+            delivered = Future()
+            delivered.set_result({"status": "success", "response": cached["response"]})
+            entries.append([station.get("station", "Unknown Station"), None, delivered, None, cached])
+        elif batch_size > 1:
+            entry = [processed_data["station"], None, None, len(batch), cached]
+            entries.append(entry)
+            batch.append((entry, processed_data))
+            if len(batch) >= batch_size:
+                flush()
+        else:
+            entries.append([processed_data["station"], None,
+                            writer.submit(processed_data, destination_url, headers), None, cached])
+        collect_ready()
+    if batch:
+        flush()
+    while entries:
+        collect(entries.popleft())
+    return results, errors
+
+def iter_processed_stations(json_data, tolerance, engine=None, tolerance_m=None, parallel=PROCESS_PARALLEL):
+    """Renvoie (station, données traitées, erreur) pour chaque station, dans l'ordre d'entrée.
+
+    `json_data` peut être une liste ou un itérable lu en flux : au plus deux
+    stations par worker sont en cours dans le pool à un instant donné.
+    """
+    if isinstance(json_data, list) and len(json_data) < 2:
+        parallel = False
+    if not parallel or PROCESS_WORKERS < 2:
+        for station in json_data:
+            try:
+                yield station, process_station(station, tolerance, engine, tolerance_m), None
+            except Exception as e:
+                yield station, None, str(e)
+        return
+    pool = get_process_pool()
+    window = deque()
+
+    def result(station, future):
+        try:
+            return station, future.result(), None
+        except BrokenProcessPool as e:
+            reset_process_pool()
+            return station, None, f"Process pool failure: {str(e)}"
+        except Exception as e:
+            return station, None, str(e)
+
+    for station in json_data:
+        try:
+            window.append((station, pool.submit(process_station, station, tolerance, engine, tolerance_m)))
+        except BrokenProcessPool:
+            reset_process_pool()
+            raise
+        if len(window) >= 2 * PROCESS_WORKERS:
+            yield result(*window.popleft())
+    while window:
+        yield result(*window.popleft())
+
+def iter_cached_stations(json_data, tolerance, engine=None, tolerance_m=None, parallel=PROCESS_PARALLEL,
+                         destination_url=None, cache=None, stats=None):
+    """iter_processed_stations précédé du cache de résultats ; ajoute l'état du cache de chaque station.
+
+    État : {"key", "hit"} avec hit = "hit" (déjà envoyée à cette destination),
+    "result" (résultat réutilisé, à envoyer) ou None (calculée). Sans cache : None.
+    """
+    if cache is None:
+        for station, processed_data, error in iter_processed_stations(json_data, tolerance, engine, tolerance_m,
+                                                                      parallel):
+            yield station, processed_data, error, None
+        return
+    order = deque()  # stations servies par le cache, ou clé d'une station partie au calcul
+
+    def to_compute():
+        for station in json_data:
+            key = result_key(station, tolerance, engine, tolerance_m)
+            delivery = cache.get_delivery(key, destination_url)
+            if delivery is not None:
+                stats["hits"] += 1
+                order.append((station, None, None, {"key": key, "hit": "hit", "response": delivery["response"]}))
                 continue
-            bas_autre = autre["coordinates"][0]
-            if points_proches(haut, bas_autre):
-                if not any(c["name"] == lift["name"] for c in autre["connection"]):
-                    autre["connection"].append({
-                        "name": lift["name"],
-                        "coordinates": haut,
-                        "type": "chair_lift"
-                    })
-    for lift in chair_lifts:
-        if not lift["coordinates"]:
-            continue
-        haut = lift["coordinates"][-1]
-        for slope in slopes:
-            if not slope["coordinates"]:
+            result = cache.get_result(key)
+            if result is not None:
+                stats["result_hits"] += 1
+                order.append((station, result, None, {"key": key, "hit": "result"}))
                 continue
-            debut = slope["coordinates"][0]
-            if points_proches(haut, debut):
-                if not any(c["name"] == lift["name"] for c in slope["connection"]):
-                    slope["connection"].append({
-                        "name": lift["name"],
-                        "coordinates": haut,
-                        "type": "chair_lift"
-                    })
-    return slopes, chair_lifts
+            stats["misses"] += 1
+            order.append(key)
+            yield station
 
-def post_to_destination(data, destination_url, headers=None):
+    for station, processed_data, error in iter_processed_stations(to_compute(), tolerance, engine, tolerance_m,
+                                                                  parallel):
+        while not isinstance(order[0], str):
+            yield order.popleft()
+        key = order.popleft()
+        if processed_data is not None:
+            cache.put_result(key, processed_data)
+        yield station, processed_data, error, {"key": key, "hit": None}
+    while order:
+        yield order.popleft()
+
+def record_spatial(processed, store):
+    """Enregistre chaque station traitée dans le store spatial au passage, sans changer le flux.
+
+    Les stations y sont identifiées par leur nom : une station sans nom n'est
+    pas indexée (pas de "Unknown Station" commun), et dans une même requête une
+    seconde station du même nom n'écrase pas la première.
+    """
+    indexed = set()
+    for station, processed_data, error, cached in processed:
+        if processed_data is not None and store is not None:
+            name = station.get("station") if isinstance(station, dict) else None
+            try:
+                if not name:
+                    raise ValueError("Station without a 'station' name is not indexed")
+                if name in indexed:
+                    raise ValueError(f"Duplicate station name in the request: {name}")
+                store.put_station(processed_data, cached["key"] if cached else None)
+                indexed.add(name)
+            except Exception as e:
+                logger.error(f"Spatial store update failed for {name}: {str(e)}")
+        yield station, processed_data, error, cached
+
+def sweep_ski_data(json_data, tolerances, metric=False, errors=None):
+    """Mode balayage de /process : statistiques par tolérance, sans envoi vers la destination."""
+    stations = []
+    errors = [] if errors is None else errors
+    totals = [{"tolerance": t, "connections": 0} for t in tolerances]
+    for station in json_data:
+        try:
+            slopes, chair_lifts = build_station_elements(station)
+            sweep = sweep_tolerances(slopes, chair_lifts, tolerances, metric)
+            for total, entry in zip(totals, sweep):
+                total["connections"] += entry["connections"]
+            stations.append({"station": station.get("station", "Unknown Station"), "sweep": sweep})
+        except Exception as e:
+            # Un élément de "data" qui n'est pas un objet reste une erreur de station, pas un 500
+            name = station.get("station") if isinstance(station, dict) else None
+            errors.append({"station": name, "error": str(e)})
+    return jsonify({
+        "status": "completed",
+        "mode": "sweep",
+        "unit": "m" if metric else "deg",
+        "totals": totals,
+        "stations": stations,
+        "errors": errors if errors else None
+    }), 200 if not errors else 207
+
+def query_options(args):
+    """Options de /process passées dans l'URL (utile pour un corps NDJSON ou un tableau de stations)."""
+    options = {}
+    for key in ('destination_url', 'engine'):
+        if key in args:
+            options[key] = args[key]
+    for key in ('tolerance', 'tolerance_m'):
+        if key in args:
+            options[key] = args.get(key, type=float)
+    if 'batch_size' in args:
+        options['batch_size'] = args.get('batch_size', type=int)
+    for key in ('parallel', 'cache'):
+        if key in args:
+            options[key] = args[key].lower() not in ('0', 'false', 'no')
+    return options
+
+def guard_stream(stations, errors):
+    """Arrête proprement la lecture sur un flux invalide, en consignant l'erreur."""
+    try:
+        yield from stations
+    except PayloadTooLarge:
+        raise
+    except (StreamError, WireFormatError, UnicodeDecodeError, OSError) as e:
+        errors.append({"station": None, "error": f"Invalid request body: {str(e)}"})
+
+def stop_on_abort(stations, aborted):
+    """Relaie les stations ; un flux interrompu (trop gros, options tardives) est consigné dans `aborted`.
+
+    Les stations déjà relayées ont pu être envoyées à la destination : la
+    réponse doit les lister, pas seulement renvoyer un 400/413.
+    """
     try:
-        if headers is None:
-            headers = {'Content-Type': 'application/json'}
-        response = requests.post(destination_url, json=data, headers=headers, timeout=30)
-        response.raise_for_status()
-        logger.info(f"Data successfully posted to {destination_url}")
-        return {"status": "success", "response": response.json() if response.content else None}
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error posting to {destination_url}: {str(e)}")
-        return {"status": "error", "message": str(e)}
+        yield from stations
+    except (PayloadTooLarge, LateOptionsError) as e:
+        aborted.append(e)
+
+def abort_status(error):
+    return 413 if isinstance(error, PayloadTooLarge) else 400
+
+def check_process_options(payload):
+    """Message d'erreur si les options d'envoi de /process sont invalides, sinon None."""
+    engine = payload.get('engine')
+    batch_size = payload.get('batch_size', 1)
+    if not payload.get('destination_url'):
+        return "No 'destination_url' provided"
+    if engine is not None and engine not in ENGINES:
+        return f"Unknown 'engine', expected one of {list(ENGINES)}"
+    if payload.get('tolerance_m') is not None and engine is not None and engine not in METRIC_ENGINES:
+        return f"'tolerance_m' requires one of {list(METRIC_ENGINES)}"
+    if not isinstance(batch_size, int) or isinstance(batch_size, bool) or batch_size < 1:
+        return "'batch_size' must be a positive integer"
+    return None
+
+def sweep_options(payload):
+    """(tolérances, metric, message d'erreur) du mode balayage ; tolérances à None hors balayage.
+
+    {"tolerances": [...]} est en degrés, {"tolerances_m": [...]} en mètres : la
+    clé détermine l'unité, et les deux ensemble sont refusés.
+    """
+    metric = payload.get('tolerances_m') is not None
+    if metric and payload.get('tolerances') is not None:
+        return None, metric, "Provide either 'tolerances' or 'tolerances_m', not both"
+    key = 'tolerances_m' if metric else 'tolerances'
+    tolerances = payload.get(key)
+    if tolerances is None:
+        return None, metric, None
+    if not isinstance(tolerances, list) or not tolerances or not all(
+            isinstance(t, (int, float)) and not isinstance(t, bool) and math.isfinite(t) and t > 0
+            for t in tolerances):
+        return None, metric, f"'{key}' must be a non-empty list of positive numbers"
+    return tolerances, metric, None
+
+def is_stream_request():
+    content_type = (request.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+    return content_type == NDJSON_CONTENT_TYPE or request.args.get('stream', '').lower() in ('1', 'true', 'yes')
 
 @app.route('/process', methods=['POST'])
 def process_ski_data():
     try:
-        if not request.json:
-            return jsonify({"error": "No JSON data provided"}), 400
-        json_data = request.json.get('data')
-        destination_url = request.json.get('destination_url')
-        headers = request.json.get('headers', {})
-        tolerance = request.json.get('tolerance', 0.0006)
-        if not json_data:
-            return jsonify({"error": "No 'data' field in JSON"}), 400
-        if not destination_url:
-            return jsonify({"error": "No 'destination_url' provided"}), 400
+        errors, aborted = [], []
+        if is_stream_request():
+            # Lecture en flux : une station à la fois, les options avant la première
+            payload = query_options(request.args)
+            try:
+                stations = guard_stream(iter_stream_stations(request.stream, request.headers, payload,
+                                                             MAX_BODY_BYTES), errors)
+            except WireFormatError as e:
+                return jsonify({"error": str(e)}), 415
+            first = next(stations, None)
+            if first is None:
+                if errors:
+                    return jsonify({"error": errors[0]["error"]}), 400
+                return jsonify({"error": "No 'data' field in JSON"}), 400
+            json_data = chain([first], stations)
+            if not any(key in payload for key in ('destination_url', 'tolerances', 'tolerances_m')):
+                # Options placées après "data" : les stations sont mises de côté jusqu'à la fin du flux
+                json_data = spool(json_data)
+            else:
+                # Stations traitées au fil de l'eau : une option arrivée ensuite, ou un corps
+                # trop gros, arrête la lecture ; les stations déjà envoyées restent listées
+                json_data = stop_on_abort(require_options_first(json_data, payload), aborted)
+        else:
+            # Accepte le JSON classique ou le format compact (polyligne, msgpack, gzip/zstd)
+            try:
+                payload = decode_payload(request.get_data(), request.headers, MAX_BODY_BYTES)
+            except PayloadTooLarge as e:
+                return jsonify({"error": str(e)}), 413
+            except WireFormatError as e:
+                return jsonify({"error": str(e)}), 415
+            except (ValueError, OSError) as e:
+                return jsonify({"error": f"Invalid request body: {str(e)}"}), 400
+            if not payload or not isinstance(payload, dict):
+                return jsonify({"error": "No JSON data provided"}), 400
+            json_data = payload.get('data')
+            if not json_data:
+                return jsonify({"error": "No 'data' field in JSON"}), 400
+        destination_url = payload.get('destination_url')
+        headers = payload.get('headers', {})
+        tolerance = payload.get('tolerance', 0.0006)
+        engine = payload.get('engine')
+        tolerance_m = payload.get('tolerance_m')
+        parallel = payload.get('parallel', PROCESS_PARALLEL)
+        batch_size = payload.get('batch_size', 1)
+        use_cache = payload.get('cache', True)
+        # Balayage de tolérances : {"tolerances": [...]} (degrés) ou {"tolerances_m": [...]} (mètres)
+        sweep, metric, sweep_error = sweep_options(payload)
+        if sweep_error:
+            return jsonify({"error": sweep_error}), 400
+        if sweep is not None:
+            response = sweep_ski_data(json_data, sweep, metric=metric, errors=errors)
+            if aborted:
+                # Rien n'a été envoyé : un balayage sur un flux tronqué est simplement refusé
+                return jsonify({"error": str(aborted[0])}), abort_status(aborted[0])
+            return response
+        options_error = check_process_options(payload)
+        if options_error:
+            return jsonify({"error": options_error}), 400
         firebase_token = get_firebase_token()
         if not firebase_token:
             return jsonify({"status": "error", "message": "Failed to authenticate with Firebase"}), 401
         headers['Authorization'] = f'Bearer {firebase_token}'
-        results, errors = [], []
-        for station in json_data:
-            try:
-                station_name = station.get("station", "Unknown Station")
-                slopes = [
-                    {
-                        "name": p.get("name", "Unnamed"),
-                        "difficulty": p.get("difficulty", "unknown"),
-                        "coordinates": [[pt[1], pt[0]] for pt in p.get("coords", [])],
-                        "connection": []
-                    }
-                    for p in station.get("pistes", [])
-                ]
-                chair_lifts = [
-                    {
-                        "station": l.get("name", "Unnamed"),
-                        "type": l.get("type", "unknown"),
-                        "coordinates": [[pt[1], pt[0]] for pt in l.get("coords", [])],
-                        "connection": []
-                    }
-                    for l in station.get("remontees", [])
-                    if l.get("type") not in ["magic_carpet", ""]
-                ]
-                slopes, chair_lifts = trouver_connections(slopes, chair_lifts, tolerance)
-                processed_data = {
-                    "station": station_name,
-                    "slopes": slopes,
-                    "chair_lifts": chair_lifts
-                }
-                post_result = post_to_destination(processed_data, destination_url, headers)
-                if post_result["status"] == "success":
-                    results.append({"station": station_name, "status": "success", "response": post_result.get("response")})
-                else:
-                    errors.append({"station": station_name, "error": post_result["message"]})
-            except Exception as e:
-                errors.append({"station": station.get("station", "Unknown"), "error": str(e)})
-        return jsonify({
-            "status": "completed",
+        cache = get_result_cache() if use_cache else None
+        cache_stats = {"hits": 0, "result_hits": 0, "misses": 0}
+        processed = iter_cached_stations(json_data, tolerance, engine, tolerance_m, parallel,
+                                         destination_url, cache, cache_stats)
+        processed = record_spatial(processed, get_spatial_store())
+        results, write_errors = write_processed_stations(processed, destination_url, headers, batch_size, cache)
+        errors = write_errors + errors
+        if aborted:
+            errors.append({"station": None, "error": str(aborted[0])})
+        response = {
+            "status": "aborted" if aborted else "completed",
             "successful_stations": len(results),
             "failed_stations": len(errors),
             "results": results,
             "errors": errors if errors else None
-        }), 200 if not errors else 207
+        }
+        if cache is not None:
+            response["cache"] = cache_stats
+        if aborted and not results:
+            return jsonify(dict(response, error=str(aborted[0]))), abort_status(aborted[0])
+        return jsonify(response), 200 if not errors else 207
+    except PayloadTooLarge as e:
+        # Limite atteinte avant tout envoi (première station, ou flux mis de côté)
+        return jsonify({"error": str(e)}), 413
     except Exception as e:
         logger.error(f"Error in process_ski_data: {str(e)}")
         return jsonify({"status": "error", "message": f"Internal server error: {str(e)}"}), 500
 
+def station_graph(station, tolerance=DEFAULT_TOLERANCE):
+    """Graphe de circulation d'une station, construit une seule fois par contenu."""
+    key = station_graph_key(station, tolerance)
+
+    def build():
+        slopes, chair_lifts = build_station_elements(station)
+        return {"station": station.get("station", "Unknown Station"),
+                "graph": build_resort_graph(slopes, chair_lifts, tolerance)}
+
+    return key, graph_cache.get_or_build(key, build)
+
+def graph_tolerance(payload):
+    """Tolérance de construction des graphes ("tolerance", en degrés) ; ValueError si invalide."""
+    tolerance = payload.get('tolerance', DEFAULT_TOLERANCE)
+    if (isinstance(tolerance, bool) or not isinstance(tolerance, (int, float))
+            or not math.isfinite(tolerance) or tolerance <= 0):
+        raise ValueError("'tolerance' must be a positive number")
+    return tolerance
+
+def graph_from_payload(payload):
+    """(graph_id, entrée du cache) désignés par "graph_id" ou par les données brutes d'une "station"."""
+    if payload.get("graph_id"):
+        entry = graph_cache.get(payload["graph_id"])
+        if entry is None:
+            raise LookupError("Unknown or expired 'graph_id', send the 'station' data again")
+        return payload["graph_id"], entry
+    if isinstance(payload.get("station"), dict):
+        return station_graph(payload["station"], graph_tolerance(payload))
+    raise ValueError("Provide a 'graph_id' or the 'station' data")
+
+def read_graph_request():
+    try:
+        payload = decode_payload(request.get_data(), request.headers, MAX_BODY_BYTES)
+    except PayloadTooLarge as e:
+        return None, (jsonify({"error": str(e)}), 413)
+    except WireFormatError as e:
+        return None, (jsonify({"error": str(e)}), 415)
+    except (ValueError, OSError) as e:
+        return None, (jsonify({"error": f"Invalid request body: {str(e)}"}), 400)
+    if not payload or not isinstance(payload, dict):
+        return None, (jsonify({"error": "No JSON data provided"}), 400)
+    return payload, None
+
+@app.route('/graph', methods=['POST'])
+def build_graphs():
+    """Construit (ou retrouve) le graphe de chaque station de "data" ; renvoie les graph_id."""
+    payload, error = read_graph_request()
+    if error:
+        return error
+    json_data = payload.get('data')
+    if not json_data:
+        return jsonify({"error": "No 'data' field in JSON"}), 400
+    try:
+        tolerance = graph_tolerance(payload)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    graphs, errors = [], []
+    for station in json_data:
+        try:
+            graph_id, entry = station_graph(station, tolerance)
+            graphs.append(dict(entry["graph"].summary(), station=entry["station"], graph_id=graph_id))
+        except Exception as e:
+            name = station.get("station") if isinstance(station, dict) else None
+            errors.append({"station": name, "error": str(e)})
+    return jsonify({
+        "status": "completed",
+        "graphs": graphs,
+        "cache": graph_cache.stats(),
+        "errors": errors if errors else None
+    }), 200 if not errors else 207
+
+@app.route('/reachable', methods=['POST'])
+def reachable():
+    """Pistes et remontées atteignables depuis "from" (nom ou id de nœud)."""
+    payload, error = read_graph_request()
+    if error:
+        return error
+    start = time.perf_counter()
+    try:
+        graph_id, entry = graph_from_payload(payload)
+        graph = entry["graph"]
+        nodes = graph.reachable(graph.resolve(payload.get("from")))
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "graph_id": graph_id,
+        "station": entry["station"],
+        "from": payload.get("from"),
+        "count": len(nodes),
+        "reachable": [graph.node(i) for i in nodes],
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)
+    })
+
+@app.route('/route', methods=['POST'])
+def route():
+    """Itinéraire de "from" à "to" : mode "shortest" (mètres) ou "easiest" (difficulté max. la plus basse)."""
+    payload, error = read_graph_request()
+    if error:
+        return error
+    mode = payload.get("mode", "shortest")
+    if mode not in ROUTE_MODES:
+        return jsonify({"error": f"Unknown 'mode', expected one of {list(ROUTE_MODES)}"}), 400
+    start = time.perf_counter()
+    try:
+        graph_id, entry = graph_from_payload(payload)
+        graph = entry["graph"]
+        path = graph.route(graph.resolve(payload.get("from")), graph.resolve(payload.get("to")), mode)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result = {
+        "graph_id": graph_id,
+        "station": entry["station"],
+        "mode": mode,
+        "from": payload.get("from"),
+        "to": payload.get("to"),
+        "found": path is not None,
+        "path": [graph.node(i) for i in path] if path else None,
+    }
+    if path:
+        result["length_m"] = round(sum(graph.lengths[i] for i in path), 1)
+        hardest = max(path, key=lambda i: graph.ranks[i])
+        result["max_difficulty"] = graph.difficulties[hardest] if graph.kinds[hardest] == "slope" else None
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return jsonify(result)
+
+def spatial_args(names, optional=()):
+    """Paramètres numériques d'une requête spatiale : (valeurs, réponse d'erreur ou None)."""
+    values = {}
+    for name in names + tuple(optional):
+        raw = request.args.get(name)
+        if raw is None:
+            if name in optional:
+                continue
+            return None, (jsonify({"error": f"Missing '{name}' query parameter"}), 400)
+        try:
+            values[name] = float(raw)
+        except ValueError:
+            return None, (jsonify({"error": f"'{name}' must be a number"}), 400)
+        if not math.isfinite(values[name]):
+            return None, (jsonify({"error": f"'{name}' must be a number"}), 400)
+        bound = 90 if name.endswith("lat") else 180 if name.endswith("lon") else None
+        if bound is not None and not -bound <= values[name] <= bound:
+            return None, (jsonify({"error": f"'{name}' must be between {-bound} and {bound}"}), 400)
+        if name == "max_distance_m" and values[name] <= 0:
+            return None, (jsonify({"error": "'max_distance_m' must be positive"}), 400)
+    store = get_spatial_store()
+    if store is None:
+        return None, (jsonify({"error": "Spatial store disabled (SPATIAL_DB is empty)"}), 503)
+    return values, None
+
+def spatial_kind():
+    kind = request.args.get("kind")
+    if kind is not None and kind not in ELEMENT_KINDS:
+        raise ValueError(f"Unknown 'kind', expected one of {list(ELEMENT_KINDS)}")
+    return kind
+
+@app.route('/nearest', methods=['GET'])
+def nearest():
+    """Éléments les plus proches d'une position : ?lat=&lon=[&kind=slope|lift][&station=][&limit=]."""
+    values, error = spatial_args(("lat", "lon"), optional=("max_distance_m",))
+    if error:
+        return error
+    start = time.perf_counter()
+    try:
+        limit = request.args.get("limit", 1, type=int)
+        if not 1 <= limit <= MAX_NEAREST_LIMIT:
+            raise ValueError(f"'limit' must be between 1 and {MAX_NEAREST_LIMIT}")
+        elements = get_spatial_store().nearest(values["lat"], values["lon"], spatial_kind(),
+                                               request.args.get("station"), limit,
+                                               values.get("max_distance_m", NEAREST_MAX_M))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "lat": values["lat"],
+        "lon": values["lon"],
+        "elements": elements,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)
+    })
+
+@app.route('/bbox', methods=['GET'])
+def bbox():
+    """Pistes et remontées traversant un rectangle : ?min_lat=&min_lon=&max_lat=&max_lon=[&kind=][&geometry=1]."""
+    values, error = spatial_args(("min_lat", "min_lon", "max_lat", "max_lon"))
+    if error:
+        return error
+    if values["min_lat"] > values["max_lat"] or values["min_lon"] > values["max_lon"]:
+        return jsonify({"error": "Empty bounding box: min values must not exceed max values"}), 400
+    start = time.perf_counter()
+    try:
+        elements = get_spatial_store().in_bbox(
+            values["min_lat"], values["min_lon"], values["max_lat"], values["max_lon"], spatial_kind(),
+            request.args.get("station"),
+            geometry=request.args.get("geometry", "").lower() in ("1", "true", "yes")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "count": len(elements),
+        "elements": elements,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)
+    })
+
+@app.route('/which-piste', methods=['GET'])
+def which_piste():
+    """Piste(s) sous une position GPS : ?lat=&lon=[&max_distance_m=30][&station=]."""
+    values, error = spatial_args(("lat", "lon"), optional=("max_distance_m",))
+    if error:
+        return error
+    start = time.perf_counter()
+    pistes = get_spatial_store().which_piste(values["lat"], values["lon"],
+                                             values.get("max_distance_m", DEFAULT_PISTE_DISTANCE_M),
+                                             request.args.get("station"))
+    return jsonify({
+        "lat": values["lat"],
+        "lon": values["lon"],
+        "piste": pistes[0] if pistes else None,
+        "candidates": pistes,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)
+    })
+
+@app.route('/spatial', methods=['GET'])
+def spatial_stats():
+    store = get_spatial_store()
+    if store is None:
+        return jsonify({"error": "Spatial store disabled (SPATIAL_DB is empty)"}), 503
+    return jsonify(store.stats())
 
 
 # Point d'entrée pour Google Cloud Functions
 def main(request):
     """Entry point for Google Cloud Functions"""
     with app.test_request_context(path=request.path, method=request.method, 
-                                  headers=request.headers, data=request.data):
+                                  headers=request.headers, data=request.data,
+                                  query_string=request.query_string):
         return app.full_dispatch_request()
 
 
 if __name__ == '__main__':
     # Pour Cloud Run, utiliser le port fourni par la variable d'environnement
     port = int(os.environ.get('PORT', 8080))
-    # Utiliser gunicorn pour la production
-    import subprocess
-    import sys
-    
+    # SERVE_MODE=asgi : uvicorn sur asgi:app (/process asynchrone), sinon gunicorn sur main:app
+    serve_mode = os.environ.get('SERVE_MODE', 'wsgi')
+
     # En mode debug local
     if os.environ.get('GAE_ENV', '').startswith('standard') or os.environ.get('PORT'):
-        # Production - utiliser gunicorn
-        subprocess.run([
-            sys.executable, '-m', 'gunicorn', 
-            '--bind', f'0.0.0.0:{port}',
-            '--workers', '1',
-            '--timeout', '0',
-            'main:app'
-        ])
+        import sys
+        # Production : le serveur remplace ce processus (exec) au lieu d'en lancer un second
+        if serve_mode == 'asgi':
+            command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '0.0.0.0', '--port', str(port)]
+        else:
+            command = [sys.executable, '-m', 'gunicorn', '--bind', f'0.0.0.0:{port}',
+                       '--workers', '1', '--timeout', '0', 'main:app']
+        os.execv(sys.executable, command)
     else:
         # Développement local
-        app.run(debug=True, host='0.0.0.0', port=port)
\ No newline at end of file
+        app.run(debug=True, host='0.0.0.0', port=port)
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from ski_common.geometry import json_default
+
+
+def result_key(station, tolerance, engine=None, tolerance_m=None):
+    """Empreinte de l'entrée normalisée d'une station et des paramètres de détection."""
+    normalized = json.dumps(
+        {"station": station, "tolerance": tolerance, "engine": engine, "tolerance_m": tolerance_m},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=json_default
+    )
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Résultats de trouver_connections par empreinte d'entrée, dans un fichier SQLite local.
+
+    Deux niveaux : le résultat calculé (réutilisable pour n'importe quelle
+    destination) et les envois confirmés par destination. Une station déjà
+    envoyée telle quelle à la même destination n'est ni recalculée ni renvoyée.
+    Au-delà de `max_bytes`, les résultats les moins récemment utilisés sont supprimés.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " station TEXT NOT NULL,"
+                " result BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);"
+                "CREATE TABLE IF NOT EXISTS deliveries ("
+                " key TEXT NOT NULL,"
+                " destination_url TEXT NOT NULL,"
+                " response TEXT,"
+                " delivered_at REAL NOT NULL,"
+                " PRIMARY KEY (key, destination_url));"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_delivery(self, key, destination_url):
+        """Réponse de la destination au précédent envoi de ce résultat, ou None."""
+        with self.lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT d.response FROM deliveries d JOIN results r ON r.key = d.key"
+                " WHERE d.key = ? AND d.destination_url = ?", (key, destination_url)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return {"response": json.loads(row[0]) if row[0] else None}
+
+    def get_result(self, key):
+        with self.lock, self._connect() as conn:
+            row = conn.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put_result(self, key, result):
+        blob = zlib.compress(json.dumps(result, ensure_ascii=False, separators=(",", ":"), default=json_default).encode("utf-8"))
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO results (key, station, result, size, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET last_used = excluded.last_used",
+                (key, result.get("station", ""), blob, len(blob), now, now)
+            )
+            self._evict(conn)
+
+    def record_delivery(self, key, destination_url, response=None):
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO deliveries (key, destination_url, response, delivered_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(key, destination_url) DO UPDATE SET response = excluded.response,"
+                " delivered_at = excluded.delivered_at",
+                (key, destination_url, json.dumps(response) if response is not None else None, time.time())
+            )
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM results WHERE key = ?", evicted)
+        conn.executemany("DELETE FROM deliveries WHERE key = ?", evicted)
+
+    def stats(self):
+        with self.lock, self._connect() as conn:
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            deliveries = conn.execute("SELECT COUNT(*) FROM deliveries").fetchone()[0]
+        return {"path": self.path, "entries": entries, "bytes": total,
+                "deliveries": deliveries, "max_bytes": self.max_bytes}
@@ -0,0 +1,276 @@
+import hashlib
+import heapq
+import json
+import math
+import threading
+from array import array
+from collections import OrderedDict, deque
+
+from ski_common.connections import (DEFAULT_TOLERANCE, EARTH_RADIUS_M, build_grid, element_name, grid_candidates,
+                                    manhattan)
+from ski_common.geometry import json_default
+
+# Rang de difficulté : libellés ski-data (Vert/Bleu/Rouge/Noir) et valeurs OSM brutes
+DIFFICULTY_RANKS = {
+    "vert": 0, "novice": 0,
+    "bleu": 1, "easy": 1,
+    "rouge": 2, "intermediate": 2,
+    "noir": 3, "advanced": 3,
+    "expert": 4,
+    "freeride": 5,
+}
+UNKNOWN_DIFFICULTY_RANK = 3
+ROUTE_MODES = ("shortest", "easiest")
+DEFAULT_GRAPH_CACHE_SIZE = 64
+
+
+class UnknownNode(LookupError):
+    pass
+
+
+def difficulty_rank(label):
+    return DIFFICULTY_RANKS.get(str(label or "").strip().lower(), UNKNOWN_DIFFICULTY_RANK)
+
+
+def polyline_length(coords):
+    """Longueur en mètres d'une suite de points [lon, lat] (approximation équirectangulaire)."""
+    length = 0.0
+    for (lon1, lat1), (lon2, lat2) in zip(coords, coords[1:]):
+        kx = math.cos(math.radians((lat1 + lat2) / 2))
+        length += math.hypot((lon2 - lon1) * kx, lat2 - lat1)
+    return length * EARTH_RADIUS_M * math.pi / 180
+
+
+class ResortGraph:
+    """Graphe orienté d'une station : un nœud par piste puis par remontée.
+
+    Les remontées se parcourent du bas vers le haut, les pistes du haut vers le
+    bas. Les arcs sont stockés en listes d'adjacence compactes (offsets/targets) :
+    les successeurs du nœud i sont targets[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, names, kinds, difficulties, lengths, edges):
+        self.names = names
+        self.kinds = kinds
+        self.difficulties = difficulties
+        self.ranks = array("b", (difficulty_rank(d) if k == "slope" else 0 for d, k in zip(difficulties, kinds)))
+        self.lengths = array("d", lengths)
+        self.offsets = array("i", [0] * (len(names) + 1))
+        for source, _ in edges:
+            self.offsets[source + 1] += 1
+        for i in range(len(names)):
+            self.offsets[i + 1] += self.offsets[i]
+        self.targets = array("i", [0] * len(edges))
+        fill = array("i", self.offsets[:-1])
+        for source, target in sorted(edges):
+            self.targets[fill[source]] = target
+            fill[source] += 1
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def successors(self, node):
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def resolve(self, ref):
+        """Identifiants des nœuds désignés par un entier (id) ou un nom (toutes les homonymes)."""
+        if isinstance(ref, int) and not isinstance(ref, bool):
+            if not 0 <= ref < len(self):
+                raise UnknownNode(f"Unknown node id: {ref}")
+            return [ref]
+        ids = [i for i, name in enumerate(self.names) if name == ref]
+        if not ids:
+            raise UnknownNode(f"Unknown node: {ref}")
+        return ids
+
+    def node(self, i):
+        return {
+            "id": i,
+            "name": self.names[i],
+            "type": self.kinds[i],
+            "difficulty": self.difficulties[i],
+            "length_m": round(self.lengths[i], 1),
+        }
+
+    def reachable(self, sources):
+        seen = set(sources)
+        queue = deque(sources)
+        while queue:
+            for target in self.successors(queue.popleft()):
+                if target not in seen:
+                    seen.add(target)
+                    queue.append(target)
+        return sorted(seen)
+
+    def route(self, sources, targets, mode="shortest"):
+        """Plus court chemin (en mètres) ou plus facile (difficulté max. minimale, puis longueur).
+
+        Le coût d'un nœud est sa longueur, départ et arrivée compris. Le mode
+        "easiest" cherche d'abord la difficulté maximale la plus basse qui permet
+        d'arriver (bottleneck_rank), puis le plus court chemin parmi les nœuds
+        de difficulté inférieure ou égale. Renvoie la liste des nœuds, ou None
+        si l'arrivée n'est pas atteignable.
+        """
+        if mode not in ROUTE_MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        max_rank = None
+        if mode == "easiest":
+            max_rank = self.bottleneck_rank(sources, targets)
+            if max_rank is None:
+                return None
+        return self.shortest_path(sources, targets, max_rank)
+
+    def bottleneck_rank(self, sources, targets):
+        """Plus petite difficulté maximale d'un chemin des départs vers une arrivée (Dijkstra minimax)."""
+        targets = set(targets)
+        best, heap = {}, []
+        for source in sources:
+            if self.ranks[source] < best.get(source, math.inf):
+                best[source] = self.ranks[source]
+                heapq.heappush(heap, (best[source], source))
+        while heap:
+            rank, node = heapq.heappop(heap)
+            if rank > best[node]:
+                continue
+            if node in targets:
+                return rank
+            for target in self.successors(node):
+                new_rank = max(rank, self.ranks[target])
+                if new_rank < best.get(target, math.inf):
+                    best[target] = new_rank
+                    heapq.heappush(heap, (new_rank, target))
+        return None
+
+    def shortest_path(self, sources, targets, max_rank=None):
+        """Plus court chemin en mètres, limité aux nœuds de rang <= max_rank s'il est donné."""
+        targets = set(targets)
+        best, previous, heap = {}, {}, []
+        for source in sources:
+            if max_rank is not None and self.ranks[source] > max_rank:
+                continue
+            if self.lengths[source] < best.get(source, math.inf):
+                best[source] = self.lengths[source]
+                heapq.heappush(heap, (best[source], source))
+        while heap:
+            length, node = heapq.heappop(heap)
+            if length > best[node]:
+                continue
+            if node in targets:
+                path = [node]
+                while path[-1] in previous:
+                    path.append(previous[path[-1]])
+                return path[::-1]
+            for target in self.successors(node):
+                if max_rank is not None and self.ranks[target] > max_rank:
+                    continue
+                new_length = length + self.lengths[target]
+                if new_length < best.get(target, math.inf):
+                    best[target] = new_length
+                    previous[target] = node
+                    heapq.heappush(heap, (new_length, target))
+        return None
+
+    def summary(self):
+        return {
+            "nodes": len(self),
+            "slopes": self.kinds.count("slope"),
+            "chair_lifts": self.kinds.count("lift"),
+            "edges": self.edge_count,
+        }
+
+
+def build_resort_graph(slopes, chair_lifts, tolerance=DEFAULT_TOLERANCE):
+    """Graphe orienté à partir des pistes et remontées de build_station_elements ([lon, lat]).
+
+    Deux éléments sont reliés quand leurs points sont à distance de Manhattan
+    < tolerance, comme dans trouver_connections :
+      remontée -> piste    le haut de la remontée touche la piste
+      piste -> remontée    la piste passe par le bas de la remontée
+      piste A -> piste B   la fin de A touche B, ou le début de B touche A
+      remontée -> remontée le haut de l'une est au bas de l'autre
+    """
+    n_slopes = len(slopes)
+    names = [element_name(s) for s in slopes] + [element_name(l) for l in chair_lifts]
+    kinds = ["slope"] * n_slopes + ["lift"] * len(chair_lifts)
+    difficulties = [s.get("difficulty") for s in slopes] + [l.get("type") for l in chair_lifts]
+    lengths = [polyline_length(e["coordinates"]) for e in slopes + chair_lifts]
+    edges = set()
+    if tolerance > 0:
+        cell = tolerance * (1 + 1e-6)
+        vertex_grid = build_grid(
+            ((coord, j) for j, slope in enumerate(slopes) for coord in slope["coordinates"]), cell
+        )
+
+        def slopes_near(point):
+            return {j for j in grid_candidates(vertex_grid, point, cell)
+                    if any(manhattan(point, c) < tolerance for c in slopes[j]["coordinates"])}
+
+        for i, slope in enumerate(slopes):
+            if not slope["coordinates"]:
+                continue
+            edges.update((i, j) for j in slopes_near(slope["coordinates"][-1]) if j != i)
+            edges.update((j, i) for j in slopes_near(slope["coordinates"][0]) if j != i)
+        bottoms = build_grid(
+            ((lift["coordinates"][0], j) for j, lift in enumerate(chair_lifts) if lift["coordinates"]), cell
+        )
+        for j, lift in enumerate(chair_lifts):
+            if not lift["coordinates"]:
+                continue
+            node = n_slopes + j
+            bas, haut = lift["coordinates"][0], lift["coordinates"][-1]
+            edges.update((i, node) for i in slopes_near(bas))
+            edges.update((node, i) for i in slopes_near(haut))
+            edges.update((node, n_slopes + k) for k in grid_candidates(bottoms, haut, cell)
+                         if k != j and manhattan(haut, chair_lifts[k]["coordinates"][0]) < tolerance)
+    return ResortGraph(names, kinds, difficulties, lengths, list(edges))
+
+
+def station_graph_key(station, tolerance):
+    """Empreinte du contenu d'une station (format ski-data) et de la tolérance."""
+    normalized = json.dumps([station, tolerance], sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+                            default=json_default)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class GraphCache:
+    """Graphes déjà construits, indexés par empreinte de contenu (LRU en mémoire)."""
+
+    def __init__(self, max_entries=DEFAULT_GRAPH_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_build(self, key, build):
+        entry = self.get(key)
+        if entry is None:
+            entry = build()
+            self.put(key, entry)
+        return entry
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,296 @@
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+from ski_common.geometry import Polyline, json_default
+
+EARTH_RADIUS_M = 6371008.8
+# Rayon initial de la recherche du plus proche voisin, multiplié par NEAREST_GROWTH tant que rien n'est trouvé
+NEAREST_START_M = 50.0
+NEAREST_GROWTH = 4.0
+NEAREST_MAX_M = 50_000.0
+DEFAULT_PISTE_DISTANCE_M = 30.0
+ELEMENT_KINDS = ("slope", "lift")
+# Un R-tree par type d'élément : une recherche de remontées ne parcourt pas les segments de pistes
+SEGMENT_TABLES = {"slope": "slope_segments", "lift": "lift_segments"}
+
+
+def _local_scale(lat):
+    """Mètres par degré (longitude, latitude) autour de la latitude `lat`."""
+    ky = EARTH_RADIUS_M * math.pi / 180
+    return ky * math.cos(math.radians(lat)), ky
+
+
+def _search_box(lat, lon, radius_m, kx, ky):
+    """Boîte (min_lon, min_lat, max_lon, max_lat) autour d'un point ; la longitude est bornée près des pôles."""
+    dlon = radius_m / kx if kx * 180 > radius_m else 180.0
+    return lon - dlon, lat - radius_m / ky, lon + dlon, lat + radius_m / ky
+
+
+def processed_key(processed):
+    """Empreinte d'une station traitée, quand aucune clé d'entrée (cache de résultats) n'est fournie."""
+    normalized = json.dumps(processed, sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+                            default=json_default)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _segment_distance(px, py, x1, y1, x2, y2):
+    """Distance du point (px, py) au segment [(x1, y1), (x2, y2)] et position (0..1) du projeté."""
+    dx, dy = x2 - x1, y2 - y1
+    length2 = dx * dx + dy * dy
+    t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length2))
+    return math.hypot(px - x1 - t * dx, py - y1 - t * dy), t
+
+
+def _segment_in_box(x1, y1, x2, y2, min_x, min_y, max_x, max_y):
+    """Vrai si le segment coupe le rectangle (découpage de Liang-Barsky)."""
+    t0, t1 = 0.0, 1.0
+    dx, dy = x2 - x1, y2 - y1
+    for p, q in ((-dx, x1 - min_x), (dx, max_x - x1), (-dy, y1 - min_y), (dy, max_y - y1)):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return False
+    return True
+
+
+class SpatialStore:
+    """Pistes et remontées traitées de toutes les stations, dans un fichier SQLite local.
+
+    Chaque segment (deux sommets consécutifs) est indexé par sa boîte
+    englobante dans le R-tree de son type (piste ou remontée) ; ses extrémités exactes sont gardées en
+    colonnes auxiliaires pour le calcul des distances. Une station est
+    remplacée d'un bloc à chaque nouveau résultat (inchangée : rien n'est
+    réécrit). Les segments d'un élément occupent une plage d'ids contiguë,
+    supprimée sans parcourir l'index.
+
+    Les requêtes passent par une connexion de lecture gardée ouverte par
+    thread : ouvrir une connexion et charger le R-tree coûte plus cher que
+    la requête elle-même. Le mode WAL laisse lire pendant une mise à jour.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS stations ("
+                " station TEXT PRIMARY KEY,"
+                " content_key TEXT,"
+                " elements INTEGER NOT NULL,"
+                " segments INTEGER NOT NULL,"
+                " updated_at REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS elements ("
+                " id INTEGER PRIMARY KEY,"
+                " station TEXT NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " name TEXT,"
+                " category TEXT,"
+                " coords BLOB NOT NULL,"
+                " first_segment INTEGER NOT NULL,"
+                " segment_count INTEGER NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS elements_station ON elements (station);"
+                + "".join(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING rtree("
+                    " id, min_lon, max_lon, min_lat, max_lat,"
+                    " +element_id, +lon1, +lat1, +lon2, +lat2);"
+                    for table in SEGMENT_TABLES.values()
+                )
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _reader(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=30)
+        return conn
+
+    def put_station(self, processed, content_key=None):
+        """Remplace les éléments d'une station traitée ({"station", "slopes", "chair_lifts"}).
+
+        La station est identifiée par son nom, obligatoire. `content_key`
+        (empreinte d'entrée du cache de résultats) vaut par défaut l'empreinte du
+        résultat : renvoie False si elle est celle déjà enregistrée (rien n'est réécrit).
+        """
+        station = processed.get("station")
+        if not isinstance(station, str) or not station.strip():
+            raise ValueError("A station needs a non-empty 'station' name to be indexed")
+        if content_key is None:
+            content_key = processed_key(processed)
+        elements = [("slope", s.get("name"), s.get("difficulty"), s.get("coordinates"))
+                    for s in processed.get("slopes", [])]
+        elements += [("lift", l.get("station", l.get("name")), l.get("type"), l.get("coordinates"))
+                     for l in processed.get("chair_lifts", [])]
+        with self.lock, self._connect() as conn:
+            row = conn.execute("SELECT content_key FROM stations WHERE station = ?", (station,)).fetchone()
+            if row is not None and row[0] == content_key:
+                return False
+            self._delete_station(conn, station)
+            next_segment = 1 + max(conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+                                   for table in SEGMENT_TABLES.values())
+            total_segments = 0
+            for kind, name, category, coords in elements:
+                # Coordonnées [lon, lat] de trouver_connections, rangées à plat
+                points = list(Polyline.from_points(coords or []))
+                segments = list(zip(points, points[1:]))
+                element_id = conn.execute(
+                    "INSERT INTO elements (station, kind, name, category, coords, first_segment, segment_count)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (station, kind, name, category, Polyline.from_points(points).values.tobytes(),
+                     next_segment, len(segments))
+                ).lastrowid
+                conn.executemany(
+                    f"INSERT INTO {SEGMENT_TABLES[kind]} (id, min_lon, max_lon, min_lat, max_lat, element_id, lon1, lat1, lon2, lat2)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(next_segment + k, min(x1, x2), max(x1, x2), min(y1, y2), max(y1, y2), element_id, x1, y1, x2, y2)
+                     for k, ((x1, y1), (x2, y2)) in enumerate(segments)]
+                )
+                next_segment += len(segments)
+                total_segments += len(segments)
+            conn.execute(
+                "INSERT INTO stations (station, content_key, elements, segments, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (station, content_key, len(elements), total_segments, time.time())
+            )
+        return True
+
+    def delete_station(self, station):
+        with self.lock, self._connect() as conn:
+            return self._delete_station(conn, station)
+
+    def _delete_station(self, conn, station):
+        ranges = conn.execute(
+            "SELECT kind, first_segment, segment_count FROM elements WHERE station = ?", (station,)
+        ).fetchall()
+        for kind, first, count in ranges:
+            if count:
+                conn.execute(f"DELETE FROM {SEGMENT_TABLES[kind]} WHERE id BETWEEN ? AND ?",
+                             (first, first + count - 1))
+        conn.execute("DELETE FROM elements WHERE station = ?", (station,))
+        conn.execute("DELETE FROM stations WHERE station = ?", (station,))
+        return bool(ranges)
+
+    def _segments_in(self, conn, min_lon, min_lat, max_lon, max_lat, kind=None, station=None):
+        rows = []
+        for table in [SEGMENT_TABLES[kind]] if kind is not None else SEGMENT_TABLES.values():
+            query = (f"SELECT s.id, s.element_id, s.lon1, s.lat1, s.lon2, s.lat2 FROM {table} s"
+                     " WHERE s.min_lon <= ? AND s.max_lon >= ? AND s.min_lat <= ? AND s.max_lat >= ?")
+            params = [max_lon, min_lon, max_lat, min_lat]
+            if station is not None:
+                query = query.replace(" WHERE", " JOIN elements e ON e.id = s.element_id WHERE e.station = ? AND")
+                params.insert(0, station)
+            rows.extend(conn.execute(query, params))
+        return rows
+
+    def _describe(self, conn, element_ids, geometry=False):
+        if not element_ids:
+            return {}
+        columns = "id, station, kind, name, category" + (", coords" if geometry else "")
+        placeholders = ",".join("?" * len(element_ids))
+        described = {}
+        for row in conn.execute(f"SELECT {columns} FROM elements WHERE id IN ({placeholders})", list(element_ids)):
+            element = {"id": row[0], "station": row[1], "kind": row[2], "name": row[3],
+                       "difficulty" if row[2] == "slope" else "type": row[4]}
+            if geometry:
+                element["coordinates"] = Polyline(array("d", row[5])).tolist()
+            described[row[0]] = element
+        return described
+
+    def nearest(self, lat, lon, kind=None, station=None, limit=1, max_distance_m=NEAREST_MAX_M):
+        """Les `limit` éléments les plus proches de (lat, lon), avec leur distance en mètres.
+
+        La boîte de recherche grandit jusqu'à contenir assez d'éléments à une
+        distance inférieure à son rayon : au-delà, aucun segment ne peut être plus proche.
+        """
+        kx, ky = _local_scale(lat)
+        radius = min(NEAREST_START_M, max_distance_m)
+        conn = self._reader()
+        while True:
+            rows = self._segments_in(conn, *_search_box(lat, lon, radius, kx, ky), kind, station)
+            best = {}
+            for _, element_id, x1, y1, x2, y2 in rows:
+                d, _ = _segment_distance(0.0, 0.0, (x1 - lon) * kx, (y1 - lat) * ky,
+                                         (x2 - lon) * kx, (y2 - lat) * ky)
+                if d <= radius and (element_id not in best or d < best[element_id]):
+                    best[element_id] = d
+            if len(best) >= limit or radius >= max_distance_m:
+                break
+            radius = min(radius * NEAREST_GROWTH, max_distance_m)
+        ranked = sorted(best.items(), key=lambda item: item[1])[:limit]
+        described = self._describe(conn, [element_id for element_id, _ in ranked])
+        return [dict(described[element_id], distance_m=round(d, 2)) for element_id, d in ranked
+                if element_id in described]
+
+    def in_bbox(self, min_lat, min_lon, max_lat, max_lon, kind=None, station=None, geometry=False):
+        """Éléments dont au moins un segment traverse le rectangle."""
+        conn = self._reader()
+        hits = {}
+        for _, element_id, x1, y1, x2, y2 in self._segments_in(conn, min_lon, min_lat, max_lon, max_lat, kind, station):
+            if element_id not in hits and _segment_in_box(x1, y1, x2, y2, min_lon, min_lat, max_lon, max_lat):
+                hits[element_id] = True
+        described = self._describe(conn, list(hits), geometry)
+        # Une station remplacée entre les deux lectures perd ses anciens éléments : ils sont ignorés
+        return [described[element_id] for element_id in hits if element_id in described]
+
+    def which_piste(self, lat, lon, max_distance_m=DEFAULT_PISTE_DISTANCE_M, station=None):
+        """Pistes à moins de `max_distance_m` de (lat, lon), la plus proche en premier.
+
+        Pour chacune : distance et avancement le long de la piste (0 en haut, 1 en bas).
+        """
+        kx, ky = _local_scale(lat)
+        conn = self._reader()
+        rows = self._segments_in(conn, *_search_box(lat, lon, max_distance_m, kx, ky), "slope", station)
+        best = {}
+        for segment_id, element_id, x1, y1, x2, y2 in rows:
+            d, t = _segment_distance(0.0, 0.0, (x1 - lon) * kx, (y1 - lat) * ky,
+                                     (x2 - lon) * kx, (y2 - lat) * ky)
+            if d <= max_distance_m and (element_id not in best or d < best[element_id][0]):
+                best[element_id] = (d, segment_id, t)
+        ranked = sorted(best.items(), key=lambda item: item[1][0])
+        described = self._describe(conn, [element_id for element_id, _ in ranked])
+        return [dict(described[element_id], distance_m=round(d, 2),
+                     progress=self._progress(conn, element_id, segment_id, t, kx, ky))
+                for element_id, (d, segment_id, t) in ranked if element_id in described]
+
+    def _progress(self, conn, element_id, segment_id, t, kx, ky):
+        """Fraction de la longueur de la piste parcourue jusqu'au point projeté sur le segment."""
+        row = conn.execute("SELECT coords, first_segment FROM elements WHERE id = ?", (element_id,)).fetchone()
+        if row is None:
+            return None
+        coords, first_segment = row
+        points = list(Polyline(array("d", coords)))
+        lengths = [math.hypot((bx - ax) * kx, (by - ay) * ky) for (ax, ay), (bx, by) in zip(points, points[1:])]
+        total = sum(lengths)
+        if not total:
+            return 0.0
+        k = segment_id - first_segment
+        return round((sum(lengths[:k]) + t * lengths[k]) / total, 4)
+
+    def stats(self):
+        conn = self._reader()
+        stations, elements, segments = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(elements), 0), COALESCE(SUM(segments), 0) FROM stations"
+        ).fetchone()
+        return {"path": self.path, "stations": stations, "elements": elements, "segments": segments}
+
@@ -0,0 +1,256 @@
+# Lecture en flux du corps de /process : les stations sont extraites une à une
+# au fil de la réception, sans charger tout le payload en mémoire.
+#
+#   NDJSON (Content-Type: application/x-ndjson) : une station par ligne ; une
+#   ligne {"options": {...}} avant la première station fixe destination_url,
+#   headers, tolerance...
+#   JSON (?stream=1) : le payload habituel {"destination_url": ..., "data": [...]}
+#   ou directement un tableau de stations, analysé de façon incrémentale.
+import codecs
+import json
+import tempfile
+
+from ski_common.geometry import json_default
+from ski_common.wire_format import (DEFAULT_MAX_DECOMPRESSED_BYTES, WireFormatError, decode_station_coords,
+                                    iter_decompressed, parse_coords_encoding)
+
+CHUNK_SIZE = 64 * 1024
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+# Au-delà, les stations en attente des options sont écrites sur disque
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+
+class StreamError(ValueError):
+    pass
+
+
+class LateOptionsError(StreamError):
+    """Option lue après les stations alors qu'elles étaient déjà traitées avec les valeurs par défaut."""
+
+
+def iter_chunks(stream, content_encoding=None, chunk_size=CHUNK_SIZE, max_size=DEFAULT_MAX_DECOMPRESSED_BYTES):
+    """Morceaux de texte décodés (décompression gzip/zstd à la volée, `chunk_size` octets au plus à la fois).
+
+    L'encodage est vérifié dès l'appel, avant toute lecture du flux ; au-delà
+    de `max_size` octets décompressés, la lecture lève PayloadTooLarge.
+    """
+    return _decode_chunks(iter_decompressed(stream, content_encoding, max_size, chunk_size))
+
+
+def _decode_chunks(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_ndjson(chunks):
+    pending = []  # morceaux de la ligne en cours, qui peut couvrir plusieurs morceaux
+    for chunk in chunks:
+        if "\n" not in chunk:
+            pending.append(chunk)
+            continue
+        lines = chunk.split("\n")
+        lines[0] = "".join(pending) + lines[0]
+        pending = [lines.pop()]
+        for line in lines:
+            if line.strip():
+                yield _loads(line)
+    tail = "".join(pending)
+    if tail.strip():
+        yield _loads(tail)
+
+
+def _loads(text):
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise StreamError(f"Invalid NDJSON line: {str(e)}")
+
+
+class JsonStreamReader:
+    """Analyse incrémentale d'un document JSON, valeur par valeur.
+
+    Seule la structure de premier niveau (objet ou tableau, et le tableau
+    "data") est parcourue à la main ; chaque valeur est décodée par json dès
+    qu'elle est complète dans le tampon.
+    """
+
+    _decoder = json.JSONDecoder()
+    _whitespace = " \t\n\r"
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def _fill(self, min_size=0):
+        """Lit au moins un morceau de plus (et jusqu'à min_size caractères) ; False en fin de flux."""
+        if self.exhausted:
+            return False
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        parts, size = [self.buffer], len(self.buffer)
+        while True:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.exhausted = True
+                break
+            parts.append(chunk)
+            size += len(chunk)
+            if size >= min_size:
+                break
+        self.buffer = "".join(parts)
+        return len(parts) > 1
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self._whitespace:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise StreamError(f"Invalid JSON stream: expected '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except ValueError as e:
+                # Valeur incomplète : on double au moins le tampon avant de réessayer
+                if not self._fill(2 * (len(self.buffer) - self.pos)):
+                    raise StreamError(f"Invalid JSON stream: {str(e)}")
+                continue
+            # Un nombre en fin de tampon peut se poursuivre dans le morceau suivant
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise StreamError(f"Invalid JSON stream: expected ',' or ']' at offset {self.pos - 1}")
+
+    def end(self):
+        if self.peek() != "":
+            raise StreamError("Invalid JSON stream: trailing data after the document")
+
+
+def iter_json_stations(chunks, options):
+    """Stations du tableau "data" (ou du tableau de premier niveau), au fil de la lecture.
+
+    Les autres clés de l'objet sont rangées dans `options` dès qu'elles sont lues :
+    celles placées avant "data" sont connues avant la première station.
+    """
+    reader = JsonStreamReader(chunks)
+    if reader.peek() == "[":
+        yield from reader.iter_array()
+    else:
+        reader.expect("{")
+        if reader.peek() == "}":
+            reader.pos += 1
+        else:
+            while True:
+                key = reader.read_value()
+                if not isinstance(key, str):
+                    raise StreamError("Invalid JSON stream: object keys must be strings")
+                reader.expect(":")
+                if key == "data" and reader.peek() == "[":
+                    yield from reader.iter_array()
+                else:
+                    options[key] = reader.read_value()
+                char = reader.peek()
+                reader.pos += 1
+                if char == "}":
+                    break
+                if char != ",":
+                    raise StreamError(f"Invalid JSON stream: expected ',' or '}}' at offset {reader.pos - 1}")
+    reader.end()
+
+
+def iter_ndjson_stations(chunks, options):
+    """Stations d'un flux NDJSON ; une ligne {"options": {...}} complète `options`."""
+    for item in iter_ndjson(chunks):
+        if isinstance(item, dict) and set(item) == {"options"} and isinstance(item["options"], dict):
+            options.update(item["options"])
+        else:
+            yield item
+
+
+def iter_stream_stations(stream, headers, options, max_size=DEFAULT_MAX_DECOMPRESSED_BYTES):
+    """Stations lues en flux selon Content-Type, avec décompression et décodage des polylignes.
+
+    Les en-têtes sont vérifiés dès l'appel (WireFormatError), le corps au fil de l'itération.
+    """
+    content_type = (headers.get("Content-Type") or "application/json").split(";")[0].strip().lower()
+    chunks = iter_chunks(stream, headers.get("Content-Encoding"), max_size=max_size)
+    if content_type == NDJSON_CONTENT_TYPE:
+        stations = iter_ndjson_stations(chunks, options)
+    elif content_type == "application/json":
+        stations = iter_json_stations(chunks, options)
+    else:
+        raise WireFormatError(f"Content-Type non supporté en flux : {content_type}")
+    precision = parse_coords_encoding(headers.get("X-Coords-Encoding"))
+    return _decode_stations(stations, precision)
+
+
+def _decode_stations(stations, precision):
+    for station in stations:
+        if not isinstance(station, dict):
+            raise StreamError("Each station must be a JSON object")
+        yield decode_station_coords(station, precision) if precision is not None else station
+
+
+def require_options_first(stations, options):
+    """Relaie les stations, puis lève LateOptionsError si des options sont apparues après la première.
+
+    Pour un flux traité sans mise de côté : une option placée après "data" (ou
+    une ligne {"options": ...} après les stations) ne serait jamais appliquée.
+    """
+    known = set(options)
+    yield from stations
+    late = sorted(set(options) - known)
+    if late:
+        raise LateOptionsError(f"Options {late} must come before 'data' when 'destination_url' or "
+                               "'tolerances' is sent first in a streamed body")
+
+
+def spool(stations):
+    """Écrit les stations restantes (sur disque au-delà de SPOOL_MAX_MEMORY) et renvoie de quoi les relire.
+
+    Sert quand les options arrivent après "data" : le flux est consommé jusqu'au
+    bout sans garder les stations en mémoire, puis relu station par station.
+    """
+    spool_file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY, mode="w+", encoding="utf-8")
+    for station in stations:
+        spool_file.write(json.dumps(station, ensure_ascii=False, default=json_default) + "\n")
+    spool_file.seek(0)
+
+    def replay():
+        with spool_file:
+            for line in spool_file:
+                yield json.loads(line)
+
+    return replay()
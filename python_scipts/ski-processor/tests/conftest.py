@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# Service et modules communs importables sans installation ; caches et store spatial
+# désactivés, calcul dans le processus courant, pas d'identifiants Firebase
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, ".."), os.path.join(HERE, "..", "..", "ski-common")]
+
+_workdir = tempfile.mkdtemp(prefix="ski-processor-tests-")
+os.environ.update({
+    "RESULT_CACHE_DB": "",
+    "SPATIAL_DB": "",
+    "PROCESS_PARALLEL": "0",
+    "FIREBASE_TOKEN_CACHE": os.path.join(_workdir, "firebase-token.json"),
+})
+for name in ("FIREBASE_EMAIL", "FIREBASE_PASSWORD", "FIREBASE_API_KEY"):
+    os.environ.pop(name, None)
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+import asgi
+import main
+
+
+def stations(count):
+    return [{"station": f"S{i}", "pistes": [{"name": "A", "coords": [[45.0, 6.0], [45.001, 6.0]]}],
+             "remontees": []} for i in range(count)]
+
+
+class FakeWriter:
+    max_in_flight = 2
+
+    def __init__(self):
+        self.posted = []
+
+    def submit(self, data, destination_url, headers=None):
+        self.posted.append((data["station"], headers["Authorization"]))
+        future = Future()
+        future.set_result({"status": "success", "response": {"id": data["station"]}})
+        return future
+
+
+def test_process_in_threads_uses_shared_writer(monkeypatch):
+    writer = FakeWriter()
+    monkeypatch.setattr(main, "get_destination_writer", lambda: writer)
+    monkeypatch.setattr(asgi, "get_firebase_token", lambda: "token")
+    payload = {"data": stations(5), "destination_url": "http://dest", "parallel": False}
+
+    status, response = asyncio.run(asgi.process_in_threads(payload))
+
+    assert status == 200
+    assert [r["station"] for r in response["results"]] == ["S0", "S1", "S2", "S3", "S4"]
+    assert writer.posted == [(f"S{i}", "Bearer token") for i in range(5)]
+
+
+def test_auth_failure_stops_processing(monkeypatch):
+    computed, prefetched = [], threading.Event()
+    real_process_station = main.process_station
+
+    def counting_process_station(station, *args):
+        computed.append(station["station"])
+        if len(computed) >= asgi.PREFETCH_STATIONS:
+            prefetched.set()
+        return real_process_station(station, *args)
+
+    def no_token():
+        # Le calcul a le temps de remplir la file d'avance pendant l'authentification
+        prefetched.wait(5)
+        return None
+
+    monkeypatch.setattr(main, "process_station", counting_process_station)
+    monkeypatch.setattr(asgi, "get_firebase_token", no_token)
+    payload = {"data": stations(200), "destination_url": "http://dest", "parallel": False}
+
+    with pytest.raises(PermissionError):
+        asyncio.run(asgi.process_in_threads(payload))
+    assert len(computed) <= asgi.PREFETCH_STATIONS + 2
+
+
+def call_app(path, chunks, headers, query=b""):
+    """Appelle l'application ASGI avec un corps en plusieurs messages ; (statut, JSON, messages lus).
+
+    Comme un client HTTP, le corps est annoncé par Content-Length ou envoyé en chunked.
+    """
+    messages, received = [], []
+    if len(chunks) == 1:
+        headers = dict(headers, **{"Content-Length": str(len(chunks[0]))})
+    else:
+        headers = dict(headers, **{"Transfer-Encoding": "chunked"})
+
+    async def receive():
+        body = chunks[len(received)]
+        received.append(body)
+        return {"type": "http.request", "body": body, "more_body": len(received) < len(chunks)}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path, "query_string": query, "http_version": "1.1",
+             "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+    asyncio.run(asgi.app(scope, receive, send))
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return messages[0]["status"], json.loads(body), len(received)
+
+
+@pytest.mark.parametrize("path", ["/process", "/graph"])
+def test_body_over_limit_is_413_before_reading_everything(monkeypatch, path):
+    monkeypatch.setattr(asgi, "MAX_BODY_BYTES", 1024)
+    status, body, received = call_app(path, [b"x" * 512] * 10, {"Content-Type": "application/json"})
+    assert status == 413
+    assert received == 3
+
+
+def test_sweep_is_replayed_to_flask():
+    payload = {"tolerances": [0.001], "data": stations(2)}
+    status, body, _ = call_app("/process", [json.dumps(payload).encode()], {"Content-Type": "application/json"})
+    assert status == 200
+    assert [s["station"] for s in body["stations"]] == ["S0", "S1"]
+
+
+def test_streamed_body_reaches_flask_in_pieces():
+    lines = [{"options": {"tolerances": [0.001]}}] + stations(3)
+    chunks = [(json.dumps(line) + "\n").encode() for line in lines]
+    status, body, received = call_app("/process", chunks, {"Content-Type": "application/x-ndjson"})
+    assert status == 200
+    assert [s["station"] for s in body["stations"]] == ["S0", "S1", "S2"]
+    assert received == len(chunks)
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from ski_common.wire_format import compress
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "MAX_BODY_BYTES", 64 * 1024)
+    return main.app.test_client()
+
+
+def bomb(compression):
+    payload = {"destination_url": "http://localhost/unused",
+               "data": [{"station": "S", "pistes": [], "remontees": [], "padding": "x" * (1024 * 1024)}]}
+    return compress(json.dumps(payload).encode("utf-8"), compression)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_compressed_body_over_limit_is_413(client, compression):
+    response = client.post("/process", data=bomb(compression),
+                           headers={"Content-Type": "application/json", "Content-Encoding": compression})
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_streamed_body_over_limit_is_413(client, compression):
+    response = client.post("/process?stream=1", data=bomb(compression),
+                           headers={"Content-Type": "application/json", "Content-Encoding": compression})
+    assert response.status_code == 413
+
+
+def test_graph_body_over_limit_is_413(client):
+    response = client.post("/graph", data=bomb("gzip"),
+                           headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert response.status_code == 413
+
+
+def test_invalid_gzip_body_is_400(client):
+    response = client.post("/process", data=b"not gzip",
+                           headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert response.status_code == 400
+
+
+def call_asgi(path, body, headers):
+    import asgi
+
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path, "query_string": b"",
+             "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+    asyncio.run(asgi.app(scope, receive, send))
+    return messages[0]["status"]
+
+
+def test_asgi_compressed_body_over_limit_is_413(monkeypatch):
+    import asgi
+    monkeypatch.setattr(asgi, "MAX_BODY_BYTES", 64 * 1024)
+    assert call_asgi("/process", bomb("zstd"), {"Content-Type": "application/json", "Content-Encoding": "zstd"}) == 413
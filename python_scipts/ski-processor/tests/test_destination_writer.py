@@ -0,0 +1,92 @@
+import pytest
+
+import destination_writer
+from destination_writer import DestinationWriter
+
+
+class FakeResponse:
+    headers = {}
+
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+        self.content = b"{}" if data is not None else b""
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise destination_writer.requests.exceptions.HTTPError(f"{self.status_code} Client Error")
+
+    def json(self):
+        return self.data
+
+
+class Destination:
+    """Remplace session.post : renvoie les statuts prévus dans l'ordre et garde les en-têtes reçus."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.headers = []
+
+    def __call__(self, url, data=None, headers=None, timeout=None):
+        self.headers.append(dict(headers))
+        return FakeResponse(self.statuses.pop(0), {"ok": True})
+
+
+class TokenCache:
+    def __init__(self):
+        self.token = "old"
+        self.invalidated = []
+
+    def invalidate(self, id_token=None):
+        self.invalidated.append(id_token)
+        self.token = "new"
+
+    def get_token(self):
+        return self.token
+
+
+@pytest.fixture
+def writer():
+    writer = DestinationWriter(retries=2, backoff=0)
+    yield writer
+    writer.executor.shutdown()
+
+
+@pytest.fixture
+def token_cache(monkeypatch):
+    token_cache = TokenCache()
+    monkeypatch.setattr(destination_writer, "get_token_cache", lambda: token_cache)
+    return token_cache
+
+
+def test_rejected_token_is_renewed_and_retried_once(writer, token_cache):
+    writer.session.post = destination = Destination(401, 201)
+    result = writer.post({"station": "S"}, "http://dest", {"Authorization": "Bearer old"})
+    assert result["status"] == "success"
+    assert token_cache.invalidated == ["old"]
+    assert [h["Authorization"] for h in destination.headers] == ["Bearer old", "Bearer new"]
+
+
+def test_second_401_is_reported_without_further_renewal(writer, token_cache):
+    writer.session.post = destination = Destination(401, 401)
+    result = writer.post({"station": "S"}, "http://dest", {"Authorization": "Bearer old"})
+    assert result["status"] == "error"
+    assert len(destination.headers) == 2
+    assert token_cache.invalidated == ["old"]
+
+
+def test_401_without_bearer_token_is_not_retried(writer, token_cache):
+    writer.session.post = destination = Destination(401)
+    assert writer.post({"station": "S"}, "http://dest")["status"] == "error"
+    assert len(destination.headers) == 1
+    assert token_cache.invalidated == []
+
+
+def test_idempotency_key_is_shared_by_retries_only(writer):
+    writer.session.post = destination = Destination(503, 200, 200)
+    data = {"station": "S"}
+    assert writer.post(data, "http://dest")["status"] == "success"
+    assert writer.post(data, "http://dest")["status"] == "success"
+    first, retry, resend = [h[destination_writer.IDEMPOTENCY_HEADER] for h in destination.headers]
+    assert first == retry
+    assert resend != first
@@ -0,0 +1,102 @@
+from concurrent.futures import Future
+
+import pytest
+
+import main
+import result_cache
+from result_cache import ResultCache, result_key
+
+STATIONS = [{"station": f"S{i}", "pistes": [{"name": "A", "coords": [[45.0, 6.0], [45.001, 6.0 + i / 1e3]]}],
+             "remontees": []} for i in range(2)]
+
+
+class FakeWriter:
+    max_in_flight = 2
+
+    def __init__(self):
+        self.posted = []
+
+    def submit(self, data, destination_url, headers=None):
+        self.posted.append((data["station"], destination_url))
+        future = Future()
+        future.set_result({"status": "success", "response": {"id": data["station"]}})
+        return future
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "results.sqlite"), 1024 * 1024)
+
+
+@pytest.fixture
+def process(monkeypatch, cache):
+    writer = FakeWriter()
+    monkeypatch.setattr(main, "get_destination_writer", lambda: writer)
+    monkeypatch.setattr(main, "get_firebase_token", lambda: "token")
+    monkeypatch.setattr(main, "get_result_cache", lambda: cache)
+
+    def process(destination_url="http://dest", **options):
+        writer.posted.clear()
+        response = main.app.test_client().post("/process", json=dict(options, data=STATIONS,
+                                                                     destination_url=destination_url))
+        assert response.status_code == 200
+        return response.get_json(), list(writer.posted)
+
+    return process
+
+
+def test_delivered_stations_are_neither_recomputed_nor_resent(process):
+    first, posted = process()
+    assert first["cache"] == {"hits": 0, "result_hits": 0, "misses": 2}
+    assert posted == [("S0", "http://dest"), ("S1", "http://dest")]
+
+    again, posted = process()
+    assert again["cache"] == {"hits": 2, "result_hits": 0, "misses": 0}
+    assert posted == []
+    # La réponse de la destination au premier envoi est restituée
+    assert [r["response"] for r in again["results"]] == [{"id": "S0"}, {"id": "S1"}]
+    assert [r["cache"] for r in again["results"]] == ["hit", "hit"]
+
+
+def test_other_destination_reuses_result_but_sends_it(process, monkeypatch):
+    process()
+    monkeypatch.setattr(main, "process_station", lambda *args: pytest.fail("result should come from the cache"))
+    other, posted = process("http://other")
+    assert other["cache"] == {"hits": 0, "result_hits": 2, "misses": 0}
+    assert posted == [("S0", "http://other"), ("S1", "http://other")]
+
+
+@pytest.mark.parametrize("options", [{"tolerance": 0.001}, {"engine": "grid"}, {"engine": "numpy", "tolerance_m": 40}])
+def test_detection_parameters_change_the_key(process, options):
+    if options.get("engine") == "numpy":
+        pytest.importorskip("numpy")
+    process()
+    changed, posted = process(**options)
+    assert changed["cache"] == {"hits": 0, "result_hits": 0, "misses": 2}
+    assert len(posted) == 2
+
+
+def test_result_key_covers_station_and_parameters():
+    base = result_key(STATIONS[0], 0.0006)
+    assert result_key(dict(STATIONS[0]), 0.0006) == base
+    assert result_key(STATIONS[1], 0.0006) != base
+    assert result_key(STATIONS[0], 0.0006, engine="grid") != base
+    assert result_key(STATIONS[0], 0.0006, tolerance_m=40) != base
+
+
+def test_least_recently_used_results_are_evicted(tmp_path, monkeypatch):
+    ticks = iter(range(1000))
+    monkeypatch.setattr(result_cache.time, "time", lambda: float(next(ticks)))
+    cache = ResultCache(str(tmp_path / "results.sqlite"), 1024 * 1024)
+    result = {"station": "S", "slopes": [], "chair_lifts": []}
+    cache.put_result("old", result)
+    cache.put_result("recent", result)
+    cache.record_delivery("recent", "http://dest")
+    cache.get_result("old")  # "old" redevient le plus récemment utilisé
+    cache.max_bytes = cache.stats()["bytes"]
+    cache.put_result("new", result)
+    assert cache.get_result("recent") is None
+    assert cache.get_delivery("recent", "http://dest") is None
+    assert cache.get_result("old") == result
+    assert cache.get_result("new") == result
+    assert cache.stats()["deliveries"] == 0
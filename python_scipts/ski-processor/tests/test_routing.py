@@ -0,0 +1,78 @@
+import pytest
+
+import main
+from routing import ResortGraph, build_resort_graph
+from ski_common.connections import build_station_elements
+
+
+def graph(nodes, edges):
+    """nodes : (nom, difficulté, longueur) de pistes ; edges : couples de noms."""
+    names = [name for name, _, _ in nodes]
+    return ResortGraph(names, ["slope"] * len(nodes), [d for _, d, _ in nodes], [l for _, _, l in nodes],
+                       [(names.index(a), names.index(b)) for a, b in edges])
+
+
+def names(g, path):
+    return [g.names[i] for i in path] if path is not None else None
+
+
+def test_easiest_takes_shortest_path_within_bottleneck():
+    g = graph([("S", "Vert", 1), ("A", "Vert", 100), ("B", "Bleu", 10), ("X", "Vert", 1), ("T", "Bleu", 1)],
+              [("S", "A"), ("S", "B"), ("A", "X"), ("B", "X"), ("X", "T")])
+    assert g.bottleneck_rank([0], [4]) == 1
+    assert names(g, g.route([0], [4], "easiest")) == ["S", "B", "X", "T"]
+
+
+def test_easiest_avoids_harder_shortcut():
+    g = graph([("S", "Vert", 1), ("N", "Noir", 1), ("V", "Bleu", 500), ("T", "Vert", 1)],
+              [("S", "N"), ("S", "V"), ("N", "T"), ("V", "T")])
+    assert names(g, g.route([0], [3], "shortest")) == ["S", "N", "T"]
+    assert names(g, g.route([0], [3], "easiest")) == ["S", "V", "T"]
+
+
+def test_unreachable_target_and_unknown_mode():
+    g = graph([("S", "Vert", 1), ("T", "Vert", 1)], [("T", "S")])
+    assert g.route([0], [1], "shortest") is None
+    assert g.route([0], [1], "easiest") is None
+    with pytest.raises(ValueError):
+        g.route([0], [1], "fastest")
+
+
+STATION = {
+    "station": "S",
+    "pistes": [{"name": "Retour", "difficulty": "Bleu", "coords": [[45.01, 6.0], [45.005, 6.001], [45.0, 6.0]]}],
+    "remontees": [{"name": "TS", "type": "chair_lift", "coords": [[45.0, 6.0], [45.01, 6.0]]}],
+}
+
+
+def test_lift_and_slope_form_a_loop():
+    g = build_resort_graph(*build_station_elements(STATION))
+    assert g.summary() == {"nodes": 2, "slopes": 1, "chair_lifts": 1, "edges": 2}
+    assert names(g, g.route(g.resolve("TS"), g.resolve("Retour"))) == ["TS", "Retour"]
+    assert g.reachable(g.resolve("Retour")) == [0, 1]
+
+
+@pytest.mark.parametrize("tolerance", ["abc", True, -1, None])
+def test_invalid_tolerance_is_400(tolerance):
+    client = main.app.test_client()
+    route = client.post("/route", json={"station": STATION, "from": "TS", "to": "Retour", "tolerance": tolerance})
+    assert route.status_code == 400
+    graphs = client.post("/graph", json={"data": [STATION], "tolerance": tolerance})
+    assert graphs.status_code == 400
+
+
+def test_route_endpoint():
+    response = main.app.test_client().post("/route", json={"station": STATION, "from": "TS", "to": "Retour",
+                                                           "mode": "easiest"})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [node["name"] for node in body["path"]] == ["TS", "Retour"]
+    assert body["max_difficulty"] == "Bleu"
+
+
+def test_non_object_graph_station_is_a_station_error():
+    response = main.app.test_client().post("/graph", json={"data": ["S", STATION]})
+    assert response.status_code == 207
+    body = response.get_json()
+    assert len(body["graphs"]) == 1
+    assert [e["station"] for e in body["errors"]] == [None]
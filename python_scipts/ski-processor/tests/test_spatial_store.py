@@ -0,0 +1,77 @@
+import pytest
+
+import main
+from spatial_store import SpatialStore
+from ski_common.connections import process_station
+
+
+def processed(name="S", lon=6.0):
+    station = {
+        "station": name,
+        "pistes": [{"name": "Verte", "difficulty": "Vert", "coords": [[45.0, lon], [45.001, lon]]}],
+        "remontees": [{"name": "TS", "type": "chair_lift", "coords": [[45.001, lon + 0.001], [45.0, lon + 0.001]]}],
+    }
+    return process_station(station)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SpatialStore(str(tmp_path / "spatial.sqlite"))
+
+
+def test_queries(store):
+    assert store.put_station(processed())
+    nearest = store.nearest(45.0005, 6.0001)
+    assert [(e["name"], e["kind"]) for e in nearest] == [("Verte", "slope")]
+    assert 7 < nearest[0]["distance_m"] < 9
+    assert store.nearest(45.0005, 6.0011, kind="lift")[0]["name"] == "TS"
+    piste = store.which_piste(45.00025, 6.0)[0]
+    assert (piste["name"], piste["progress"]) == ("Verte", 0.25)
+    assert {e["name"] for e in store.in_bbox(44.9, 5.9, 45.1, 6.1)} == {"Verte", "TS"}
+
+
+def test_unchanged_station_is_not_rewritten_without_key(store):
+    assert store.put_station(processed())
+    assert not store.put_station(processed())
+    assert store.put_station(processed(lon=6.01))
+    assert store.stats()["stations"] == 1
+    assert store.nearest(45.0005, 6.01)[0]["distance_m"] < 1
+
+
+def test_station_without_name_is_rejected(store):
+    data = processed()
+    data["station"] = ""
+    with pytest.raises(ValueError):
+        store.put_station(data)
+
+
+def test_record_spatial_skips_unnamed_and_duplicate_stations(store):
+    first, second = processed("S"), processed("S", lon=7.0)
+    outcomes = [({"station": "S"}, first, None, None), ({"station": "S"}, second, None, None),
+                ({}, processed("Unknown Station", lon=8.0), None, None)]
+    assert list(main.record_spatial(iter(outcomes), store)) == outcomes
+    assert store.stats()["stations"] == 1
+    assert store.nearest(45.0005, 6.0)[0]["station"] == "S"
+    assert store.nearest(45.0005, 7.0, max_distance_m=100) == []
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    store.put_station(processed())
+    monkeypatch.setattr(main, "get_spatial_store", lambda: store)
+    return main.app.test_client()
+
+
+@pytest.mark.parametrize("query", [
+    "/nearest?lat=91&lon=6", "/nearest?lat=45&lon=-181", "/which-piste?lat=-90.5&lon=6",
+    "/which-piste?lat=45&lon=6&max_distance_m=-1", "/bbox?min_lat=-91&min_lon=5&max_lat=46&max_lon=7",
+])
+def test_out_of_range_coordinates_are_400(client, query):
+    assert client.get(query).status_code == 400
+
+
+def test_pole_query_is_bounded(client):
+    response = client.get("/nearest?lat=90&lon=6&max_distance_m=1000")
+    assert response.status_code == 200
+    assert response.get_json()["elements"] == []
+    assert client.get("/which-piste?lat=45.00025&lon=6").get_json()["piste"]["name"] == "Verte"
@@ -0,0 +1,132 @@
+import io
+import json
+from concurrent.futures import Future
+from itertools import chain
+
+import pytest
+
+import main
+from stream_ingest import (LateOptionsError, StreamError, iter_json_stations, iter_ndjson_stations,
+                           iter_stream_stations, require_options_first, spool)
+
+STATIONS = [{"station": f"S{i}", "pistes": [{"name": "A", "coords": [[45.0, 6.0 + i / 1e3]]}], "remontees": []}
+            for i in range(3)]
+
+
+def pieces(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_json_object_split_anywhere(size):
+    body = json.dumps({"destination_url": "http://dest", "tolerance": 0.0001, "data": STATIONS, "batch_size": 2})
+    options = {}
+    assert list(iter_json_stations(pieces(body, size), options)) == STATIONS
+    assert options == {"destination_url": "http://dest", "tolerance": 0.0001, "batch_size": 2}
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_top_level_array_and_ndjson(size):
+    assert list(iter_json_stations(pieces(json.dumps(STATIONS), size), {})) == STATIONS
+    options = {}
+    body = json.dumps({"options": {"tolerance": 0.001}}) + "\n" + "\n".join(json.dumps(s) for s in STATIONS)
+    assert list(iter_ndjson_stations(pieces(body, size), options)) == STATIONS
+    assert options == {"tolerance": 0.001}
+
+
+def test_number_split_across_chunks_is_read_whole():
+    options = {}
+    assert list(iter_json_stations(['{"tolerance": 0.00', '06, "data": []}'], options)) == []
+    assert options == {"tolerance": 0.0006}
+
+
+@pytest.mark.parametrize("body", ['{"data": [1, 2', '{"data": [] "x": 1}', '{"data": []} trailing', '{1: 2}'])
+def test_invalid_json_stream(body):
+    with pytest.raises(StreamError):
+        list(iter_json_stations(pieces(body, 4), {}))
+
+
+def test_stream_stations_must_be_objects():
+    stream = io.BytesIO(b'{"data": [1]}')
+    with pytest.raises(StreamError):
+        list(iter_stream_stations(stream, {"Content-Type": "application/json"}, {}))
+
+
+def test_spool_replays_stations():
+    assert list(spool(iter(STATIONS))) == STATIONS
+
+
+def test_late_option_is_rejected():
+    options = {"destination_url": "http://dest"}
+    body = json.dumps({"destination_url": "http://dest", "data": STATIONS, "tolerance": 0.01})
+    stations = iter_json_stations(pieces(body, 16), options)
+    first = next(stations)
+    relayed = require_options_first(chain([first], stations), options)
+    with pytest.raises(LateOptionsError):
+        list(relayed)
+
+
+def sweep_stream(body):
+    return main.app.test_client().post("/process?stream=1", data=body, content_type="application/json")
+
+
+def test_options_after_data_are_applied_when_spooled():
+    response = sweep_stream(json.dumps({"data": STATIONS, "tolerances": [0.001]}))
+    assert response.status_code == 200
+    assert [s["station"] for s in response.get_json()["stations"]] == ["S0", "S1", "S2"]
+
+
+def test_options_after_streamed_data_are_400():
+    response = sweep_stream(json.dumps({"tolerances": [0.001], "data": STATIONS, "tolerance": 0.01}))
+    assert response.status_code == 400
+    assert "tolerance" in response.get_json()["error"]
+
+
+class FakeWriter:
+    max_in_flight = 2
+
+    def __init__(self):
+        self.posted = []
+
+    def submit(self, data, destination_url, headers=None):
+        self.posted.append(data["station"])
+        future = Future()
+        future.set_result({"status": "success", "response": None})
+        return future
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    writer = FakeWriter()
+    monkeypatch.setattr(main, "get_destination_writer", lambda: writer)
+    monkeypatch.setattr(main, "get_firebase_token", lambda: "token")
+    return writer
+
+
+def process_stream(lines):
+    body = "".join(json.dumps(line) + "\n" for line in lines)
+    return main.app.test_client().post("/process?destination_url=http://dest", data=body,
+                                       content_type="application/x-ndjson")
+
+
+def test_late_option_after_delivery_lists_delivered_stations(writer):
+    response = process_stream(STATIONS + [{"options": {"tolerance": 0.01}}])
+    assert response.status_code == 207
+    body = response.get_json()
+    assert body["status"] == "aborted"
+    assert [r["station"] for r in body["results"]] == writer.posted == ["S0", "S1", "S2"]
+    assert "tolerance" in body["errors"][-1]["error"]
+
+
+def test_streamed_body_over_limit_lists_delivered_stations(writer, monkeypatch):
+    # Le corps est lu par morceaux de 64 Kio : la limite tombe après les premiers envois
+    monkeypatch.setattr(main, "MAX_BODY_BYTES", 128 * 1024)
+    small = [dict(STATIONS[0], station=f"S{i}") for i in range(1000)]
+    big = dict(STATIONS[0], station="Big", padding="x" * 64 * 1024)
+    response = process_stream(small + [big])
+    assert response.status_code == 207
+    body = response.get_json()
+    assert body["status"] == "aborted"
+    assert writer.posted
+    assert [r["station"] for r in body["results"]] == writer.posted
+    assert body["errors"][-1]["station"] is None
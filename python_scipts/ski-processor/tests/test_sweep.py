@@ -0,0 +1,51 @@
+import pytest
+
+import main
+
+STATION = {
+    "station": "S",
+    "pistes": [{"name": "A", "coords": [[45.0, 6.0], [45.001, 6.0]]},
+               {"name": "B", "coords": [[45.001, 6.0003], [45.002, 6.0003]]}],
+    "remontees": [],
+}
+
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+
+def sweep(client, **options):
+    return client.post("/process", json=dict(options, data=[STATION]))
+
+
+@pytest.mark.parametrize("options", [
+    {"tolerances": []},
+    {"tolerances_m": []},
+    {"tolerances": [True]},
+    {"tolerances_m": [10, False]},
+    {"tolerances": [0.001, -1]},
+    {"tolerances": "0.001"},
+    {"tolerances": [0.001], "tolerances_m": [10]},
+])
+def test_invalid_sweep_is_400(client, options):
+    response = sweep(client, **options)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_sweep_unit_follows_key(client):
+    degrees = sweep(client, tolerances=[0.0001, 0.001]).get_json()
+    assert degrees["unit"] == "deg"
+    assert [t["connections"] for t in degrees["totals"]] == [0, 2]
+    meters = sweep(client, tolerances_m=[10, 40]).get_json()
+    assert meters["unit"] == "m"
+    assert [t["connections"] for t in meters["totals"]] == [0, 2]
+
+
+def test_non_object_station_is_a_station_error(client):
+    response = client.post("/process", json={"tolerances": [0.001], "data": [42, STATION]})
+    assert response.status_code == 207
+    body = response.get_json()
+    assert [s["station"] for s in body["stations"]] == ["S"]
+    assert [e["station"] for e in body["errors"]] == [None]